@@ -1,13 +1,20 @@
 #!python3
 
 import numpy as np
-import pandas as pd
-import datetime
+import mmap
+import os
+import re
+import sys
 
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
+# ログ読み込みの共通モジュール (../../common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+import logcache
+import logtime
+
 mpl.rcParams.update({'font.size': 14})
 mpl.rcParams.update({'axes.facecolor': 'w'})
 mpl.rcParams.update({'axes.edgecolor': 'k'})
@@ -20,42 +27,80 @@ mpl.rcParams.update({'figure.figsize': [12, 9]})
 
 #DIRNAME = 'images/'
 
-#def get_azel_ant30logdata(filename,linemargin=10,starting_keyword='raster scan timing check'):
-def get_azel_ant30logdata(filename,linemargin=10,starting_keyword='trk.cpp-817'):
+# ant30ログを読む際のチャンクの大きさ [byte]。ログ全体ではなくこの大きさずつ読むのでメモリ使用量が一定になる
+CHUNK_SIZE = 1 << 22  # 4 MiB
+
+# [YYYY/MM/DD-HH:MM:SS.mmm-trk.cpp-817] cmd = AZ, EL <--> data = AZ, EL
+azel_line_format = r'^\[(\d{{4}}/\d\d/\d\d-\d\d:\d\d:\d\d\.\d{{3}})-{}\] cmd = ([-+.\deE]+), ([-+.\deE]+) <--> data = ([-+.\deE]+), ([-+.\deE]+)'
 
+def iter_chunks(mm, chunk_size=CHUNK_SIZE):
+    """
+    メモリマップしたファイル mm を、行の途中で切れないように chunk_size 程度ずつ bytes で返す。
+    """
+    pos = 0
+    size = len(mm)
+    while pos < size:
+        end = min(pos + chunk_size, size)
+        if end < size:
+            nl = mm.rfind(b'\n', pos, end)
+            if nl < 0:
+                # 1行が chunk_size より長い場合は、その行の終わりまで読む
+                nl = mm.find(b'\n', end)
+            end = size if nl < 0 else nl + 1
+        yield mm[pos:end]
+        pos = end
+
+#def get_azel_ant30logdata(filename,linemargin=10,starting_keyword='raster scan timing check'):
+def get_azel_ant30logdata(filename,starting_keyword='trk.cpp-817',chunk_size=CHUNK_SIZE):
+    """
+    ant30ログの starting_keyword (trk.cpp-817) の cmd 行から、コマンドAZ/ELと実測AZ/ELを抽出する。
+    ログはメモリマップして chunk_size ずつ走査し、
+    1回目で対象行の数を数えて配列を確保、2回目で各チャンクの対象行だけを確保済みの配列に書き込む。
+    """
     ret = {}
 
-    # file reading
-    datalines = ''
-    with open(filename)as f:
-        datalines= f.readlines()
-        pass
-
-    # get target-line region
-    tmp = np.where([starting_keyword in d for d in datalines])[0]
-    lnbgn = tmp[0] - linemargin
-    lnend = tmp[-2] + linemargin
-    
-    # get azel lines
-    #dl_ri = np.array([l.replace('\n','').replace(',','').replace('[','').replace(']','').split(' ') for l in datalines[lnbgn:lnend] if 'cmd' in l])
-    dl_ri = np.array([l.replace('\n','').replace(',','').replace('[','').replace(']','').split(' ') for l in datalines[lnbgn:lnend] if 'cmd' in l])
-
-    # convert line strings to azel or time
-    dt = np.array([datetime.datetime.strptime(' '.join(x.split('-')[:2]),'%Y/%m/%d %H:%M:%S.%f') for x in dl_ri[:,0]])
-    ts = np.array([x.timestamp() for x in dt])
-
-    cmdaz = np.array([float(x) for x in dl_ri[:,3]])
-    cmdel = np.array([float(x) for x in dl_ri[:,4]])
-
-    acuaz = np.array([float(x) for x in dl_ri[:,8]])
-    acuel = np.array([float(x) for x in dl_ri[:,9]])
-    
-    ret['cmd_az'] = cmdaz
-    ret['cmd_el'] = cmdel
-    ret['actual_az'] = acuaz
-    ret['actual_el'] = acuel
-    ret['date'] = dt
-    ret['timestamp'] = ts
+    pattern = re.compile(azel_line_format.format(re.escape(starting_keyword)).encode(), re.MULTILINE)
+    keyword = f"-{starting_keyword}] cmd".encode()
+
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Empty ant30 log: {filename}")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+            # 1st pass: 対象行の数（上限）を数えて配列を確保
+            n_max = sum(chunk.count(keyword) for chunk in iter_chunks(mm, chunk_size))
+
+            ns = np.empty(n_max, dtype=np.int64)
+            cmdaz = np.empty(n_max, dtype=np.float64)
+            cmdel = np.empty(n_max, dtype=np.float64)
+            acuaz = np.empty(n_max, dtype=np.float64)
+            acuel = np.empty(n_max, dtype=np.float64)
+
+            # 2nd pass: チャンクごとに対象行を取り出して書き込む
+            n = 0
+            for chunk in iter_chunks(mm, chunk_size):
+                rows = pattern.findall(chunk)
+                if not rows:
+                    continue
+                cols = np.array(rows)  # (行数, 5) の bytes 配列（このチャンクの分だけ）
+                m = len(cols)
+                ns[n:n+m] = logtime.stamps_to_ns(cols[:,0])
+                cmdaz[n:n+m] = cols[:,1].astype(np.float64)
+                cmdel[n:n+m] = cols[:,2].astype(np.float64)
+                acuaz[n:n+m] = cols[:,3].astype(np.float64)
+                acuel[n:n+m] = cols[:,4].astype(np.float64)
+                n += m
+
+    if n == 0:
+        raise ValueError(f"No '{starting_keyword}' cmd lines in {filename}")
+
+    # convert to azel or time
+    ret['cmd_az'] = cmdaz[:n]
+    ret['cmd_el'] = cmdel[:n]
+    ret['actual_az'] = acuaz[:n]
+    ret['actual_el'] = acuel[:n]
+    ret['date'] = logtime.ns_to_datetime64(ns[:n])
+    ret['timestamp'] = logtime.ns_to_timestamp(ns[:n])
     ret['fn'] = '.'.join(filename.split('/')[-1].split('.')[:-1])
 
     # get process time info. for each position moving
@@ -70,11 +115,12 @@ def get_azel_ant30logdata(filename,linemargin=10,starting_keyword='trk.cpp-817')
 def get_spadata(filename):
     ret = {}
 
-    spa_pd = pd.read_csv(filename, sep=',', header=None, names=['date','power','psd'])
-    ret['date'] = np.array([datetime.datetime.strptime(x,'%Y-%m-%d %H:%M:%S.%f') for x in spa_pd.date])
-    ret['timestamp'] = np.array([x.timestamp() for x in ret['date']])
-    ret['power'] = 10**(np.array(spa_pd.power)/10)
-    ret['psd'] = 10**(np.array(spa_pd.psd)/10)
+    spa = np.loadtxt(filename, delimiter=',', dtype=[('date','S26'),('power','f8'),('psd','f8')], comments=None, ndmin=1)
+    ns = logtime.stamps_to_ns(spa['date'], fmt='spa')
+    ret['date'] = logtime.ns_to_datetime64(ns)
+    ret['timestamp'] = logtime.ns_to_timestamp(ns)
+    ret['power'] = 10**(spa['power']/10)
+    ret['psd'] = 10**(spa['psd']/10)
     ret['fn'] = '.'.join(filename.split('/')[-1].split('.')[:-1])
 
     return ret
@@ -109,11 +155,11 @@ def make_binnedarray(tod_az,tod_el,tod_val,az_bins=None,el_bins=None,select=None
 
 
 
-def main(ant30filename,spafilename,step_az,step_el):
+def main(ant30filename,spafilename,step_az,step_el,use_cache=True):
     
-    ##### data reading
-    dict_azel = get_azel_ant30logdata(ant30filename)
-    dict_spa  = get_spadata(spafilename)
+    ##### data reading (.logcache/ にキャッシュがあればそこから読み込む)
+    dict_azel = logcache.load(get_azel_ant30logdata, ant30filename, 'check_azel', 2, use_cache)
+    dict_spa  = logcache.load(get_spadata, spafilename, 'check_spa', 1, use_cache)
     
     ##### AZEL plot
     fig,ax = plt.subplots(figsize=(20,8),nrows=2,ncols=2,sharex=True)
@@ -242,6 +288,7 @@ if __name__ == '__main__':
     parser.add_argument('spafilename', help='spa file name')
     parser.add_argument('--step_az', help='step azimuth [deg] for map bins',default=0.005,type=float)
     parser.add_argument('--step_el', help='step elevation [deg] for map bins',default=0.25,type=float)
+    parser.add_argument('--no-cache', help='do not use/create parsed log cache (.logcache/)', action='store_true')
     
     args = parser.parse_args()
-    main(args.ant30filename,args.spafilename,args.step_az,args.step_el)
\ No newline at end of file
+    main(args.ant30filename,args.spafilename,args.step_az,args.step_el,use_cache=not args.no_cache)
\ No newline at end of file
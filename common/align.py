@@ -0,0 +1,66 @@
+#!python3
+
+import numpy as np
+
+"""
+時刻の異なる2つのログの対応付け（リサンプリング）モジュール。
+
+ant30ログの (Az, El) 行とパワーメーターログは別々の時計でサンプリングされていて、行番号は対応しない。
+一方のログの値（AZ, EL, スキャンオフセットなど）を、もう一方のログの時刻に searchsorted でまとめて補間する。
+前後のサンプルの間隔が max_gap より長い（ログが途切れている）時刻と、範囲外の時刻は無効 (valid=False) とし、値は nan にする。
+"""
+
+# 補間方法
+# linear: 前後のサンプルの線形補間, nearest: 近い方のサンプル, previous: 直前のサンプル
+METHODS = ('linear', 'nearest', 'previous')
+
+
+def resample(src_time, values, dst_time, method='linear', max_gap=None):
+    """
+    昇順の時刻 src_time [ns] の値 values（列名 → 配列 の辞書）を、時刻 dst_time [ns] に補間して辞書で返す。
+    全ての列を 時刻数 × 列数 の配列にまとめて1回で補間する。
+    max_gap [ns] を指定した場合、前後の src のサンプルの間隔がそれより長い時刻は無効にする。
+    戻り値には各列の補間値と、有効な時刻を示す 'valid' が入る。
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown interpolation method: {method} (one of {', '.join(METHODS)})")
+
+    src_time = np.asarray(src_time, dtype=np.int64)
+    dst_time = np.asarray(dst_time, dtype=np.int64)
+    names = list(values)
+    table = np.empty((src_time.size, len(names)), dtype=np.float64)
+    for k, name in enumerate(names):
+        table[:, k] = values[name]
+    n = src_time.size
+
+    if n == 0:
+        ret = {name: np.full(dst_time.size, np.nan) for name in names}
+        ret['valid'] = np.zeros(dst_time.size, dtype=bool)
+        return ret
+
+    # dst_time の直前 (i0) と直後 (i1) の src のサンプル。時刻が一致する場合は i1 も同じサンプルにする
+    i1 = np.searchsorted(src_time, dst_time, side='right')
+    i0 = np.clip(i1 - 1, 0, n - 1)
+    exact = src_time[i0] == dst_time
+    valid = ((i1 >= 1) & (i1 < n)) | exact
+    i1 = np.where(exact, i0, np.clip(i1, 0, n - 1))
+
+    gap = src_time[i1] - src_time[i0]
+    if max_gap is not None:
+        valid &= gap <= max_gap
+
+    if method == 'previous':
+        out = table[i0]
+    else:
+        frac = (dst_time - src_time[i0]) / np.where(gap > 0, gap, 1)
+        if method == 'nearest':
+            out = table[np.where(frac < 0.5, i0, i1)]
+        else:
+            out = table[i0] + (table[i1] - table[i0]) * frac[:, None]
+
+    out[~valid] = np.nan
+
+    ret = {name: out[:, k] for k, name in enumerate(names)}
+    ret['valid'] = valid
+
+    return ret
@@ -0,0 +1,106 @@
+#!python3
+
+import argparse
+import json
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+"""
+解析プログラムの非対話（バッチ）実行モジュール。
+
+--batch を付けて実行すると、キーボード入力 (input()) の代わりにコマンドライン引数・設定ファイルの値を使い、
+図は Agg バックエンドで保存だけして表示しない (plt.show() しない)。結果は JSON ファイルに書き出す。
+過去の観測ログをまとめて夜間に解析する場合などに使う。
+
+設定ファイル (--config) は引数名をキーにした JSON で、コマンドラインで指定しなかった引数の値になる。
+    {"T_atm": 270.0, "batch": true}
+"""
+
+# バッチ実行中かどうか（enable() で True になる）
+BATCH = False
+
+
+def add_arguments(parser):
+    """
+    argparse の parser に --batch, --config を追加する。
+    """
+    parser.add_argument('--batch', help='non-interactive mode: no keyboard input, figures are only saved, results are written as JSON', action='store_true')
+    parser.add_argument('--config', help='JSON file of argument values (keys are argument names)', default=None)
+
+
+def parse_args(parser, args=None):
+    """
+    --config の JSON の値を引数のデフォルト値にしてから、コマンドライン引数を読み込む。
+    --batch が指定されていれば enable() する。
+    """
+    pre = argparse.ArgumentParser(add_help=False)
+    pre.add_argument('--config', default=None)
+    known, _ = pre.parse_known_args(args)
+
+    if known.config:
+        with open(known.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        dests = {action.dest for action in parser._actions}
+        unknown = sorted(set(config) - dests)
+        if unknown:
+            parser.error(f"unknown keys in {known.config}: {', '.join(unknown)}")
+        parser.set_defaults(**config)
+
+    ret = parser.parse_args(args)
+    if ret.batch:
+        enable()
+
+    return ret
+
+
+def enable():
+    """
+    バッチ実行にする。以降の図は Agg バックエンドで描画し、show() では表示しない。
+    """
+    global BATCH
+    BATCH = True
+    plt.switch_backend('Agg')
+
+
+def show():
+    """
+    plt.show() の代わり。バッチ実行中は表示せずに図を閉じる。
+    """
+    if BATCH:
+        plt.close('all')
+    else:
+        plt.show()
+
+
+def ask(value, prompt, type=float):
+    """
+    value が None でなければそれを返し、None ならキーボード入力する。
+    バッチ実行中に値が無い場合は入力を待たずにエラーにする。
+    """
+    if value is not None:
+        return type(value)
+    if BATCH:
+        raise ValueError(f"Missing value in batch mode: {prompt}")
+
+    return type(input(prompt))
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        return value.item()
+    if isinstance(value, np.datetime64):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_json(filename, result):
+    """
+    結果の辞書を JSON ファイルに書き出す（NumPy の配列・数値はそのまま渡してよい）。
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False, default=_to_json)
+        f.write('\n')
+    print(f"Result saved to {filename}")
@@ -0,0 +1,125 @@
+#!python3
+
+import numpy as np
+
+import logcache
+import logtime
+
+"""
+パワーメーターログの区間平均モジュール。
+
+パワーメーターログを1回だけ読み込んで、昇順の int64 タイムスタンプ [ns] と float64 の出力値の配列にする。
+ON/OFF/R などの [start, end] 区間の平均・標準偏差・点数は、searchsorted と累積和を使って
+全区間分を1回の呼び出しでまとめて計算する。
+"""
+
+# read_powerlog の出力形式を変えたら上げる（キャッシュの作り直し用）
+CACHE_VERSION = 1
+
+
+def to_ns(time):
+    """
+    datetime, datetime64 (またはそのリスト・配列) を int64 のタイムスタンプ [ns] に変換する。
+    """
+    return np.asarray(time, dtype='datetime64[ns]').astype(np.int64)
+
+
+def read_powerlog(filename):
+    """
+    パワーメーターログを1回だけ読み込み、time [ns] (int64, 昇順), power (float64) を辞書で返す。
+    """
+    ret = {}
+
+    # [yyyy/mm/dd-hh:mm:ss.ms] と出力値の2列を固定長バイト列と float64 のまま読み込む
+    data = np.loadtxt(filename, dtype=[('date', 'S25'), ('power', 'f8')], usecols=(0, 1), comments=None, ndmin=1)
+    time = logtime.stamps_to_ns(data['date'], offset=1)
+    power = np.ascontiguousarray(data['power'])
+
+    # searchsorted を使うので時刻順に並べておく
+    if np.any(np.diff(time) < 0):
+        order = np.argsort(time, kind='stable')
+        time = time[order]
+        power = power[order]
+
+    ret['time'] = time
+    ret['power'] = power
+    ret['fn'] = '.'.join(filename.split('/')[-1].split('.')[:-1])
+
+    return ret
+
+
+def load_powerlog(filename, use_cache=True):
+    """
+    read_powerlog の結果を、キャッシュ（.logcache/）があればそこから読み込む。
+    """
+    return logcache.load(read_powerlog, filename, 'power', CACHE_VERSION, use_cache)
+
+
+def load_powerlogs(filenames, use_cache=True):
+    """
+    複数のパワーメーターログ（1時間ごとのログなど）を load_powerlog で読み込み、時刻順に1つの配列につなげる。
+    """
+    data = [load_powerlog(fn, use_cache) for fn in filenames]
+    if len(data) == 1:
+        return data[0]
+
+    time = np.concatenate([d['time'] for d in data])
+    power = np.concatenate([d['power'] for d in data])
+    order = np.argsort(time, kind='stable')
+
+    ret = {}
+    ret['time'] = time[order]
+    ret['power'] = power[order]
+    ret['fn'] = data[0]['fn']
+
+    return ret
+
+
+def window_index(time, start, end):
+    """
+    昇順の時刻 time [ns] について、[start, end] の各区間（両端を含む）に入る範囲の
+    開始・終了インデックス (i_start, i_end) を返す。time[i_start[k]:i_end[k]] が k 番目の区間になる（スライスなのでコピーしない）。
+    """
+    time = np.asarray(time, dtype=np.int64)
+    start = to_ns(start) if np.asarray(start).dtype != np.int64 else np.asarray(start)
+    end = to_ns(end) if np.asarray(end).dtype != np.int64 else np.asarray(end)
+
+    i_start = np.searchsorted(time, start, side='left')
+    i_end = np.maximum(np.searchsorted(time, end, side='right'), i_start)
+
+    return i_start, i_end
+
+
+def interval_stats(time, value, start, end):
+    """
+    昇順の時刻 time [ns] と値 value について、[start, end] の各区間（両端を含む）に入る値の
+    平均 mean、標準偏差 std (ddof=0)、点数 count をまとめて計算し辞書で返す。
+    start, end は同じ長さの配列（int64 [ns] または datetime/datetime64）。
+    値が1つも無い区間の mean, std は nan とする。
+    """
+    time = np.asarray(time, dtype=np.int64)
+    value = np.asarray(value, dtype=np.float64)
+    start = to_ns(start) if np.asarray(start).dtype != np.int64 else np.asarray(start)
+    end = to_ns(end) if np.asarray(end).dtype != np.int64 else np.asarray(end)
+
+    i_start = np.searchsorted(time, start, side='left')
+    i_end = np.searchsorted(time, end, side='right')
+    count = np.maximum(i_end - i_start, 0)
+
+    # 桁落ちを抑えるため、全体の平均を引いてから累積和をとる
+    offset = value.mean() if value.size else 0.0
+    shifted = value - offset
+    csum = np.concatenate(([0.0], np.cumsum(shifted)))
+    csum2 = np.concatenate(([0.0], np.cumsum(shifted ** 2)))
+
+    i_end = np.maximum(i_end, i_start)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (csum[i_end] - csum[i_start]) / count
+        var = (csum2[i_end] - csum2[i_start]) / count - mean ** 2
+
+    ret = {}
+    ret['mean'] = mean + offset
+    ret['std'] = np.sqrt(np.maximum(var, 0.0))
+    ret['count'] = count
+
+    return ret
@@ -0,0 +1,98 @@
+#!python3
+
+import fnmatch
+import glob
+import os
+
+import numpy as np
+
+import logtime
+
+"""
+過去の観測ログ（アーカイブ）の検索・対応付けモジュール。
+
+ディレクトリ以下またはグロブに一致するログファイルを集め、各ファイルの最初と最後のタイムスタンプ（時間範囲）から
+開始時刻順の区間索引を作る。ant30ログとパワーメーターログの対応付けは、この索引への二分探索で
+時間範囲が重なるファイルだけを取り出して行う（全ての組み合わせは比較しない）。
+"""
+
+
+def find_logs(paths, pattern):
+    """
+    paths（ディレクトリ・ファイル・グロブのリスト）から、ファイル名が pattern（例 'ant30-tau*.log'）に一致するログを集める。
+    ディレクトリはサブディレクトリまで探す。重複を除いて名前順のリストで返す。
+    """
+    found = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]  # .logcache/ などは見ない
+                found.update(os.path.join(dirpath, fn) for fn in fnmatch.filter(filenames, pattern))
+        else:
+            found.update(fn for fn in glob.glob(path) if fnmatch.fnmatch(os.path.basename(fn), pattern))
+
+    return sorted(found)
+
+
+def build_time_index(filenames, fmt='ant30', offset=1):
+    """
+    ログファイルの時間範囲の索引を作る。
+    fn, start [ns], end [ns] を開始時刻順に並べ、max_end（先頭からの end の最大値）を加えた辞書を返す。
+    タイムスタンプ行が無いファイルは除く。
+    """
+    rows = []
+    for fn in filenames:
+        try:
+            start, end = logtime.file_time_range(fn, fmt, offset)
+        except (ValueError, OSError) as e:
+            print(f"Skip {fn} ({e})")
+            continue
+        rows.append((fn, start, end))
+    rows.sort(key=lambda row: row[1])
+
+    ret = {}
+    ret['fn'] = [row[0] for row in rows]
+    ret['start'] = np.array([row[1] for row in rows], dtype=np.int64)
+    ret['end'] = np.array([row[2] for row in rows], dtype=np.int64)
+    ret['max_end'] = np.maximum.accumulate(ret['end']) if rows else ret['end']
+
+    return ret
+
+
+def query_overlaps(time_index, start, end):
+    """
+    [start, end] の各区間（int64 [ns] の配列）について、時間範囲が重なるファイルの番号の配列のリストを返す。
+    start <= 区間の end となるファイルは searchsorted で、区間の start <= max_end となる最初のファイルも
+    searchsorted で求めるので、調べるのはその間のファイルだけになる。
+    """
+    start = np.asarray(start, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+
+    lo = np.searchsorted(time_index['max_end'], start, side='left')
+    hi = np.searchsorted(time_index['start'], end, side='right')
+
+    ret = []
+    for i0, i1, s in zip(lo.tolist(), hi.tolist(), start.tolist()):
+        candidates = np.arange(i0, max(i0, i1))
+        ret.append(candidates[time_index['end'][candidates] >= s])
+
+    return ret
+
+
+def pair_logs(ant30logs, powerlogs):
+    """
+    ant30ログごとに、時間範囲が重なるパワーメーターログを対応付ける。
+    (ant30ログ, [パワーメーターログ（開始時刻順）]) のリストを返す。重なるログが無い ant30ログは除く。
+    """
+    ant30_index = build_time_index(ant30logs)
+    power_index = build_time_index(powerlogs)
+
+    ret = []
+    overlaps = query_overlaps(power_index, ant30_index['start'], ant30_index['end'])
+    for fn, matched in zip(ant30_index['fn'], overlaps):
+        if matched.size == 0:
+            print(f"Skip {fn} (no power-meter log overlaps)")
+            continue
+        ret.append((fn, [power_index['fn'][i] for i in matched.tolist()]))
+
+    return ret
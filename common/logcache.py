@@ -0,0 +1,151 @@
+#!python3
+
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+
+"""
+解析済みログのキャッシュモジュール。
+
+ant30ログ・パワーメーターログ・SPAログなどを読み込んだ結果（NumPy配列と数値・文字列の辞書）を、
+元のログと同じフォルダの .logcache/ に列ごとの .npy ファイルとして保存し、次回以降はメモリマップで読み込む。
+
+キャッシュは元のログのパス・サイズ・更新時刻・内容のハッシュと、読み込み関数の種類・バージョンで管理する。
+- サイズと更新時刻が一致すればそのまま使う
+- 更新時刻だけが違う場合（コピーなど）は内容のハッシュを比べ、一致すれば使う
+- それ以外、またはキャッシュが壊れている場合は読み込み直して作り直す
+"""
+
+CACHE_DIRNAME = '.logcache'
+META_FILENAME = 'meta.json'
+HASH_CHUNK = 1 << 20  # 1 MiB
+
+
+def file_hash(filename):
+    """
+    ファイルの内容のハッシュ (blake2b) を16進文字列で返す。
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def cache_path(filename, kind):
+    """
+    filename を kind で読み込んだ結果のキャッシュフォルダのパス。
+    """
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    return os.path.join(dirname, CACHE_DIRNAME, f"{basename}.{kind}")
+
+
+def _source_info(filename):
+    st = os.stat(filename)
+    return {'path': os.path.abspath(filename), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _read_meta(path):
+    with open(os.path.join(path, META_FILENAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _load_entry(path, meta):
+    """
+    キャッシュフォルダから辞書を復元する。配列はメモリマップで読み込み、meta の shape, dtype と照合する。
+    """
+    ret = dict(meta['values'])
+    for key, spec in meta['arrays'].items():
+        arr = np.load(os.path.join(path, f"{key}.npy"), mmap_mode='r', allow_pickle=False)
+        if list(arr.shape) != spec['shape'] or arr.dtype.str != spec['dtype']:
+            raise ValueError(f"Cache array mismatch: {key}")
+        ret[key] = arr
+
+    return ret
+
+
+def _write_entry(path, ret, source, kind, version):
+    """
+    辞書 ret をキャッシュフォルダに書き込む。一時フォルダに書いてから置き換える。
+    """
+    arrays = {}
+    values = {}
+    for key, value in ret.items():
+        if isinstance(value, np.ndarray):
+            arrays[key] = value
+        else:
+            values[key] = value
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    meta = {'source': source, 'kind': kind, 'version': version, 'values': values, 'arrays': {}}
+    for key, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        np.save(os.path.join(tmp_path, f"{key}.npy"), arr, allow_pickle=False)
+        meta['arrays'][key] = {'shape': list(arr.shape), 'dtype': arr.dtype.str}
+
+    # meta.json は最後に書く（meta.json があれば配列は書き終わっている）
+    with open(os.path.join(tmp_path, META_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def load(parser, filename, kind, version=1, use_cache=True):
+    """
+    parser(filename) の結果をキャッシュを通して返す。
+    parser は NumPy配列と JSON に保存できる値（数値・文字列・None）の辞書を返す関数。
+    kind はキャッシュの種類名（'ant30index', 'power' など）、version は parser の出力形式を変えたら上げる。
+    """
+    if not use_cache:
+        return parser(filename)
+
+    path = cache_path(filename, kind)
+    source = _source_info(filename)
+
+    try:
+        meta = _read_meta(path)
+        cached = meta['source']
+        if meta['kind'] == kind and meta['version'] == version and cached['size'] == source['size']:
+            if cached['mtime_ns'] != source['mtime_ns']:
+                # 更新時刻だけ違う場合は内容で判定し、一致すれば更新時刻を書き直す
+                source['hash'] = file_hash(filename)
+                if cached.get('hash') != source['hash']:
+                    raise ValueError("Source content changed")
+                meta['source'] = source
+                with open(os.path.join(path, META_FILENAME), 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+            return _load_entry(path, meta)
+    except FileNotFoundError:
+        pass
+    except (ValueError, KeyError, TypeError, OSError, EOFError) as e:
+        print(f"logcache: rebuilding cache for {filename} ({e})")
+
+    ret = parser(filename)
+
+    source.setdefault('hash', file_hash(filename))
+    try:
+        _write_entry(path, ret, source, kind, version)
+    except (OSError, TypeError) as e:
+        print(f"logcache: failed to write cache for {filename} ({e})")
+
+    return ret
+
+
+def clear(filename):
+    """
+    filename のキャッシュを全て削除する。
+    """
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    cache_dir = os.path.join(dirname, CACHE_DIRNAME)
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.startswith(basename + '.'):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
@@ -0,0 +1,196 @@
+#!python3
+
+import numpy as np
+import re
+
+import logcache
+import logtime
+
+"""
+ant30ログの共通読み込みモジュール。
+
+ant30ログを1回だけ走査して、観測テーブルのヘッダーパラメーター(SetNumber, OnOffTime, RSkyTime, Lo1)、
+On/Off/R-Skyの積分区間（開始・終了時刻、On-Count、(AZ,EL)）、スキャン中の (Az, El) 行、
+追尾状況 (trk.cpp-817) の行をまとめた索引を作成する。
+TauCalculator.py, rp_plot.py などはこの索引に問い合わせて必要な時刻を取り出す。
+"""
+
+# parse_ant30log の出力形式を変えたら上げる（キャッシュの作り直し用）
+CACHE_VERSION = 3
+
+# ヘッダーパラメーター（観測テーブルの設定値）
+HEADER_KEYS = ('SetNumber', 'OnOffTime', 'RSkyTime')
+header_format = re.compile(r'(SetNumber|OnOffTime|RSkyTime)\s+(\d+)')
+
+# 第1局部発振器の周波数 [GHz]（観測周波数の目安）
+# Lo1     476.000000
+lo1_format = re.compile(r'^Lo1\s+([\d.]+)\s*$')
+
+# 積分区間の開始・終了行
+# [2024/09/25-15:57:32.000-tkb32Func.cpp-1034] # On-Point  Integ end (On-Count:1) (AZ,EL) = (179.999993, 60.630233)
+event_format = re.compile(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})[^\]]*\]\s+# (On-Point|Off-Point|R-Sky)\s+Integ (start|end)'
+                          r'(?:\s+\(On-Count:(\d+)\))?'
+                          r'(?:\s+\(AZ,EL\) = \(([\d\.\-]+), ([\d\.\-]+)\))?')
+
+# スキャン中のアンテナ位置とスキャンオフセットの行
+# [2024/09/27-16:20:11.681-calcBoth.cpp-510] (Az, El) = (263.173305, 18.032355), scan offset = (18000.000000, 18000.000000)
+azel_format = re.compile(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})[^\]]*\]\s+\(Az, El\) = \(([\d\.\-]+), ([\d\.\-]+)\)'
+                         r', scan offset = \(([\d\.\-]+), ([\d\.\-]+)\)')
+
+# アンテナの追尾状況（指令値と実測値）の行
+# [2024/06/20-14:31:09.884-trk.cpp-817] cmd = 89.327754, 1.211855 <--> data = 90.192885, 2.051122
+track_format = re.compile(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})-trk\.cpp-817\] cmd = ([-+.\deE]+), ([-+.\deE]+)'
+                          r' <--> data = ([-+.\deE]+), ([-+.\deE]+)')
+
+# ログ中の観測点名 → 索引で使う種別名
+EVENT_KINDS = {'On-Point': 'on', 'Off-Point': 'off', 'R-Sky': 'r'}
+
+# 積分区間テーブルの型
+# start は 'Integ start' 行が無い区間では NaT、count は On-Count が無い区間では -1、az, el は記載が無い場合 nan
+WINDOW_DTYPE = np.dtype([
+    ('kind', 'U3'),
+    ('start', 'datetime64[ns]'),
+    ('end', 'datetime64[ns]'),
+    ('count', 'i8'),
+    ('az', 'f8'),
+    ('el', 'f8'),
+])
+
+# (Az, El) 行テーブルの型 (AZ, EL [deg], スキャンオフセット [arcsec])
+AZEL_DTYPE = np.dtype([
+    ('time', 'datetime64[ns]'),
+    ('az', 'f8'),
+    ('el', 'f8'),
+    ('az_scanoffset', 'f8'),
+    ('el_scanoffset', 'f8'),
+])
+
+# 追尾行テーブルの型 (指令値・実測値の AZ, EL [deg])
+TRACK_DTYPE = np.dtype([
+    ('time', 'datetime64[ns]'),
+    ('az_cmd', 'f8'),
+    ('el_cmd', 'f8'),
+    ('az', 'f8'),
+    ('el', 'f8'),
+])
+
+
+def parse_ant30log(filename):
+    """
+    ant30ログを1回だけ読み込み、ヘッダーパラメーターと積分区間テーブルを辞書で返す。
+    ヘッダーパラメーターはログ中で最後に現れた値を採用する（従来の extract_* と同じ）。
+    積分区間は 'Integ end' 行ごとに1行とし、直前の同種の 'Integ start' 行を開始時刻とする。
+    """
+    ret = {key: None for key in HEADER_KEYS}
+    ret['Lo1'] = None
+    rows = []
+    azel_rows = []
+    track_rows = []
+    last_start = {}  # 種別ごとの直前の 'Integ start' 時刻
+
+    # タイムスタンプは文字列のまま集めておき、最後に logtime でまとめて変換する
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line in file:
+            if '# ' in line and 'Integ' in line:
+                match = event_format.search(line)
+                if match:
+                    kind = EVENT_KINDS[match.group(2)]
+
+                    if match.group(3) == 'start':
+                        last_start[kind] = match.group(1)
+                    else:
+                        count = int(match.group(4)) if match.group(4) else -1
+                        az = float(match.group(5)) if match.group(5) else np.nan
+                        el = float(match.group(6)) if match.group(6) else np.nan
+                        rows.append((kind, last_start.pop(kind, None), match.group(1), count, az, el))
+                    continue
+
+            if '(Az, El) =' in line:
+                match = azel_format.search(line)
+                if match:
+                    azel_rows.append(match.groups())
+                continue
+
+            if 'trk.cpp-817' in line:
+                match = track_format.search(line)
+                if match:
+                    track_rows.append(match.groups())
+                continue
+
+            if line.startswith('Lo1'):
+                match = lo1_format.search(line)
+                if match:
+                    ret['Lo1'] = float(match.group(1))
+                continue
+
+            if 'SetNumber' in line or 'OnOffTime' in line or 'RSkyTime' in line:
+                match = header_format.search(line)
+                if match:
+                    ret[match.group(1)] = int(match.group(2))
+
+    windows = np.zeros(len(rows), dtype=WINDOW_DTYPE)
+    if rows:
+        kind, start, end, count, az, el = zip(*rows)
+        has_start = np.array([s is not None for s in start])
+        windows['kind'] = kind
+        windows['start'] = np.datetime64('NaT', 'ns')
+        windows['start'][has_start] = logtime.ns_to_datetime64(logtime.stamps_to_ns([s for s in start if s is not None]))
+        windows['end'] = logtime.ns_to_datetime64(logtime.stamps_to_ns(end))
+        windows['count'] = count
+        windows['az'] = az
+        windows['el'] = el
+    ret['windows'] = windows
+
+    azel = np.zeros(len(azel_rows), dtype=AZEL_DTYPE)
+    if azel_rows:
+        columns = np.array(azel_rows)
+        azel['time'] = logtime.ns_to_datetime64(logtime.stamps_to_ns(columns[:, 0]))
+        azel['az'] = columns[:, 1].astype(np.float64)
+        azel['el'] = columns[:, 2].astype(np.float64)
+        azel['az_scanoffset'] = columns[:, 3].astype(np.float64)
+        azel['el_scanoffset'] = columns[:, 4].astype(np.float64)
+    ret['azel'] = azel
+
+    track = np.zeros(len(track_rows), dtype=TRACK_DTYPE)
+    if track_rows:
+        columns = np.array(track_rows)
+        track['time'] = logtime.ns_to_datetime64(logtime.stamps_to_ns(columns[:, 0]))
+        track['az_cmd'] = columns[:, 1].astype(np.float64)
+        track['el_cmd'] = columns[:, 2].astype(np.float64)
+        track['az'] = columns[:, 3].astype(np.float64)
+        track['el'] = columns[:, 4].astype(np.float64)
+    ret['track'] = track
+    ret['fn'] = '.'.join(filename.split('/')[-1].split('.')[:-1])
+
+    return ret
+
+
+def load_ant30log(filename, use_cache=True):
+    """
+    parse_ant30log の結果を、キャッシュ（.logcache/）があればそこから読み込む。
+    """
+    return logcache.load(parse_ant30log, filename, 'ant30index', CACHE_VERSION, use_cache)
+
+
+def get_windows(log_index, kind):
+    """
+    積分区間テーブルから kind ('on', 'off', 'r') の行だけを取り出す。
+    """
+    windows = log_index['windows']
+    return windows[windows['kind'] == kind]
+
+
+def get_integ_time(log_index, kind, duration=None):
+    """
+    kind ('on', 'off', 'r') の積分区間の開始・終了時刻を datetime64[ns] 配列で返す。
+    duration [sec] を指定した場合、開始時刻を終了時刻から duration だけ遡った時刻とする（OnOffTime, RSkyTime による逆算）。
+    """
+    windows = get_windows(log_index, kind)
+    end_time = windows['end']
+
+    if duration is None:
+        start_time = windows['start']
+    else:
+        start_time = end_time - np.timedelta64(int(duration), 's')
+
+    return start_time, end_time
@@ -0,0 +1,49 @@
+#!python3
+
+import os
+
+"""
+書き込み中のログの追従読み込みモジュール（tail -f 相当）。
+
+観測中に ant30ログ・パワーメーターログへ追記された行だけを読み込む。
+複数のログをスレッドを使わずに交互にポーリングできるように、読み込み位置を辞書で持つ。
+"""
+
+
+def open_tail(filename, from_start=True):
+    """
+    filename の追従読み込みの状態を作る。ファイルがまだ無くてもよい（作成されたら読み始める）。
+    from_start=False の場合、既存の内容は読まずに末尾から読み始める。
+    """
+    tail = {'filename': filename, 'pos': 0, 'partial': b''}
+    if not from_start and os.path.exists(filename):
+        tail['pos'] = os.path.getsize(filename)
+
+    return tail
+
+
+def read_lines(tail):
+    """
+    前回から追記された行を、改行まで書き込まれた行だけ str のリストで返す。
+    書きかけの最終行は次回に持ち越す。ファイルが短くなった場合（作り直し）は先頭から読み直す。
+    """
+    filename = tail['filename']
+    if not os.path.exists(filename):
+        return []
+
+    size = os.path.getsize(filename)
+    if size < tail['pos']:
+        tail['pos'] = 0
+        tail['partial'] = b''
+    if size == tail['pos']:
+        return []
+
+    with open(filename, 'rb') as f:
+        f.seek(tail['pos'])
+        data = f.read(size - tail['pos'])
+    tail['pos'] += len(data)
+
+    lines = (tail['partial'] + data).split(b'\n')
+    tail['partial'] = lines.pop()
+
+    return [line.decode('utf-8', errors='replace').rstrip('\r') for line in lines]
@@ -0,0 +1,151 @@
+#!python3
+
+import numpy as np
+
+"""
+ログのタイムスタンプ列の一括変換モジュール。
+
+ant30ログ・パワーメーターログ・アンテナログの [YYYY/MM/DD-HH:MM:SS.mmm] と、
+SPAログの YYYY-MM-DD HH:MM:SS.ffffff は、どちらも桁位置が固定されている。
+1行ずつ datetime.strptime するかわりに、タイムスタンプ列をバイト行列 (行数 × 文字数 の uint8) として扱い、
+各桁を NumPy でまとめて数値に直して int64 のエポックナノ秒 [ns] にする。
+ログの時刻はタイムゾーンを持たないので、そのままUTCとみなしたエポック値とする。
+"""
+
+# 書式ごとの各フィールドの (開始位置, 桁数)。frac は小数秒。
+STAMP_LAYOUTS = {
+    'ant30': {  # YYYY/MM/DD-HH:MM:SS.mmm
+        'year': (0, 4), 'month': (5, 2), 'day': (8, 2),
+        'hour': (11, 2), 'minute': (14, 2), 'second': (17, 2), 'frac': (20, 3),
+    },
+    'spa': {  # YYYY-MM-DD HH:MM:SS.ffffff
+        'year': (0, 4), 'month': (5, 2), 'day': (8, 2),
+        'hour': (11, 2), 'minute': (14, 2), 'second': (17, 2), 'frac': (20, 6),
+    },
+}
+
+
+def _digits(chars, pos, width, allow_empty=False):
+    """
+    バイト行列 chars の pos 桁目から width 桁を10進数として読み取り、int64 配列で返す。
+    allow_empty=True の場合、行末より後ろ（NUL）は 0 として扱う（小数秒が省略された行用）。
+    """
+    d = chars[:, pos:pos + width].astype(np.int64) - ord('0')
+    if allow_empty:
+        d[chars[:, pos:pos + width] == 0] = 0
+    if d.shape[1] != width or np.any((d < 0) | (d > 9)):
+        raise ValueError(f"Invalid timestamp digits at columns {pos}-{pos + width}")
+
+    return d @ (10 ** np.arange(width - 1, -1, -1, dtype=np.int64))
+
+
+def to_char_matrix(stamps, offset=0, width=None):
+    """
+    タイムスタンプ文字列の配列（str, bytes のリスト・配列）を、行数 × 文字数 の uint8 行列に変換する。
+    offset 文字目から width 文字だけを取り出す（'[' を飛ばす場合は offset=1）。
+    """
+    arr = np.asarray(stamps)
+    if arr.dtype.kind == 'U':
+        arr = np.char.encode(arr, 'ascii')
+    elif arr.dtype.kind != 'S':
+        arr = arr.astype('S')
+
+    chars = np.ascontiguousarray(arr).view(np.uint8).reshape(len(arr), arr.dtype.itemsize)
+    end = None if width is None else offset + width
+
+    return chars[:, offset:end]
+
+
+def decode_char_matrix(chars, fmt='ant30'):
+    """
+    行数 × 文字数 の uint8 行列（各行の先頭がタイムスタンプ）を int64 のエポックナノ秒 [ns] に変換する。
+    fmt は 'ant30' (YYYY/MM/DD-HH:MM:SS.mmm) または 'spa' (YYYY-MM-DD HH:MM:SS.ffffff)。
+    """
+    layout = STAMP_LAYOUTS[fmt]
+    chars = np.asarray(chars, dtype=np.uint8)
+    if chars.ndim != 2:
+        raise ValueError("chars must be a 2D uint8 array (rows x characters)")
+
+    # 小数秒は短い行（行末以降が NUL）を許す
+    frac_pos, frac_width = layout['frac']
+    if chars.shape[1] < frac_pos + frac_width:
+        chars = np.pad(chars, ((0, 0), (0, frac_pos + frac_width - chars.shape[1])))
+
+    year = _digits(chars, *layout['year'])
+    month = _digits(chars, *layout['month'])
+    day = _digits(chars, *layout['day'])
+    hour = _digits(chars, *layout['hour'])
+    minute = _digits(chars, *layout['minute'])
+    second = _digits(chars, *layout['second'])
+    frac = _digits(chars, frac_pos, frac_width, allow_empty=True)
+
+    # 年月日 → 1970-01-01 からの日数 (datetime64 の暦計算を利用)
+    months = (year - 1970) * 12 + (month - 1)
+    days = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + (day - 1)
+
+    seconds = ((days * 24 + hour) * 60 + minute) * 60 + second
+
+    return seconds * 1_000_000_000 + frac * 10 ** (9 - frac_width)
+
+
+def stamps_to_ns(stamps, fmt='ant30', offset=0):
+    """
+    タイムスタンプ文字列の配列を int64 のエポックナノ秒 [ns] に変換する。
+    offset は各文字列の中でタイムスタンプが始まる位置（'[YYYY/...' の場合は 1）。
+    """
+    if len(stamps) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    return decode_char_matrix(to_char_matrix(stamps, offset), fmt)
+
+
+def ns_to_datetime64(ns):
+    """
+    int64 のエポックナノ秒 [ns] を datetime64[ns] 配列に変換する（プロットや時刻比較用）。
+    """
+    return np.asarray(ns, dtype=np.int64).astype('datetime64[ns]')
+
+
+def ns_to_timestamp(ns):
+    """
+    int64 のエポックナノ秒 [ns] を float のエポック秒に変換する（補間用）。
+    """
+    return np.asarray(ns, dtype=np.int64) / 1e9
+
+
+def file_time_range(filename, fmt='ant30', offset=1, blocksize=65536):
+    """
+    ログファイルの最初と最後のタイムスタンプ行の時刻を int64 のエポックナノ秒 [ns] の組 (start, end) で返す。
+    ファイル全体は読まず、先頭と末尾の blocksize バイトだけを読む。offset は各行の中でタイムスタンプが始まる位置。
+    タイムスタンプ行が無い場合は ValueError。
+    """
+    start_char = b'[' if offset == 1 else None
+    width = sum(STAMP_LAYOUTS[fmt]['frac'])
+
+    def stamped(lines):
+        for line in lines:
+            if len(line) >= offset + width and (start_char is None or line[:1] == start_char):
+                try:
+                    return int(stamps_to_ns([line[:offset + width]], fmt, offset)[0])
+                except ValueError:
+                    continue
+        return None
+
+    with open(filename, 'rb') as f:
+        head = f.read(blocksize)
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(max(size - blocksize, 0))
+        tail = f.read()
+
+    # 末尾のブロックの最初の行は途中から始まっている可能性があるので使わない
+    tail_lines = tail.splitlines()
+    if size > blocksize:
+        tail_lines = tail_lines[1:]
+
+    start = stamped(head.splitlines())
+    end = stamped(reversed(tail_lines))
+    if start is None or end is None:
+        raise ValueError(f"No timestamped lines in {filename}")
+
+    return start, end
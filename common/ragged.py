@@ -0,0 +1,22 @@
+#!python3
+
+import numpy as np
+
+"""
+長さの違う配列（スキャン・スカイディップごとの点の配列など）をまとめて計算するための配列操作モジュール。
+
+peakfind.fit_gaussians, skydipfit.fit_lines のように全行をまとめて解く関数は 行数 × 点数 の2次元配列を受け取るので、
+長さの違う1次元配列のリストは足りない部分を nan で埋めてから渡す（nan の点は各関数で使わない）。
+"""
+
+
+def pad(arrays, fill=np.nan):
+    """
+    長さの違う1次元配列のリストを、足りない部分を fill で埋めた 行数 × 最大の長さ の2次元配列にする。
+    """
+    arrays = [np.asarray(a, dtype=np.float64).ravel() for a in arrays]
+    ret = np.full((len(arrays), max((a.size for a in arrays), default=0)), fill, dtype=np.float64)
+    for i, a in enumerate(arrays):
+        ret[i, :a.size] = a
+
+    return ret
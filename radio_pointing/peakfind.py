@@ -0,0 +1,275 @@
+#!python3
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import ragged
+
+"""
+クロススキャンのピーク中心を自動で求めるモジュール。
+
+rp_plot.py で閾値線を手で動かすかわりに、スキャン（横軸：スキャンオフセット、縦軸：T_B）ごとに
+両端の点で1次のベースラインを決め、ベースラインからの高さの半値の交点（半値全幅の両端）を線形補間で求めて、
+その中点をピーク中心とする (method='halfmax')。
+method='gauss' の場合は、その結果を初期値にして ガウス関数 + 1次のベースライン をフィッティングし、ガウス関数の中心を使う。
+ガウス関数のフィッティングは、スキャンごとに curve_fit を呼ぶかわりに、全スキャン（スキャン数 × 点数 の配列、
+点数が違う場合は nan で埋める）をまとめて、解析的なヤコビアンを使った Levenberg-Marquardt 法で一度に解く。
+"""
+
+# ピーク中心の求め方
+METHODS = ('halfmax', 'gauss')
+
+# ベースラインを決めるのに使う、スキャンの両端の点の割合
+EDGE_FRACTION = 0.15
+
+# FWHM = 2 sqrt(2 ln2) sigma
+FWHM_PER_SIGMA = 2 * np.sqrt(2 * np.log(2))
+
+# Levenberg-Marquardt 法の最大反復回数と収束判定（残差の二乗和の相対変化）
+MAX_ITER = 100
+TOL = 1e-10
+# lam が大きくなりすぎて止まったスキャンを収束とする、ガウス-ニュートン法のステップの大きさの上限（パラメーターに対する相対値）
+XTOL = 1e-8
+
+
+def gaussian(x, amplitude, center, sigma, c0, c1):
+    """
+    ガウス関数 + 1次のベースライン。
+    """
+    return amplitude * np.exp(-0.5 * ((x - center) / sigma) ** 2) + c0 + c1 * x
+
+
+def gaussian_jacobian(x, amplitude, center, sigma):
+    """
+    gaussian の (amplitude, center, sigma, c0, c1) についての偏微分を、x の形 + (5,) の配列で返す。
+    amplitude, center, sigma は x とブロードキャストできる形。
+    """
+    u = (x - center) / sigma
+    e = np.exp(-0.5 * u ** 2)
+
+    return np.stack([e, amplitude * e * u / sigma, amplitude * e * u ** 2 / sigma, np.ones_like(x), x], axis=-1)
+
+
+def _sorted_scan(x, y):
+    """
+    x, y が有限な点を x の昇順に並べて返す。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    ok = np.isfinite(x) & np.isfinite(y)
+    x, y = x[ok], y[ok]
+    order = np.argsort(x, kind='stable')
+
+    return x[order], y[order]
+
+
+def _crossing(x, y, i, level):
+    """
+    x[i], x[i+1] の間で y が level になる x を線形補間で求める。
+    """
+    return x[i] + (level - y[i]) * (x[i + 1] - x[i]) / (y[i + 1] - y[i])
+
+
+def half_max(x, y, edge=EDGE_FRACTION):
+    """
+    1つのスキャンの半値の交点からピーク中心を求め、結果を辞書で返す。
+    center, fwhm, amplitude : ピーク中心、半値全幅、ベースラインからの高さ（x, y と同じ単位）
+    crossings               : 半値の交点 [左, 右]
+    baseline                : ベースラインの係数 (c0, c1)
+    x, y, level             : 並べ直した x, y と、半値の高さ（ベースライン + amplitude/2、プロット用）
+    交点が両側に見つからない場合、center などは nan になる。
+    """
+    x, y = _sorted_scan(x, y)
+    nan = {'center': np.nan, 'fwhm': np.nan, 'amplitude': np.nan, 'crossings': [], 'baseline': (np.nan, np.nan),
+           'x': x, 'y': y, 'level': np.full(x.size, np.nan)}
+    if x.size < 5:
+        return nan
+
+    # 両端の点でベースラインを決め、ベースラインからの高さで半値を求める
+    n_edge = max(2, int(round(x.size * edge)))
+    edge_index = np.r_[:n_edge, x.size - n_edge:x.size]
+    c1, c0 = np.polyfit(x[edge_index], y[edge_index], 1)
+    height = y - (c0 + c1 * x)
+
+    i_peak = int(np.argmax(height))
+    amplitude = height[i_peak]
+    below = height < amplitude / 2
+
+    # ピークの左側で最後に半値を下回る点と、右側で最初に半値を下回る点
+    left = np.flatnonzero(below[:i_peak])
+    right = np.flatnonzero(below[i_peak:])
+    if amplitude <= 0 or left.size == 0 or right.size == 0:
+        return nan
+
+    x_left = _crossing(x, height, left[-1], amplitude / 2)
+    x_right = _crossing(x, height, i_peak + right[0] - 1, amplitude / 2)
+
+    ret = {}
+    ret['center'] = (x_left + x_right) / 2
+    ret['fwhm'] = x_right - x_left
+    ret['amplitude'] = amplitude
+    ret['crossings'] = [x_left, x_right]
+    ret['baseline'] = (c0, c1)
+    ret['x'] = x
+    ret['y'] = y
+    ret['level'] = c0 + c1 * x + amplitude / 2
+
+    return ret
+
+
+def _residual_jacobian(p, x, y, ok):
+    """
+    全スキャンの残差（モデル - データ、使わない点は 0）とヤコビアンを計算する。
+    """
+    amplitude, center, sigma = p[:, 0:1], p[:, 1:2], p[:, 2:3]
+    r = np.where(ok, gaussian(x, amplitude, center, sigma, p[:, 3:4], p[:, 4:5]) - y, 0.0)
+    J = np.where(ok[:, :, None], gaussian_jacobian(x, amplitude, center, sigma), 0.0)
+
+    return r, J
+
+
+def _solve(A, b):
+    """
+    行数 × 5 × 5 の連立方程式をまとめて解く（特異な行列を含む場合は擬似逆行列を使う）。
+    """
+    try:
+        return np.linalg.solve(A, b[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return np.einsum('nij,nj->ni', np.linalg.pinv(A), b)
+
+
+def fit_gaussians(xs, ys, p0, max_iter=MAX_ITER, tol=TOL):
+    """
+    全スキャンに ガウス関数 + 1次のベースライン をまとめてフィッティングし、結果を辞書で返す。
+    xs, ys はスキャンごとの配列のリスト（または スキャン数 × 点数 の配列、nan の点は使わない）、
+    p0 はスキャン数 × 5 の初期値 (amplitude, center, sigma, c0, c1)（nan を含むスキャンはフィッティングしない）。
+
+    popt, cov      : スキャン数 × 5 のパラメーターと スキャン数 × 5 × 5 の共分散行列（残差の分散でスケール）
+    center, center_err, sigma, amplitude : ガウス関数の中心とその誤差、幅、高さ
+    chi2_red, n    : 残差の二乗和を自由度 (n - 5) で割った値と使った点数
+    success        : フィッティングして、中心と誤差が有限のスキャン
+    converged      : max_iter 回までに残差の二乗和の変化が tol 以下になったスキャン（lam が大きくなりすぎて止まったスキャンは、
+                     その点からのガウス-ニュートン法のステップが XTOL 以下の場合（最小値で丸め誤差のために残差が減らない場合）だけ含む）
+    model          : スキャン数 × 点数 のフィッティング曲線
+    """
+    x = ragged.pad(xs) if isinstance(xs, (list, tuple)) else np.atleast_2d(np.asarray(xs, dtype=np.float64))
+    y = ragged.pad(ys) if isinstance(ys, (list, tuple)) else np.atleast_2d(np.asarray(ys, dtype=np.float64))
+    ok = np.isfinite(x) & np.isfinite(y)
+    x0 = np.where(ok, x, 0.0)
+    y0 = np.where(ok, y, 0.0)
+    n = ok.sum(axis=1)
+
+    p = np.array(p0, dtype=np.float64).reshape(-1, 5)
+    fit = np.all(np.isfinite(p), axis=1) & (n > 5) & (p[:, 2] != 0)
+    p[~fit] = (1.0, 0.0, 1.0, 0.0, 0.0)  # フィッティングしないスキャンは計算が nan にならない値にしておく
+
+    # 各スキャンごとに減衰係数 lam を調整する。改善すれば lam を小さく（ガウス-ニュートン法寄り）、しなければ大きく（最急降下法寄り）
+    lam = np.full(len(p), 1e-3)
+    active = fit.copy()
+    converged = np.zeros(len(p), dtype=bool)
+    r, J = _residual_jacobian(p, x0, y0, ok)
+    cost = (r ** 2).sum(axis=1)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+
+        JTJ = np.einsum('nmi,nmj->nij', J, J)
+        g = np.einsum('nmi,nm->ni', J, r)
+        diag = np.diagonal(JTJ, axis1=1, axis2=2)
+        A = JTJ + (lam[:, None] * (diag + 1e-12 * diag.max(axis=1, keepdims=True)))[:, :, None] * np.eye(5)
+        step = -_solve(A, g)
+
+        p_new = np.where(active[:, None], p + step, p)
+        r_new, J_new = _residual_jacobian(p_new, x0, y0, ok)
+        cost_new = (r_new ** 2).sum(axis=1)
+
+        better = active & np.isfinite(cost_new) & (cost_new < cost)
+        done = better & (cost - cost_new <= tol * cost)
+        p = np.where(better[:, None], p_new, p)
+        r = np.where(better[:, None], r_new, r)
+        J = np.where(better[:, None, None], J_new, J)
+        cost = np.where(better, cost_new, cost)
+        lam = np.where(better, lam * 0.3, lam * 10)
+
+        # 残差がほとんど変わらなくなったスキャンは収束として終了し、lam が大きくなりすぎて進めなくなったスキャンは収束せずに終了
+        converged |= done
+        active &= ~(done | (lam > 1e10))
+
+    # lam が大きくなりすぎて止まったスキャンは、減衰なしのステップがパラメーターに比べて十分小さければ収束とする
+    # （ステップとパラメーターは J の列のノルムで重み付けして、モデルの値の単位で比べる）
+    stalled = fit & ~converged & (lam > 1e10)
+    if stalled.any():
+        JTJ = np.einsum('nmi,nmj->nij', J, J)
+        g = np.einsum('nmi,nm->ni', J, r)
+        diag = np.diagonal(JTJ, axis1=1, axis2=2)
+        step = -_solve(JTJ + (1e-12 * diag.max(axis=1, keepdims=True))[:, :, None] * np.eye(5), g)
+        scale = np.sqrt(diag)
+        small = np.linalg.norm(scale * step, axis=1) <= XTOL * np.linalg.norm(scale * p, axis=1)
+        converged |= stalled & small
+
+    dof = n - 5
+    with np.errstate(invalid='ignore', divide='ignore'):
+        chi2_red = np.where(dof > 0, cost / np.maximum(dof, 1), np.nan)
+        cov = np.linalg.pinv(np.einsum('nmi,nmj->nij', J, J)) * chi2_red[:, None, None]
+    p[~fit] = np.nan
+    cov[~fit] = np.nan
+    chi2_red[~fit] = np.nan
+    with np.errstate(invalid='ignore'):
+        center_err = np.sqrt(cov[:, 1, 1])
+
+    success = fit & np.isfinite(p[:, 1]) & np.isfinite(center_err)
+
+    ret = {}
+    ret['popt'] = p
+    ret['cov'] = cov
+    ret['amplitude'] = p[:, 0]
+    ret['center'] = p[:, 1]
+    ret['center_err'] = center_err
+    ret['sigma'] = np.abs(p[:, 2])
+    ret['chi2_red'] = chi2_red
+    ret['n'] = n
+    ret['success'] = success
+    ret['converged'] = converged
+    ret['model'] = np.where(ok, gaussian(x0, *(p[:, k:k + 1] for k in range(5))), np.nan)
+
+    return ret
+
+
+def find_peaks(xs, ys, method='halfmax', edge=EDGE_FRACTION):
+    """
+    全スキャン（スキャンごとの x, y の配列のリスト）のピーク中心を method ('halfmax' または 'gauss') で求め、
+    スキャンごとの結果の辞書のリストを返す（内容は half_max と同じ）。
+    gauss の場合は half_max の結果を初期値にして fit_gaussians で全スキャンをまとめてフィッティングし、
+    center, center_err, fwhm, amplitude をフィッティング結果にして、popt, model（並べ直した x でのフィッティング曲線）を加える。
+    フィッティングできなかったスキャンと、max_iter 回までに収束しなかったスキャンは center などが nan になる。
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown peak method: {method} (one of {', '.join(METHODS)})")
+
+    peaks = [half_max(x, y, edge) for x, y in zip(xs, ys)]
+    if method == 'halfmax' or not peaks:
+        return peaks
+
+    p0 = [(peak['amplitude'], peak['center'], peak['fwhm'] / FWHM_PER_SIGMA) + tuple(peak['baseline']) for peak in peaks]
+    fit = fit_gaussians([peak['x'] for peak in peaks], [peak['y'] for peak in peaks], p0)
+
+    for i, peak in enumerate(peaks):
+        ok = fit['success'][i] and fit['converged'][i]
+        peak['center'] = fit['center'][i] if ok else np.nan
+        peak['center_err'] = fit['center_err'][i] if ok else np.nan
+        peak['fwhm'] = fit['sigma'][i] * FWHM_PER_SIGMA if ok else np.nan
+        peak['amplitude'] = fit['amplitude'][i] if ok else np.nan
+        peak['popt'] = fit['popt'][i]
+        peak['model'] = fit['model'][i, :peak['x'].size]
+
+    return peaks
+
+
+def find_peak(x, y, method='halfmax', edge=EDGE_FRACTION):
+    """
+    1つのスキャンのピーク中心を method ('halfmax' または 'gauss') で求める。
+    """
+    return find_peaks([x], [y], method, edge)[0]
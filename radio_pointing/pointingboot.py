@@ -0,0 +1,98 @@
+#!python3
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+"""
+器差パラメーターの誤差（ブートストラップ）を求めるモジュール。
+
+offset_L.txt, offset_C.txt の行（1行が dAZ の行と dEL の行の組）を重複を許して選び直したデータセットを n_boot 個作り、
+pointingfit.linear_system の計画行列の行を選び直すだけで全データセットの最小二乗解をまとめて求める（計画行列は作り直さない）。
+重みは元のデータセットの重みをそのまま使う。
+"""
+
+# ブートストラップを1回の計算でまとめて解く個数（メモリ使用量の上限）
+CHUNK_SIZE = 200
+
+
+def _bootstrap_chunk(args):
+    """
+    n_boot 個分のブートストラップの最小二乗解と RMS を計算する（ProcessPoolExecutor 用）。
+    """
+    A, y, w, n_boot, seed = args
+    rng = np.random.default_rng(seed)
+    n = y.size // 2
+
+    # 行 i を選ぶと、dAZ の行 i と dEL の行 n + i を使う
+    pick = rng.integers(0, n, (n_boot, n))
+    rows = np.concatenate((pick, pick + n), axis=1)
+
+    Aw = (A * w[:, None])[rows]
+    yw = (y * w)[rows]
+    popt = (np.linalg.pinv(Aw) @ yw[..., None])[..., 0]
+
+    y_b = y[rows]
+    residual = y_b - np.einsum('bij,bj->bi', A[rows], popt)
+
+    ret = {}
+    ret['popt'] = popt
+    ret['before_rms'] = np.sqrt(np.mean(y_b[:, :n] ** 2 + y_b[:, n:] ** 2, axis=1)) * 3600
+    ret['after_rms'] = np.sqrt(np.mean(residual[:, :n] ** 2 + residual[:, n:] ** 2, axis=1)) * 3600
+
+    return ret
+
+
+def bootstrap(A, y, w=None, n_boot=1000, seed=None, workers=1):
+    """
+    計画行列 A、観測値 y、重み w（pointingfit.linear_system の戻り値。dAZ の行, dEL の行 の順）から、
+    ブートストラップした器差パラメーター popt（n_boot × パラメーター数）と、
+    フィッティング前後の RMS before_rms, after_rms [arcsec]（長さ n_boot）の辞書を返す。
+    CHUNK_SIZE 個ずつまとめて計算し、workers が1でない場合はプロセスプールで並列に計算する（None の場合は CPU 数）。
+    乱数列はまとめる単位ごとに seed から分岐させるので、同じ seed なら workers によらず同じ結果になる。
+    """
+    A = np.asarray(A, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    w = np.ones(y.size) if w is None else np.broadcast_to(np.asarray(w, dtype=np.float64), y.shape)
+
+    # CHUNK_SIZE 個ずつに分け、分けた単位ごとに seed から乱数列を分岐させる
+    sizes = [min(CHUNK_SIZE, n_boot - i) for i in range(0, n_boot, CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(A, y, w, size, s) for size, s in zip(sizes, seeds)]
+
+    if workers == 1 or len(tasks) == 1:
+        chunks = list(map(_bootstrap_chunk, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_bootstrap_chunk, tasks))
+
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in ('popt', 'before_rms', 'after_rms')}
+
+
+def summarize(popt, samples, params, ci=0.68):
+    """
+    全データの器差パラメーター popt とブートストラップの結果 samples から、以下の辞書を返す。
+    params     : パラメーター名 → {estimate, err（標準偏差）, low, high（パーセンタイル区間）}
+    err        : 誤差の配列（params の順）
+    corr       : 相関行列
+    before_rms, after_rms : RMS [arcsec] の分布の {mean, median, low, high}
+    n          : ブートストラップの個数
+    """
+    values = np.asarray(samples['popt'], dtype=np.float64)
+    err = values.std(axis=0, ddof=1)
+    low, high = np.percentile(values, [50 * (1 - ci), 50 * (1 + ci)], axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = np.corrcoef(values, rowvar=False)
+
+    ret = {}
+    ret['params'] = {name: {'estimate': float(popt[k]), 'err': float(err[k]), 'low': float(low[k]), 'high': float(high[k])}
+                     for k, name in enumerate(params)}
+    ret['err'] = err
+    ret['corr'] = corr
+    for key in ('before_rms', 'after_rms'):
+        rms = np.asarray(samples[key], dtype=np.float64)
+        rms_low, rms_high = np.percentile(rms, [50 * (1 - ci), 50 * (1 + ci)])
+        ret[key] = {'mean': float(rms.mean()), 'median': float(np.median(rms)), 'low': float(rms_low), 'high': float(rms_high)}
+    ret['n'] = int(values.shape[0])
+
+    return ret
@@ -0,0 +1,221 @@
+#!python3
+
+import numpy as np
+from scipy.optimize import least_squares
+
+"""
+器差モデルのフィッティングの線形代数をまとめたモジュール。
+
+器差モデルは dAZ = D_az(AZ, EL) B, dEL = D_el(AZ, EL) B のように器差パラメーター B について線形なので、
+観測点ごとの基底関数の値を並べた計画行列を1回だけ作り、重み付き最小二乗問題を SVD で直接解く
+（least_squares の反復と数値微分が要らない）。least_squares で反復する場合も、残差とヤコビアンは同じ計画行列から作る。
+
+輝線データ (AZ, EL, dAZ, dEL) と連続波データ (AZ1, EL1, dAZ, AZ2, EL2, dEL) は、
+dAZ の行（AZスキャンの位置で評価）と dEL の行（ELスキャンの位置で評価）に分けてまとめて扱う。
+輝線データは AZスキャンと ELスキャンの位置が同じとみなす。
+"""
+
+
+# ロバストフィッティングの方法と、残差の閾値（ロバストな標準偏差の何倍か）のデフォルト
+# clip: 閾値を超えた点の重みを 0 にする（シグマクリッピング）, huber: Huber 損失, cauchy: Cauchy 損失
+ROBUST_METHODS = ('clip', 'huber', 'cauchy')
+ROBUST_THRESHOLD = {'clip': 3.0, 'huber': 1.345, 'cauchy': 2.385}
+ROBUST_MAX_ITER = 50
+
+
+def stack_offsets(AZ, EL, dAZ_obs_L, dEL_obs_L, AZ1, EL1, dAZ_obs_C, AZ2, EL2, dEL_obs_C):
+    """
+    輝線データと連続波データを、dAZ の行と dEL の行に分けてまとめた辞書を返す（単位は全て [deg]）。
+    AZ_az, EL_az, dAZ : dAZ の行の位置と観測値（輝線データ, 連続波データ の順）
+    AZ_el, EL_el, dEL : dEL の行の位置と観測値（同上）
+    w_az, w_el        : dAZ, dEL の行の重み。rp_instrument.py の残差関数と同じく、輝線・連続波の片方だけの場合は
+                        観測値の標準偏差の逆数、両方ある場合は 1
+    n_L, n_C          : 輝線データ・連続波データの点数
+    """
+    AZ, EL, dAZ_obs_L, dEL_obs_L = (np.asarray(a, dtype=np.float64) for a in (AZ, EL, dAZ_obs_L, dEL_obs_L))
+    AZ1, EL1, dAZ_obs_C, AZ2, EL2, dEL_obs_C = (np.asarray(a, dtype=np.float64) for a in (AZ1, EL1, dAZ_obs_C, AZ2, EL2, dEL_obs_C))
+
+    ret = {}
+    ret['AZ_az'] = np.concatenate((AZ, AZ1))
+    ret['EL_az'] = np.concatenate((EL, EL1))
+    ret['dAZ'] = np.concatenate((dAZ_obs_L, dAZ_obs_C))
+    ret['AZ_el'] = np.concatenate((AZ, AZ2))
+    ret['EL_el'] = np.concatenate((EL, EL2))
+    ret['dEL'] = np.concatenate((dEL_obs_L, dEL_obs_C))
+    ret['n_L'] = AZ.size
+    ret['n_C'] = AZ1.size
+
+    if ret['n_L'] and ret['n_C']:
+        ret['w_az'] = ret['w_el'] = 1.0
+    else:
+        ret['w_az'] = 1.0 / np.std(ret['dAZ'])
+        ret['w_el'] = 1.0 / np.std(ret['dEL'])
+
+    return ret
+
+
+def linear_system(design, data):
+    """
+    計画行列 A（dAZ の行, dEL の行 の順）、観測値 y、重み w を返す。
+    design(AZ, EL) は各点の (dAZ の基底関数の値, dEL の基底関数の値)（点数 × パラメーター数 の配列2つ）を返す関数。
+    """
+    D_az, _ = design(data['AZ_az'], data['EL_az'])
+    _, D_el = design(data['AZ_el'], data['EL_el'])
+
+    A = np.vstack((D_az, D_el))
+    y = np.concatenate((data['dAZ'], data['dEL']))
+    w = np.concatenate((np.full(data['dAZ'].size, data['w_az']), np.full(data['dEL'].size, data['w_el'])))
+
+    return A, y, w
+
+
+def model_values(A, popt, data):
+    """
+    計画行列 A（linear_system の戻り値）から、輝線データ・連続波データのモデルの値 [deg] を辞書で返す。
+    dAZ_L, dEL_L : 輝線データの (AZ, EL) での dAZ, dEL
+    dAZ_C, dEL_C : 連続波データの AZスキャン・ELスキャンの位置での dAZ, dEL
+    """
+    values = A @ np.asarray(popt, dtype=np.float64)
+    n_az = data['dAZ'].size
+    dAZ, dEL = values[:n_az], values[n_az:]
+
+    ret = {}
+    ret['dAZ_L'] = dAZ[:data['n_L']]
+    ret['dEL_L'] = dEL[:data['n_L']]
+    ret['dAZ_C'] = dAZ[data['n_L']:]
+    ret['dEL_C'] = dEL[data['n_L']:]
+
+    return ret
+
+
+def solve_linear(A, y, w=None):
+    """
+    重み付き最小二乗問題 min Σ (w (y - A B))^2 を SVD (np.linalg.lstsq) で解き、結果を辞書で返す。
+    popt     : パラメーター（計画行列の列が足りない（ランク落ちの）場合は最小ノルム解）
+    cov, perr: 共分散行列（残差の重み付き二乗和 / 自由度 でスケール）とパラメーターの誤差
+    residual : 重みを掛けていない残差 y - A popt
+    chi2, dof, rank : 残差の重み付き二乗和、自由度（点数 - ランク）、計画行列のランク
+    """
+    A = np.asarray(A, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    w = np.ones(y.size) if w is None else np.broadcast_to(np.asarray(w, dtype=np.float64), y.shape)
+
+    Aw = A * w[:, None]
+    popt, _, rank, _ = np.linalg.lstsq(Aw, y * w, rcond=None)
+
+    return _fit_result(A, y, w, popt, rank)
+
+
+def solve_least_squares(A, y, w=None, initial_guess=None):
+    """
+    solve_linear と同じ問題を scipy.optimize.least_squares で反復して解き、solve_linear と同じ形式の辞書で返す。
+    残差 w (y - A B) のヤコビアンは -w A（計画行列から作る解析的なヤコビアン）。
+    initial_guess の数がパラメーター数と違う場合は 0 から始める。
+    """
+    A = np.asarray(A, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    w = np.ones(y.size) if w is None else np.broadcast_to(np.asarray(w, dtype=np.float64), y.shape)
+    if initial_guess is None or len(initial_guess) != A.shape[1]:
+        initial_guess = np.zeros(A.shape[1])
+
+    Aw = A * w[:, None]
+    yw = y * w
+    result = least_squares(lambda B: yw - Aw @ B, initial_guess, jac=lambda B: -Aw)
+    popt = result.x
+
+    return _fit_result(A, y, w, popt, np.linalg.matrix_rank(Aw))
+
+
+def _fit_result(A, y, w, popt, rank):
+    """
+    solve_linear, solve_least_squares で求めたパラメーター popt から、残差・共分散行列などの結果の辞書を作る（形式は solve_linear）。
+    """
+    Aw = A * w[:, None]
+    residual = y - A @ popt
+    chi2 = float(np.sum((w * residual) ** 2))
+    dof = y.size - rank
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = np.linalg.pinv(Aw.T @ Aw) * (chi2 / dof if dof > 0 else np.nan)
+
+    ret = {}
+    ret['popt'] = popt
+    ret['cov'] = cov
+    ret['perr'] = np.sqrt(np.diag(cov))
+    ret['residual'] = residual
+    ret['chi2'] = chi2
+    ret['dof'] = dof
+    ret['rank'] = int(rank)
+
+    return ret
+
+
+def robust_weight(r, method='clip', threshold=None):
+    """
+    標準化した残差 r（残差 / ロバストな標準偏差）に対する各行の重み（0 - 1）を返す。
+    """
+    if threshold is None:
+        threshold = ROBUST_THRESHOLD[method]
+    a = np.abs(r) / threshold
+
+    if method == 'clip':
+        return (a <= 1).astype(np.float64)
+    elif method == 'huber':
+        return np.minimum(1.0, 1 / np.maximum(a, 1e-300))
+    elif method == 'cauchy':
+        return 1 / (1 + a ** 2)
+    raise ValueError(f"Unknown robust method: {method} (one of {', '.join(ROBUST_METHODS)})")
+
+
+def solve_robust(A, y, w=None, method='clip', threshold=None, max_iter=ROBUST_MAX_ITER, tol=1e-6):
+    """
+    同じ計画行列 A の行の重みだけを変えて solve_linear を繰り返す（反復重み付き最小二乗法）ロバストフィッティング。
+    各反復で重み付き残差をロバストな標準偏差 sigma = 1.4826 × 中央値(|残差|)（重み 0 の行を除く）で標準化し、
+    robust_weight の重みを掛ける。clip は除外する行が変わらなくなるまで、huber, cauchy は重みの変化が tol 未満になるまで繰り返す。
+    solve_linear の戻り値に以下を加えた辞書を返す（行は A と同じ dAZ の行, dEL の行 の順）。
+    weight   : ロバストフィッティングの各行の重み（0 - 1）
+    rejected : clip では重み 0 の（フィッティングに使わなかった）行、huber, cauchy では残差が threshold × sigma を超えた行
+    sigma    : 最後の反復のロバストな標準偏差（重み付き残差の単位）
+    n_iter, converged : 反復回数と収束したかどうか
+    """
+    if method not in ROBUST_METHODS:
+        raise ValueError(f"Unknown robust method: {method} (one of {', '.join(ROBUST_METHODS)})")
+    if threshold is None:
+        threshold = ROBUST_THRESHOLD[method]
+
+    A = np.asarray(A, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    w = np.ones(y.size) if w is None else np.broadcast_to(np.asarray(w, dtype=np.float64), y.shape)
+
+    weight = np.ones(y.size)
+    converged = False
+    for n_iter in range(1, max_iter + 1):
+        fit = solve_linear(A, y, w * np.sqrt(weight))
+        r = w * fit['residual']
+        used = weight > 0
+        sigma = 1.4826 * np.median(np.abs(r[used])) if used.any() else 0.0
+        if sigma <= 0:
+            converged = True
+            break
+
+        new_weight = robust_weight(r / sigma, method, threshold)
+        change = np.max(np.abs(new_weight - weight))
+        weight = new_weight
+        if change < tol:
+            converged = True
+            break
+
+    # 最後の重みで解き直す
+    if sigma > 0:
+        fit = solve_linear(A, y, w * np.sqrt(weight))
+
+    fit['weight'] = weight
+    if method == 'clip':
+        # 最後に解き直した残差ではなく、フィッティングに使わなかった行（重み 0）を除外した行とする
+        fit['rejected'] = weight == 0
+    else:
+        fit['rejected'] = np.abs(w * fit['residual']) > threshold * sigma if sigma > 0 else np.zeros(y.size, dtype=bool)
+    fit['sigma'] = float(sigma)
+    fit['n_iter'] = n_iter
+    fit['converged'] = converged
+
+    return fit
@@ -0,0 +1,272 @@
+#!python3
+
+import re
+
+import numpy as np
+
+"""
+器差モデルの定義（宣言）モジュール。
+
+器差モデルは、dAZ, dEL それぞれを「器差パラメーター × 基底関数」の和として文字列で宣言する（MODEL_DEFS）。
+宣言は読み込み時に1回だけ解析して、基底関数の値 → dAZ, dEL の係数の行列 (S_az, S_el) にしておき、
+計画行列 D = T S（T は 点数 × 基底関数の数 の基底関数の値）、モデルの値 D @ B、残差、ヤコビアン、
+ant30_phaseC0.conf の AntRadioInst0-2 の並びを全てこの宣言から作る。
+
+新しいモデルは MODEL_DEFS に1項目追加するだけで、rp_instrument.py のメニュー・フィッティング・conf の読み書きに使える。
+基底関数が足りない場合は BASIS に追加する。
+
+基底関数の値は データ (AZ, EL) ごとに1回だけ 点数 × 基底関数の数 の連続した float64 の配列として計算してキャッシュし（features）、
+計画行列もデータ・モデルごとにキャッシュする。フィッティング・モデルの値・プロットで同じデータを何度使っても三角関数は計算し直さない。
+"""
+
+# 基底関数（f は features() の辞書。sin, cos は AZ, EL それぞれ1回だけ計算し、和・差・積はそこから作る）
+BASIS = {
+    '1': lambda f: np.ones_like(f['EL']),
+    'sin(AZ)': lambda f: f['sin_AZ'],
+    'cos(AZ)': lambda f: f['cos_AZ'],
+    'sin(EL)': lambda f: f['sin_EL'],
+    'cos(EL)': lambda f: f['cos_EL'],
+    'tan(EL)': lambda f: f['sin_EL'] / f['cos_EL'],
+    '1/cos(EL)': lambda f: 1 / f['cos_EL'],
+    'sin(AZ-EL)': lambda f: f['sin_AZ'] * f['cos_EL'] - f['cos_AZ'] * f['sin_EL'],
+    'cos(AZ-EL)': lambda f: f['cos_AZ'] * f['cos_EL'] + f['sin_AZ'] * f['sin_EL'],
+    'sin(AZ+EL)': lambda f: f['sin_AZ'] * f['cos_EL'] + f['cos_AZ'] * f['sin_EL'],
+    'cos(AZ+EL)': lambda f: f['cos_AZ'] * f['cos_EL'] - f['sin_AZ'] * f['sin_EL'],
+    'cos(AZ)tan(EL)': lambda f: f['cos_AZ'] * f['sin_EL'] / f['cos_EL'],
+    'sin(AZ)tan(EL)': lambda f: f['sin_AZ'] * f['sin_EL'] / f['cos_EL'],
+    'cos(AZ)cos(EL)': lambda f: f['cos_AZ'] * f['cos_EL'],
+    'cos(AZ)sin(EL)': lambda f: f['cos_AZ'] * f['sin_EL'],
+    'sin(AZ)cos(EL)': lambda f: f['sin_AZ'] * f['cos_EL'],
+    'EL[deg]': lambda f: f['EL'],
+}
+
+# 器差モデルの宣言
+# title      : メニューに表示する名前
+# params     : 器差パラメーター名（この順に並べたものが popt, ant30_phaseC0.conf の AntRadioInst0, 1, 2 の並び）
+# dAZ, dEL   : "パラメーター 基底関数" の和（基底関数を省略した項は定数項）
+# conf_width : ant30_phaseC0.conf の AntRadioInst0-2 の1行の値の数（足りない部分は 0 で埋める）
+MODEL_DEFS = {
+    '60cm_model': {
+        'title': '60 cm telescope model (Nakajima et al. 2007)',
+        'params': [f"B{i}" for i in range(6)],
+        'dAZ': 'B0 sin(AZ-EL) + B1 cos(AZ-EL) + B2 + B4 cos(EL) - B5 sin(EL)',
+        'dEL': 'B0 cos(AZ-EL) - B1 sin(AZ-EL) + B3 + B4 sin(EL) + B5 cos(EL)',
+        'conf_width': 4,
+    },
+    '60cm_model_2': {
+        'title': '60 cm model 改良版',
+        'params': [f"B{i}" for i in range(10)],
+        'dAZ': '- B0 sin(AZ-EL) + B1 cos(AZ-EL) + B2 + B4 cos(EL) - B5 sin(EL) + B6 cos(AZ) - B7 sin(AZ) + B8 cos(AZ+EL) - B9 sin(AZ+EL)',
+        'dEL': 'B0 cos(AZ-EL) + B3 - B4 sin(EL) + B5 cos(EL) + B6 sin(AZ) + B7 cos(AZ) + B8 sin(AZ+EL) + B9 cos(AZ+EL)',  # B1 sin(EL-EL) = 0
+        'conf_width': 4,
+    },
+    'optical_model': {
+        'title': 'Optical pointing model (Koyama master thesis 2021)',
+        'params': [f"A{i}" for i in range(1, 16)],
+        'dAZ': ('A1 + A2 cos(AZ)tan(EL) + A3 sin(AZ)tan(EL) + A4 tan(EL) + A5 1/cos(EL) + A8 cos(AZ) + A9 sin(AZ)'
+                ' + A12 cos(AZ)cos(EL) + A13 cos(AZ)sin(EL) + A14 sin(AZ)cos(EL) + A15 EL[deg]'),
+        'dEL': '- A2 sin(AZ) + A3 cos(AZ) + A6 + A7 cos(EL) + A10 cos(AZ) + A11 sin(AZ)',
+        'conf_width': 5,
+    },
+}
+
+# ant30_phaseC0.conf の器差パラメーターの行
+CONF_KEYS = ('AntRadioInst0', 'AntRadioInst1', 'AntRadioInst2')
+
+# features() のキャッシュに残すデータの数（古いものから消す）
+FEATURE_CACHE_SIZE = 8
+
+term_format = re.compile(r'^(\w+)\s*(.*)$')
+
+
+def _split_terms(expr):
+    """
+    "B0 sin(AZ-EL) - B1 ..." を括弧の外の +, - で分けて、(符号, 項) のリストにする。
+    """
+    terms = []
+    sign, start, depth = 1.0, 0, 0
+    for i, c in enumerate(expr):
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c in '+-' and depth == 0:
+            if expr[start:i].strip():
+                terms.append((sign, expr[start:i].strip()))
+            sign, start = (1.0 if c == '+' else -1.0), i + 1
+    if expr[start:].strip():
+        terms.append((sign, expr[start:].strip()))
+
+    return terms
+
+
+def parse_expression(expr, params):
+    """
+    dAZ, dEL の宣言を解析し、{(パラメーター, 基底関数): 係数} の辞書を返す。
+    """
+    ret = {}
+    for sign, term in _split_terms(expr):
+        match = term_format.match(term)
+        if match is None or match.group(1) not in params:
+            raise ValueError(f"Invalid term '{term}' in '{expr}'")
+        basis = match.group(2).replace(' ', '').replace('*', '') or '1'
+        if basis not in BASIS:
+            raise ValueError(f"Unknown basis function '{basis}' in '{expr}' (add it to BASIS)")
+        key = (match.group(1), basis)
+        ret[key] = ret.get(key, 0.0) + sign
+
+    return ret
+
+
+def compile_model(name, definition):
+    """
+    宣言から、使う基底関数のリスト terms と 基底関数の数 × パラメーター数 の係数の行列 S_az, S_el を作る。
+    """
+    params = list(definition['params'])
+    coef_az = parse_expression(definition['dAZ'], params)
+    coef_el = parse_expression(definition['dEL'], params)
+    terms = sorted({basis for _, basis in list(coef_az) + list(coef_el)}, key=list(BASIS).index)
+
+    S_az = np.zeros((len(terms), len(params)))
+    S_el = np.zeros((len(terms), len(params)))
+    for S, coef in ((S_az, coef_az), (S_el, coef_el)):
+        for (param, basis), value in coef.items():
+            S[terms.index(basis), params.index(param)] = value
+
+    ret = dict(definition)
+    ret['name'] = name
+    ret['params'] = params
+    ret['terms'] = terms
+    ret['S_az'] = S_az
+    ret['S_el'] = S_el
+    ret['columns'] = [list(BASIS).index(term) for term in terms]
+
+    return ret
+
+
+MODELS = {name: compile_model(name, definition) for name, definition in MODEL_DEFS.items()}
+
+
+_feature_cache = {}
+
+
+def features(AZ, EL):
+    """
+    データ (AZ, EL) [deg] の基底関数の値をまとめた辞書を返す。同じ値のデータは2回目以降キャッシュを返す。
+    T      : 点数 × 基底関数の数（BASIS の順）の連続した float64 の配列（読み込み専用）
+    index  : 基底関数 → T の列番号
+    design : モデル名 → 計画行列 (D_az, D_el) のキャッシュ（design() が使う）
+    """
+    AZ = np.ascontiguousarray(AZ, dtype=np.float64).ravel()
+    EL = np.ascontiguousarray(EL, dtype=np.float64).ravel()
+    key = (AZ.tobytes(), EL.tobytes())
+    if key in _feature_cache:
+        return _feature_cache[key]
+
+    AZ_rad = np.radians(AZ)
+    EL_rad = np.radians(EL)
+    f = {'AZ': AZ, 'EL': EL,
+         'sin_AZ': np.sin(AZ_rad), 'cos_AZ': np.cos(AZ_rad),
+         'sin_EL': np.sin(EL_rad), 'cos_EL': np.cos(EL_rad)}
+
+    T = np.empty((AZ.size, len(BASIS)), dtype=np.float64)
+    for k, func in enumerate(BASIS.values()):
+        T[:, k] = func(f)
+    T.flags.writeable = False
+
+    ret = {}
+    ret['AZ'] = AZ
+    ret['EL'] = EL
+    ret['T'] = T
+    ret['index'] = {term: k for k, term in enumerate(BASIS)}
+    ret['design'] = {}
+
+    if len(_feature_cache) >= FEATURE_CACHE_SIZE:
+        del _feature_cache[next(iter(_feature_cache))]
+    _feature_cache[key] = ret
+
+    return ret
+
+
+def clear_features():
+    """
+    features() のキャッシュを消す。
+    """
+    _feature_cache.clear()
+
+
+def term_matrix(terms, AZ, EL):
+    """
+    点数 × 基底関数の数 の基底関数の値の行列を返す（AZ, EL は [deg]）。
+    """
+    F = features(AZ, EL)
+
+    return F['T'][:, [F['index'][term] for term in terms]]
+
+
+def design(name, AZ, EL):
+    """
+    モデル name の計画行列 (D_az, D_el)（点数 × パラメーター数、dAZ = D_az @ B, dEL = D_el @ B）を返す。
+    データ・モデルごとにキャッシュするので、返す配列は書き換えない。
+    """
+    F = features(AZ, EL)
+    if name not in F['design']:
+        model = MODELS[name]
+        T = F['T'][:, model['columns']]
+        D_az = T @ model['S_az']
+        D_el = T @ model['S_el']
+        D_az.flags.writeable = False
+        D_el.flags.writeable = False
+        F['design'][name] = (D_az, D_el)
+
+    return F['design'][name]
+
+
+def design_function(name):
+    """
+    design(AZ, EL) の形の計画行列を作る関数を返す（pointingfit.linear_system 用）。
+    """
+    return lambda AZ, EL: design(name, AZ, EL)
+
+
+def evaluate(name, B, AZ, EL):
+    """
+    モデル name の (dAZ, dEL) [deg] を返す。
+    """
+    D_az, D_el = design(name, AZ, EL)
+    B = np.asarray(B, dtype=np.float64)
+
+    return D_az @ B, D_el @ B
+
+
+def evaluate_C(name, B, AZ1, EL1, AZ2, EL2):
+    """
+    連続波データ用。dAZ は AZスキャンの位置 (AZ1, EL1)、dEL は ELスキャンの位置 (AZ2, EL2) で計算する。
+    """
+    dAZ, _ = evaluate(name, B, AZ1, EL1)
+    _, dEL = evaluate(name, B, AZ2, EL2)
+
+    return dAZ, dEL
+
+
+def conf_rows(name, popt):
+    """
+    ant30_phaseC0.conf に書き込む [(AntRadioInst0, 値のリスト), ...] を返す（conf_width 個ずつ、足りない部分は 0）。
+    """
+    width = MODELS[name]['conf_width']
+    values = list(popt) + [0.0] * (width * len(CONF_KEYS) - len(popt))
+
+    return [(key, values[i * width:(i + 1) * width]) for i, key in enumerate(CONF_KEYS)]
+
+
+def params_from_conf(name, conf_values):
+    """
+    ant30_phaseC0.conf の {AntRadioInst0: 値のリスト, ...} から、モデル name の器差パラメーターのリストを返す。
+    """
+    model = MODELS[name]
+    width = model['conf_width']
+    values = []
+    for key in CONF_KEYS:
+        values.extend(conf_values.get(key, [])[:width])
+
+    return values[:len(model['params'])]
@@ -0,0 +1,182 @@
+#!python3
+
+import hashlib
+import os
+
+import numpy as np
+
+"""
+器差パラメーターの逐次更新（再帰最小二乗法）モジュール。
+
+器差モデルは器差パラメーターについて線形なので、dAZ の行と dEL の行それぞれの正規方程式の行列（情報行列 G = Σ a a^T と
+右辺 h = Σ a y、観測値の二乗和 yy と和 sy）を持っておけば、新しい offset の行は足すだけ（1行あたり O(p^2)）で取り込め、
+器差パラメーターと共分散行列はいつでもここから求められる。
+forgetting < 1 の場合は、新しい offset の行を1行取り込むごとに古い行の重みを forgetting 倍する（指数的な忘却、ドリフト用）。
+
+重みは pointingfit.stack_offsets と同じく、輝線データ・連続波データの片方だけの場合は dAZ, dEL それぞれの観測値の標準偏差の逆数、
+両方ある場合は 1 にする。標準偏差は yy, sy から解くときに求めるので、forgetting = 1 なら rp_instrument.py の run_fit と同じ解になる。
+
+状態は モデル名・dAZ, dEL の G, h, yy, sy・取り込んだ行数 を .npz ファイルに保存する。offset_L.txt, offset_C.txt の先頭から
+何行取り込んだか (n_L, n_C) と、その行の値のハッシュ (hash_L, hash_C) も保存し、次回はそれより後の行だけを取り込む。
+取り込んだ行が書き換えられていた場合（ハッシュが違う場合）は、作り直す (--reset) まで更新しない。
+"""
+
+STATE_VERSION = 3
+
+# dAZ の行と dEL の行の正規方程式の行列
+COMPONENTS = ('az', 'el')
+
+
+def new_state(model_name, n_params, forgetting=1.0):
+    """
+    何も取り込んでいない状態を返す。
+    """
+    if not 0 < forgetting <= 1:
+        raise ValueError(f"forgetting must be in (0, 1], got {forgetting}")
+
+    ret = {}
+    ret['version'] = STATE_VERSION
+    ret['model_name'] = model_name
+    ret['forgetting'] = float(forgetting)
+    for c in COMPONENTS:
+        ret[f'G_{c}'] = np.zeros((n_params, n_params))
+        ret[f'h_{c}'] = np.zeros(n_params)
+        ret[f'yy_{c}'] = 0.0
+        ret[f'sy_{c}'] = 0.0
+    ret['n_eff'] = 0.0      # 忘却の重みを掛けた offset の行数
+    ret['n_rows'] = 0       # 取り込んだ offset の行数
+    ret['n_L'] = 0          # offset_L.txt から取り込んだ行数
+    ret['n_C'] = 0          # offset_C.txt から取り込んだ行数
+    ret['hash_L'] = prefix_hash([], 0)     # offset_L.txt の取り込んだ行の値のハッシュ
+    ret['hash_C'] = prefix_hash([], 0)     # offset_C.txt の取り込んだ行の値のハッシュ
+
+    return ret
+
+
+def prefix_hash(columns, n):
+    """
+    offset ファイルの列（1次元配列のリスト）の先頭 n 行の値のハッシュ（16進数の文字列）を返す。
+    取り込んだ行が後から書き換えられていないかを確かめるために state に保存する（0行の場合は列によらず同じ値）。
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for column in columns:
+        h.update(np.ascontiguousarray(np.asarray(column, dtype=np.float64)[:n]).tobytes())
+
+    return h.hexdigest()
+
+
+def update(state, A, y):
+    """
+    計画行列 A と観測値 y（pointingfit.linear_system の戻り値。dAZ の行, dEL の行 の順）の offset の行を state に取り込む。
+    offset の行 i（dAZ の行 i と dEL の行 n + i の組）を順に1行ずつ取り込んだのと同じ結果を、まとめて計算する。
+    重みはここでは掛けない（solve で掛ける）。
+    """
+    A = np.asarray(A, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = y.size // 2
+    if n == 0:
+        return state
+
+    # 先に取り込む行ほど forgetting を多く掛ける（最後の行の重みは 1）
+    lam = state['forgetting']
+    s = lam ** np.arange(n - 1, -1, -1, dtype=np.float64)
+    decay = lam ** n
+
+    for c, rows in zip(COMPONENTS, (slice(0, n), slice(n, 2 * n))):
+        A_c, y_c = A[rows], y[rows]
+        state[f'G_{c}'] = decay * state[f'G_{c}'] + (A_c * s[:, None]).T @ A_c
+        state[f'h_{c}'] = decay * state[f'h_{c}'] + A_c.T @ (s * y_c)
+        state[f'yy_{c}'] = decay * state[f'yy_{c}'] + float(s @ (y_c * y_c))
+        state[f'sy_{c}'] = decay * state[f'sy_{c}'] + float(s @ y_c)
+    state['n_eff'] = decay * state['n_eff'] + float(s.sum())
+    state['n_rows'] += n
+
+    return state
+
+
+def weights(state):
+    """
+    dAZ の行と dEL の行の重み (w_az, w_el) を返す（pointingfit.stack_offsets と同じ）。
+    """
+    if (state['n_L'] and state['n_C']) or state['n_eff'] <= 0:
+        return 1.0, 1.0
+
+    ret = []
+    for c in COMPONENTS:
+        mean = state[f'sy_{c}'] / state['n_eff']
+        var = max(state[f'yy_{c}'] / state['n_eff'] - mean ** 2, 0.0)
+        ret.append(1.0 / np.sqrt(var) if var > 0 else 1.0)
+
+    return tuple(ret)
+
+
+def solve(state):
+    """
+    state の器差パラメーターを求め、pointingfit.solve_linear と同じ形式の辞書（residual 以外）で返す。
+    w_az, w_el は使った重み、rms は重みなしの残差の二乗和の RMS [arcsec]（dAZ, dEL の二乗和、忘却の重み付き）。
+    """
+    w_az, w_el = weights(state)
+    G = w_az ** 2 * state['G_az'] + w_el ** 2 * state['G_el']
+    h = w_az ** 2 * state['h_az'] + w_el ** 2 * state['h_el']
+    yy = w_az ** 2 * state['yy_az'] + w_el ** 2 * state['yy_el']
+    p = h.size
+    G_inv = np.linalg.pinv(G)
+    popt = G_inv @ h
+    rank = np.linalg.matrix_rank(G) if state['n_rows'] else 0
+
+    chi2 = float(max(yy - 2 * popt @ h + popt @ G @ popt, 0.0))
+    dof = 2 * state['n_eff'] - rank
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = G_inv * (chi2 / dof if dof > 0 else np.nan)
+
+    # 重みなしの残差の二乗和
+    sse = sum(max(state[f'yy_{c}'] - 2 * popt @ state[f'h_{c}'] + popt @ state[f'G_{c}'] @ popt, 0.0) for c in COMPONENTS)
+
+    ret = {}
+    ret['popt'] = popt
+    ret['cov'] = cov
+    ret['perr'] = np.sqrt(np.diag(cov))
+    ret['chi2'] = chi2
+    ret['dof'] = dof
+    ret['rank'] = int(rank)
+    ret['w_az'] = float(w_az)
+    ret['w_el'] = float(w_el)
+    ret['rms'] = float(np.sqrt(sse / state['n_eff']) * 3600) if state['n_eff'] > 0 else np.nan
+    ret['complete'] = bool(rank == p)
+
+    return ret
+
+
+def save_state(filename, state):
+    """
+    state を .npz ファイルに保存する。一時ファイルに書いてから置き換える。
+    """
+    tmp = f"{filename}.tmp{os.getpid()}.npz"
+    np.savez(tmp, **{key: np.asarray(value) for key, value in state.items()})
+    os.replace(tmp, filename)
+
+
+def load_state(filename):
+    """
+    save_state で保存した state を読み込む。
+    """
+    with np.load(filename, allow_pickle=False) as f:
+        if int(f['version']) != STATE_VERSION:
+            raise ValueError(f"Unsupported state version {int(f['version'])} in {filename} (rebuild it with --reset)")
+
+        ret = {}
+        ret['version'] = int(f['version'])
+        ret['model_name'] = str(f['model_name'])
+        ret['forgetting'] = float(f['forgetting'])
+        for c in COMPONENTS:
+            ret[f'G_{c}'] = np.array(f[f'G_{c}'])
+            ret[f'h_{c}'] = np.array(f[f'h_{c}'])
+            ret[f'yy_{c}'] = float(f[f'yy_{c}'])
+            ret[f'sy_{c}'] = float(f[f'sy_{c}'])
+        ret['n_eff'] = float(f['n_eff'])
+        for key in ('n_rows', 'n_L', 'n_C'):
+            ret[key] = int(f[key])
+        for key in ('hash_L', 'hash_C'):
+            ret[key] = str(f[key])
+
+    return ret
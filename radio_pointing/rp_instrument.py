@@ -2,7 +2,6 @@
 
 import numpy as np
 import pandas as pd
-from scipy.optimize import least_squares
 import sys
 import re
 import os
@@ -11,12 +10,27 @@ import matplotlib as mpl
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import matplotlib.pyplot as plt
 
+# 非対話実行の共通モジュール (../common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import batchmode
+
+import pointingboot
+import pointingfit
+import pointingmodel
+import pointingrls
+import termsearch
+
 mpl.rcParams.update({'font.size': 12})
 mpl.rcParams.update({'axes.grid': True})
 mpl.rcParams.update({'grid.linestyle': ':'})
 
 """
 実行方法：python3 rp_instrument.py 
+非対話実行：python3 rp_instrument.py --batch --model 60cm_model [--initial conf | --initial B0,B1,...] [--write-conf]
+誤差の推定：python3 rp_instrument.py --bootstrap 2000 -j 0 （offset の行のブートストラップ、pointingboot.py）
+外れ値の除外：python3 rp_instrument.py --model 60cm_model_2 --robust clip （除外した点は robust_<モデル名>.txt）
+逐次更新：python3 rp_instrument.py --model 60cm_model_2 --update [--forgetting 0.99] （増えた offset の行だけ取り込む、pointingrls.py）
+項の選択：python3 rp_instrument.py --search --max-terms 8 -j 0 （項の組み合わせの全探索、termsearch.py）
 
 rp_peaksearch.pyの出力結果 offset_C.txtと、輝線ポインティングで得られたoffset_L.txt をoffset_dataのフォルダに入れる。
 
@@ -26,6 +40,11 @@ beforeはフィッティング前の結果、afterはフィッティング前後
 連続波データのフォーマット：AZ1, EL1, dAZ, AZ2, EL2, dEL
 輝線と連続波それぞれの残差の二乗和を足し合わせたものを最小化して、dAZ, dEL共通の器差パラメーターを求める。
 
+器差モデルは pointingmodel.py の MODEL_DEFS に「器差パラメーター × 基底関数」の和として宣言する。
+モデルの値、計画行列、ant30_phaseC0.conf の読み書きは全てこの宣言から作る（新しいモデルは MODEL_DEFS に追加するだけ）。
+器差モデルは器差パラメーターについて線形なので、計画行列を1回作って最小二乗解を直接求める（pointingfit.py）。
+--solver least_squares の場合は scipy.optimize.least_squares で反復して求める（ヤコビアンは計画行列から作る）。
+
 """
 
 #ant30conf = r"/home/user/control/tcs01/etc/ant30_phaesC0.conf" # ant30op
@@ -33,8 +52,10 @@ ant30conf = "ant30_phaseC0.conf"
 folder = "offset_data" # 解析するファイルのあるフォルダ名
 
 
-def main():
-    title = """\
+def main(n_boot=0, workers=1, seed=None, robust=None, robust_threshold=None):
+    models = list(pointingmodel.MODELS)
+    menu = "\n".join(f"    [{i}]:{pointingmodel.MODELS[name]['title']}" for i, name in enumerate(models, start=1))
+    title = f"""\
     ********************************
     ant30 radio pointing --analysis--
         2024/11/18  R.Enohi
@@ -42,9 +63,7 @@ def main():
 
     解析するファイルを /offset_data 内に入れてください。
     フィッティングに使用する器差モデル式を選択してください
-    [1]:60 cm model 
-    [2]:60 cm model 改良版
-    [3]:Optical pointing model
+{menu}
     """
     print(title)
 
@@ -52,331 +71,469 @@ def main():
     while True:
         select = input("選択>>")
         
-        if select == "1":
-            print("60 cm telescope model でフィッティングします")
-            model_name = '60cm_model'
-            initial_guess = []
-
-            while True:
-                proceed = input("\nフィッティングの初期パラメーターに器差ファイル(ant30_phaseC0.conf)の値を使用しますか？：[y]es / [n]o: ").strip().lower()
-                
-                if proceed == "y":
-                    initial_guess = read_old_kisapara_from_conf(model_name)
-                    print("ant30_phaseC0.confの器差パラメータを使用します。\n", initial_guess)
-                    break  
-                
-                elif proceed == "n":
-                    print("初期パラメータを入力して下さい。\n")
-                    try:
-                        initial_guess = []
-                        for i in range(6): # B0 - B5 まで6個
-                            value = float(input(f"B{i} = "))
-                            initial_guess.append(value)
-                        print("入力したパラメータ\n", initial_guess)
-                        proceed2 = input("\nこのパラメーターを使用しますか？：[y]es / [n]o: ").strip().lower()
-                        
-                        if proceed2 == "y":
-                            break  
-                    
-                    except ValueError:
-                        print("無効な入力です。数値を入力してください。")
-
-            popt = run_fit(model_name, initial_guess)
-            if popt is not None:
-                write_in_conf(ant30conf, popt, model_name)
+        if select.isdigit() and 1 <= int(select) <= len(models):
+            model_name = models[int(select) - 1]
+            print(f"{pointingmodel.MODELS[model_name]['title']} でフィッティングします")
+            initial_guess = ask_initial_guess(model_name)
+
+            ret = run_fit(model_name, initial_guess, n_boot=n_boot, workers=workers, seed=seed,
+                          robust=robust, robust_threshold=robust_threshold)
+            if ret is not None:
+                write_in_conf(ant30conf, ret['popt'], model_name)
             break
         
-        elif select == "2":
-            print("60 cm model 改良版でフィッティングします")
-            model_name = '60cm_model_2'
-            initial_guess = []
+        else:
+            print("無効な選択肢です。再度入力してください。")
 
-            while True:  
-                proceed = input("\nフィッティングの初期パラメーターに器差ファイル(ant30_phaseC0.conf)の値を使用しますか？：[y]es / [n]o: ").strip().lower()
-                
-                if proceed == "y":
-                    initial_guess = read_old_kisapara_from_conf(model_name)
-                    print("ant30_phaseC0.confの器差パラメータを使用します。\n", initial_guess)
-                    break  
-                
-                elif proceed == "n":
-                    print("初期パラメータを入力して下さい。\n")
-                    try:
-                        initial_guess = []
-                        for i in range(10): # B0 - B9 まで10個
-                            value = float(input(f"B{i} = "))
-                            initial_guess.append(value)
-                        print("入力したパラメータ\n", initial_guess)
-                        proceed2 = input("\nこのパラメーターを使用しますか？：[y]es / [n]o: ").strip().lower()
-                        
-                        if proceed2 == "y":
-                            break  
-                    
-                    except ValueError:
-                        print("無効な入力です。数値を入力してください。")
-
-            popt = run_fit(model_name, initial_guess)
-            if popt is not None:
-                write_in_conf(ant30conf, popt, model_name)
-            break
 
-        elif select == "3":
-            print("Optical pointing model でフィッティングします")
-            model_name = 'optical_model'
-            initial_guess = []
+def ask_initial_guess(model_name):
+    """
+    フィッティングの初期パラメーターを ant30_phaseC0.conf から読むか、キーボード入力する
+    """
+    params = MODEL_PARAMS[model_name]
 
-            while True:  
-                proceed = input("\nフィッティングの初期パラメーターに器差ファイル(ant30_phaseC0.conf)の値を使用しますか？：[y]es / [n]o: ").strip().lower()
-                
-                if proceed == "y":
-                    initial_guess = read_old_kisapara_from_conf(model_name)
-                    print("ant30_phaseC0.confの器差パラメータを使用します。\n", initial_guess)
-                    break  
-                
-                elif proceed == "n":
-                    print("初期パラメータを入力して下さい。\n")
-                    try:
-                        initial_guess = []
-                        for i in range(1, 16): # A1 - A15 まで15個
-                            value = float(input(f"A{i} = "))
-                            initial_guess.append(value)
-                        print("入力したパラメータ\n", initial_guess)
-                        proceed2 = input("\nこのパラメーターを使用しますか？：[y]es / [n]o: ").strip().lower()
-   
-                        if proceed2 == "y":
-                            break  
-                    
-                    except ValueError:
-                        print("無効な入力です。数値を入力してください。")
-
-            popt = run_fit(model_name, initial_guess)
-            if popt is not None:
-                write_in_conf(ant30conf, popt, model_name)
-            break
+    while True:
+        proceed = input("\nフィッティングの初期パラメーターに器差ファイル(ant30_phaseC0.conf)の値を使用しますか？：[y]es / [n]o: ").strip().lower()
         
-        else:
-            print("無効な選択肢です。再度入力してください。")
+        if proceed == "y":
+            initial_guess = read_old_kisapara_from_conf(model_name)
+            print("ant30_phaseC0.confの器差パラメータを使用します。\n", initial_guess)
+            return initial_guess
+        
+        elif proceed == "n":
+            print("初期パラメータを入力して下さい。\n")
+            try:
+                initial_guess = []
+                for name in params: # B0 - B5, B0 - B9, A1 - A15 など
+                    value = float(input(f"{name} = "))
+                    initial_guess.append(value)
+                print("入力したパラメータ\n", initial_guess)
+                proceed2 = input("\nこのパラメーターを使用しますか？：[y]es / [n]o: ").strip().lower()
+                
+                if proceed2 == "y":
+                    return initial_guess
+            
+            except ValueError:
+                print("無効な入力です。数値を入力してください。")
 
-#def run_fit(fitting_model, residual_func, model_name, initial_guess):
-def run_fit(model_name, initial_guess):
+# モデル名 → 器差パラメーター名
+MODEL_PARAMS = {name: model['params'] for name, model in pointingmodel.MODELS.items()}
+
+# フィッティングの方法
+# auto: 計画行列から最小二乗解を直接求める, least_squares: scipy.optimize.least_squares で反復して求める
+SOLVERS = ('auto', 'least_squares')
+
+
+def run_batch(model_name, initial='conf', write_conf=False, solver='auto', n_boot=0, workers=1, seed=None,
+              robust=None, robust_threshold=None):
     """
-    フィッティング処理を実行する関数
+    メニューを使わずにフィッティングを実行する（--model を指定した場合）。
+    initial は 'conf'（ant30_phaseC0.conf の値）またはカンマ区切りの初期パラメーター（solver='least_squares' の場合だけ数を確認する）。
+    solver はフィッティングの方法（SOLVERS）。n_boot, workers, seed はブートストラップの回数・プロセス数・乱数の種。
+    robust, robust_threshold はロバストフィッティングの方法と閾値（run_fit）。
+    write_conf=True の場合は確認せずに ant30_phaseC0.conf に書き込む。
+    バッチ実行 (--batch) の場合、結果を result_<model_name>.json に保存する。
+    """
+    if initial == 'conf':
+        initial_guess = read_old_kisapara_from_conf(model_name)
+        print("ant30_phaseC0.confの器差パラメータを使用します。\n", initial_guess)
+    else:
+        initial_guess = [float(v) for v in initial.split(',')]
+    # 初期パラメーターを使うのは least_squares で反復する場合だけ（auto とロバストフィッティングでは使わない）
+    if solver == 'least_squares' and robust is None and len(initial_guess) != len(MODEL_PARAMS[model_name]):
+        raise ValueError(f"{model_name} needs {len(MODEL_PARAMS[model_name])} initial parameters, got {len(initial_guess)}")
+
+    ret = run_fit(model_name, initial_guess, solver, n_boot, workers, seed, robust, robust_threshold)
+    if ret is None:
+        return None
+
+    if write_conf:
+        write_in_conf(ant30conf, ret['popt'], model_name, confirm=False)
+    elif not batchmode.BATCH:
+        write_in_conf(ant30conf, ret['popt'], model_name)
+
+    if batchmode.BATCH:
+        result = dict(ret)
+        result['initial_guess'] = initial_guess
+        result['params'] = dict(zip(MODEL_PARAMS[model_name], ret['popt'].tolist()))
+        result['conf_written'] = bool(write_conf)
+        batchmode.write_json(f"result_{model_name}.json", result)
+
+    return ret
+
+
+def load_offsets(folder):
+    """
+    folder 内の offset_L.txt（輝線データ）と offset_C.txt（連続波データ）を読み込み、np.array の辞書で返す。
+    輝線データ: AZ, EL, dAZ_obs_L, dEL_obs_L
+    連続波データ: AZ1, EL1, dAZ_obs_C（AZスキャン）, AZ2, EL2, dEL_obs_C（ELスキャン）
+    has_L, has_C はそれぞれのファイルが見つかったかどうか。どちらも見つからない場合は None を返す。
     """
-    # データの読み込み
     offset_L_path = find_offset_L(folder)
     offset_C_path = find_offset_C(folder)
 
-    AZ, EL, dAZ_obs_L, dEL_obs_L = [], [], [], []                         # 輝線データ用
-    AZ1, EL1, dAZ_obs_C, AZ2, EL2, dEL_obs_C = [], [], [], [], [], [] # 連続波データ用
+    if not offset_L_path and not offset_C_path:
+        print("ファイルの読み込みに失敗しました。")
+        return None
+
+    ret = {key: np.array([]) for key in ('AZ', 'EL', 'dAZ_obs_L', 'dEL_obs_L', 'AZ1', 'EL1', 'dAZ_obs_C', 'AZ2', 'EL2', 'dEL_obs_C')}
+    ret['has_L'] = bool(offset_L_path)
+    ret['has_C'] = bool(offset_C_path)
 
     if offset_L_path:
         print("offset_L.txtが見つかりました。")
-        ret = get_data_line(offset_L_path)
-        if ret is None:
+        data = get_data_line(offset_L_path)
+        if data is None:
             print("Error! get_data_line()")
         else:
-            AZ.extend(ret["AZ"].tolist())
-            EL.extend(ret["EL"].tolist())
-            dAZ_obs_L.extend(ret["dAZ"].tolist())
-            dEL_obs_L.extend(ret["dEL"].tolist())
+            ret['AZ'] = np.array(data["AZ"])
+            ret['EL'] = np.array(data["EL"])
+            ret['dAZ_obs_L'] = np.array(data["dAZ"])
+            ret['dEL_obs_L'] = np.array(data["dEL"])
 
     if offset_C_path:
         print("offset_C.txtが見つかりました。")
-        ret = get_data_continuum(offset_C_path)
-        if ret is None:
+        data = get_data_continuum(offset_C_path)
+        if data is None:
             print("Eroor! get_data_continuum()")
         else:
             # AZ scan
-            AZ1.extend(ret["AZ_1"].tolist())
-            EL1.extend(ret["EL_1"].tolist())
-            dAZ_obs_C.extend(ret["dAZ"].tolist())
+            ret['AZ1'] = np.array(data["AZ_1"])
+            ret['EL1'] = np.array(data["EL_1"])
+            ret['dAZ_obs_C'] = np.array(data["dAZ"])
             # EL scan
-            AZ2.extend(ret["AZ_2"].tolist())
-            EL2.extend(ret["EL_2"].tolist())
-            dEL_obs_C.extend(ret["dEL"].tolist())
+            ret['AZ2'] = np.array(data["AZ_2"])
+            ret['EL2'] = np.array(data["EL_2"])
+            ret['dEL_obs_C'] = np.array(data["dEL"])
 
-    if not offset_L_path and not offset_C_path:
-        print("ファイルの読み込みに失敗しました。")
-        return None
+    return ret
+
+
+def offset_rms(dAZ_obs, dEL_obs, dAZ_fit, dEL_fit):
+    """
+    フィッティング前 (before) と後 (after) の二乗和の RMS [arcsec] を返す。
+    """
+    beforeRMS = np.sqrt(np.mean(dAZ_obs**2 + dEL_obs**2)) * 3600
+    afterRMS = np.sqrt(np.mean((dAZ_fit - dAZ_obs)**2 + (dEL_fit - dEL_obs)**2)) * 3600
 
-    # リストを np.array に変換
-    AZ = np.array(AZ)
-    EL = np.array(EL)
-    dAZ_obs_L = np.array(dAZ_obs_L)
-    dEL_obs_L = np.array(dEL_obs_L)
+    return beforeRMS, afterRMS
 
-    AZ1 = np.array(AZ1)
-    EL1 = np.array(EL1)
-    AZ2 = np.array(AZ2)
-    EL2 = np.array(EL2)
-    dAZ_obs_C = np.array(dAZ_obs_C)
-    dEL_obs_C = np.array(dEL_obs_C)
 
-    # debug
-    #print("Length of AZ:", len(AZ))
-    #print("Length of EL:", len(EL))
-    #print("Length of dAZ_obs_L:", len(dAZ_obs_L))
-    #print("Length of dEL_obs_L:", len(dEL_obs_L))
-    #print("Length of dAZ_obs_C:", len(dAZ_obs_C))
-    #print("Length of dEL_obs_C:", len(dEL_obs_C))
-    #print("AZ\n", AZ)
-    #print("EL\n", EL)
-    #print("dAZ_obs_L\n", dAZ_obs_L)
-    #print("dEL_obs_L\n", dEL_obs_L)
-    #print("dAZ_obs_C\n", dAZ_obs_C)
-    #print("dEL_obs_C\n", dEL_obs_C)
-    
-    # モデルと残差関数の選択
-    if model_name == '60cm_model':
-        model_C = model_60cm_C
-        model_L = model_60cm_L
-        residuals_C = residuals_60cm_C
-        residuals_L = residuals_60cm_L
-        residuals_C_and_L = residuals_60cm_C_and_L
-    elif model_name == '60cm_model_2':
-        model_C = model_60cm_C_2
-        model_L = model_60cm_L_2
-        residuals_C = residuals_60cm_C_2
-        residuals_L = residuals_60cm_L_2
-        residuals_C_and_L = residuals_60cm_C_and_L_2
-    elif model_name == 'optical_model':
-        model_C = opt_model_C
-        model_L = opt_model_L
-        residuals_C = residuals_opt_C
-        residuals_L = residuals_opt_L
-        residuals_C_and_L = residuals_opt_C_and_L
-    else:
-        raise ValueError(f"Unknown model_name: {model_name}")
+def print_rms(beforeRMS, afterRMS):
+    print("観測結果のRMS　　　　　　　　:", str(round(beforeRMS, 2)).rjust(6), "\"")
+    print("フィッティング結果のRMS　　　:", str(round(afterRMS, 2)).rjust(6), "\"")
+    print("目標のRMS　　　　　　　　　　:  54    \"")
 
 
-    if offset_L_path and not offset_C_path:
-        print("輝線データのみ使用します")
-        result = least_squares(residuals_L, initial_guess, args=(AZ, EL, dAZ_obs_L, dEL_obs_L))
-        popt = result.x
-        dAZ_fit_L, dEL_fit_L = model_L(popt, AZ, EL)
-        rms_dAZ_L = np.sqrt(np.mean((dAZ_obs_L - dAZ_fit_L) ** 2)) * 3600
-        rms_dEL_L = np.sqrt(np.mean((dEL_obs_L - dEL_fit_L) ** 2)) * 3600
-        print(f"dAZ_rms: {rms_dAZ_L:.6f} \"")
-        print(f"dEL_rms: {rms_dEL_L:.6f} \"")
+#def run_fit(fitting_model, residual_func, model_name, initial_guess):
+def run_fit(model_name, initial_guess, solver='auto', n_boot=0, workers=1, seed=None, robust=None, robust_threshold=None):
+    """
+    フィッティング処理を実行する関数
+    器差パラメーター popt、使用したデータ点数と RMS を辞書で返す
+    solver='auto' の場合は計画行列から最小二乗解を直接求める（初期パラメーターは使わない）
+    器差パラメーターの誤差 perr と共分散行列 cov も返す
+    n_boot > 0 の場合は offset の行のブートストラップで器差パラメーターの誤差・相関行列・RMS の分布も求める
+    （workers はプロセス数、seed は乱数の種）
+    robust（pointingfit.ROBUST_METHODS）を指定した場合は同じ計画行列で外れ値の重みを下げながら解き直し（solver は使わない）、
+    各点の重みと除外した点を robust_<model_name>.txt に書き出す（robust_threshold は残差の閾値、ロバストな標準偏差の何倍か）
+    """
+    # データの読み込み
+    offsets = load_offsets(folder)
+    if offsets is None:
+        return None
 
-        beforeRMS = 0
-        afterRMS = 0
+    AZ, EL, dAZ_obs_L, dEL_obs_L = offsets['AZ'], offsets['EL'], offsets['dAZ_obs_L'], offsets['dEL_obs_L']   # 輝線データ用
+    AZ1, EL1, dAZ_obs_C = offsets['AZ1'], offsets['EL1'], offsets['dAZ_obs_C']                                # 連続波データ用
+    AZ2, EL2, dEL_obs_C = offsets['AZ2'], offsets['EL2'], offsets['dEL_obs_C']
 
-        for i in range(len(AZ)):
-            # 二乗和でRMSを計算
-            beforeRMS = np.sqrt(np.mean(dAZ_obs_L**2 + dEL_obs_L**2)) * 3600
-            afterRMS = np.sqrt(np.mean((dAZ_fit_L - dAZ_obs_L)**2 + (dEL_fit_L - dEL_obs_L)**2)) * 3600
+    if model_name not in pointingmodel.MODELS:
+        raise ValueError(f"Unknown model_name: {model_name}")
+
+    # 計画行列を1回作って、最小二乗解を直接（または least_squares で）求める
+    data = pointingfit.stack_offsets(AZ, EL, dAZ_obs_L, dEL_obs_L, AZ1, EL1, dAZ_obs_C, AZ2, EL2, dEL_obs_C)
+    A, y, w = pointingfit.linear_system(pointingmodel.design_function(model_name), data)
+    if robust is not None:
+        fit = pointingfit.solve_robust(A, y, w, robust, robust_threshold)
+        print(f"ロバストフィッティング ({robust}): {fit['n_iter']} 回の反復で{'収束しました' if fit['converged'] else '収束しませんでした'}、"
+              f"{int(fit['rejected'].sum())} / {fit['rejected'].size} 行を外れ値として除外")
+    elif solver == 'least_squares':
+        fit = pointingfit.solve_least_squares(A, y, w, initial_guess)
+    else:
+        fit = pointingfit.solve_linear(A, y, w)
+        print(f"計画行列から最小二乗解を求めます（ランク {fit['rank']} / {len(MODEL_PARAMS[model_name])}）")
+    popt = fit['popt']
 
-        beforeRMS = str(round(beforeRMS*3600, 2)) #deg -->- arcsec
-        afterRMS = str(round(afterRMS*3600, 2)) #deg -->- arcsec
+    # フィッティング結果のモデルの値（プロット用）も同じ計画行列から求める
+    fit_values = pointingfit.model_values(A, popt, data)
+    dAZ_fit_L, dEL_fit_L = fit_values['dAZ_L'], fit_values['dEL_L']
+    dAZ_fit_C, dEL_fit_C = fit_values['dAZ_C'], fit_values['dEL_C']
 
-        beforeRMS = beforeRMS.rjust(6)
-        afterRMS = afterRMS.rjust(6)
+    if offsets['has_L'] and not offsets['has_C']:
+        print("輝線データのみ使用します")
+        rms_dAZ = np.sqrt(np.mean((dAZ_obs_L - dAZ_fit_L) ** 2)) * 3600
+        rms_dEL = np.sqrt(np.mean((dEL_obs_L - dEL_fit_L) ** 2)) * 3600
+        beforeRMS, afterRMS = offset_rms(dAZ_obs_L, dEL_obs_L, dAZ_fit_L, dEL_fit_L)
 
-        print("観測結果のRMS　　　　　　　　:", beforeRMS, "\"")
-        print("フィッティング結果のRMS　　　:", afterRMS, "\"")
-        print("目標のRMS　　　　　　　　　　:  54    \"")
+    elif offsets['has_C'] and not offsets['has_L']:
+        print("連続波データのみ使用します")
+        rms_dAZ = np.sqrt(np.mean((dAZ_obs_C - dAZ_fit_C) ** 2)) * 3600
+        rms_dEL = np.sqrt(np.mean((dEL_obs_C - dEL_fit_C) ** 2)) * 3600
+        beforeRMS, afterRMS = offset_rms(dAZ_obs_C, dEL_obs_C, dAZ_fit_C, dEL_fit_C)
 
-        # プロット実行
+    else:
+        print("輝線データと連続波データを使用します")
+        rms_dAZ = (np.sqrt(np.mean((dAZ_obs_C - dAZ_fit_C) ** 2)) + np.sqrt(np.mean((dAZ_obs_L - dAZ_fit_L) ** 2))) * 3600
+        rms_dEL = (np.sqrt(np.mean((dEL_obs_C - dEL_fit_C) ** 2)) + np.sqrt(np.mean((dEL_obs_L - dEL_fit_L) ** 2))) * 3600
+        # 輝線データ, 連続波データ の順につなげる
+        beforeRMS, afterRMS = offset_rms(np.concatenate((dAZ_obs_L, dAZ_obs_C)), np.concatenate((dEL_obs_L, dEL_obs_C)),
+                                         np.concatenate((dAZ_fit_L, dAZ_fit_C)), np.concatenate((dEL_fit_L, dEL_fit_C)))
+
+    print(f"dAZ_rms: {rms_dAZ:.6f} \"")
+    print(f"dEL_rms: {rms_dEL:.6f} \"")
+    print_rms(beforeRMS, afterRMS)
+    rms = {'dAZ_rms': rms_dAZ, 'dEL_rms': rms_dEL, 'beforeRMS': round(float(beforeRMS), 2), 'afterRMS': round(float(afterRMS), 2)}
+
+    # プロット実行
+    if offsets['has_L'] and not offsets['has_C']:
         plot_daz_del(dAZ_obs_L, dEL_obs_L, dAZ_fit_L - dAZ_obs_L, dEL_fit_L - dEL_obs_L, model_name)
         plot_subplots_L(AZ, EL, dAZ_obs_L, dAZ_fit_L, dEL_obs_L, dEL_fit_L, model_name)
-        print("器差パラメーター\n",popt)
-
 
-    elif offset_C_path and not offset_L_path:
-        print("連続波データのみ使用します")
-        result = least_squares(residuals_C, initial_guess, args=(AZ1, EL1, AZ2, EL2, dAZ_obs_C, dEL_obs_C))
-        popt = result.x
-        # debug
-        #print("len(dAZ_obs_C): ", len(dAZ_obs_C))
-        #print("len(AZ1): ", len(AZ1))
-        #print("len(AZ2): ", len(AZ2))
-        dAZ_fit_C, dEL_fit_C = model_C(popt, AZ1, EL1, AZ2, EL2)
-        rms_dAZ_C = np.sqrt(np.mean((dAZ_obs_C - dAZ_fit_C) ** 2)) * 3600
-        rms_dEL_C = np.sqrt(np.mean((dEL_obs_C - dEL_fit_C) ** 2)) * 3600
-        print(f"dAZ_rms: {rms_dAZ_C:.6f} \"")
-        print(f"dEL_rms: {rms_dEL_C:.6f} \"")
-
-        beforeRMS = 0
-        afterRMS = 0
-        for i in range(len(AZ1)):
-            beforeRMS = np.sqrt(np.mean(dAZ_obs_C**2 + dEL_obs_C**2)) * 3600
-            afterRMS = np.sqrt(np.mean((dAZ_fit_C - dAZ_obs_C)**2 + (dEL_fit_C - dEL_obs_C)**2)) * 3600
-
-        beforeRMS = str(round(beforeRMS*3600, 2)) #deg -->- arcsec
-        afterRMS = str(round(afterRMS*3600, 2)) #deg -->- arcsec
-
-        beforeRMS = beforeRMS.rjust(6)
-        afterRMS = afterRMS.rjust(6)
-
-        print("観測結果のRMS　　　　　　　　:", beforeRMS, "\"")
-        print("フィッティング結果のRMS　　　:", afterRMS, "\"")
-        print("目標のRMS　　　　　　　　　　:  54    \"")
-
-        # プロット実行
+    elif offsets['has_C'] and not offsets['has_L']:
         plot_daz_del(dAZ_obs_C, dEL_obs_C, dAZ_fit_C - dAZ_obs_C, dEL_fit_C - dEL_obs_C, model_name)
         #plot_subplots(AZ1, EL1, dAZ_obs_C, dAZ_fit_C, dEL_obs_C, dEL_fit_C, model_name)
         plot_subplots_C(AZ1, EL1, AZ2, EL2, dAZ_obs_C, dAZ_fit_C, dEL_obs_C, dEL_fit_C, model_name)
-        print("器差パラメーター\n",popt)
 
+    else:
+        dAZ_obs_all = np.concatenate((dAZ_obs_L, dAZ_obs_C))
+        dEL_obs_all = np.concatenate((dEL_obs_L, dEL_obs_C))
+        dAZ_fit_all = np.concatenate((dAZ_fit_L, dAZ_fit_C))
+        dEL_fit_all = np.concatenate((dEL_fit_L, dEL_fit_C))
+        plot_daz_del(dAZ_obs_all, dEL_obs_all, dAZ_fit_all - dAZ_obs_all, dEL_fit_all - dEL_obs_all, model_name)
+        plot_subplots_L_and_C(AZ, EL, AZ1, EL1, AZ2, EL2, dAZ_obs_all, dAZ_fit_all, dEL_obs_all, dEL_fit_all, model_name)
 
-    elif offset_L_path and offset_C_path:
-        print("輝線データと連続波データを使用します")
-        result = least_squares(residuals_C_and_L, initial_guess, args=(dAZ_obs_C, dEL_obs_C, AZ1, EL1, AZ2, EL2, dAZ_obs_L, dEL_obs_L, AZ, EL)) # 変更前
+        #save(AZ, EL, dAZ_obs, dAZ_fit, dEL_obs, dEL_fit, model_name)
 
-        popt = result.x
-        dAZ_fit_C, dEL_fit_C = model_C(popt, AZ1, EL1, AZ2, EL2)
-        dAZ_fit_L, dEL_fit_L = model_L(popt, AZ, EL)
-        rms_dAZ_C = np.sqrt(np.mean((dAZ_obs_C - dAZ_fit_C) ** 2)) * 3600
-        rms_dEL_C = np.sqrt(np.mean((dEL_obs_C - dEL_fit_C) ** 2)) * 3600
-        rms_dAZ_L = np.sqrt(np.mean((dAZ_obs_L - dAZ_fit_L) ** 2)) * 3600
-        rms_dEL_L = np.sqrt(np.mean((dEL_obs_L - dEL_fit_L) ** 2)) * 3600
-        print(f"dAZ_rms: {rms_dAZ_L + rms_dAZ_C:.6f} \"")
-        print(f"dEL_rms: {rms_dEL_L + rms_dEL_C:.6f} \"")
+    print("器差パラメーター\n",popt)
+
+    ret = {
+        'model_name': model_name,
+        'popt': popt,
+        'n_L': len(AZ),
+        'n_C': len(AZ1),
+        'solver': robust or ('least_squares' if solver == 'least_squares' else 'linear'),
+        'perr': fit['perr'],
+        'cov': fit['cov'],
+    }
+    print("器差パラメーターの誤差\n", fit['perr'])
+    ret.update(rms)
+
+    if robust is not None:
+        kept = ~(fit['rejected'][:data['dAZ'].size] | fit['rejected'][data['dAZ'].size:])
+        residual = fit['residual']
+        if kept.any():
+            ret['afterRMS_kept'] = round(float(np.sqrt(np.mean(residual[:kept.size][kept]**2 + residual[kept.size:][kept]**2)) * 3600), 2)
+            print("外れ値を除いたフィッティング結果のRMS:", str(ret['afterRMS_kept']).rjust(6), "\"")
+        ret['n_rejected'] = int(fit['rejected'].sum())
+        ret['rejected'] = write_robust(f"robust_{model_name}.txt", data, y, y - residual, fit)
+        # ブートストラップでもロバストフィッティングの重みを使う
+        w = w * np.sqrt(fit['weight'])
+
+    if n_boot > 0:
+        print(f"ブートストラップ（{n_boot} 回）で器差パラメーターの誤差を求めます")
+        samples = pointingboot.bootstrap(A, y, w, n_boot, seed=seed, workers=workers)
+        ret['bootstrap'] = pointingboot.summarize(popt, samples, MODEL_PARAMS[model_name])
+        print_bootstrap(ret['bootstrap'])
+        plot_bootstrap(samples, ret['bootstrap'], model_name)
 
-        rms_vals_obs = []
-        rms_vals_fit = []
+    return ret
 
-        for i in range(len(AZ)):  # 輝線データ
-            rms_vals_obs.append(dAZ_obs_L[i] ** 2 + dEL_obs_L[i] ** 2)
-            rms_vals_fit.append((dAZ_fit_L[i] - dAZ_obs_L[i]) ** 2 + (dEL_fit_L[i] - dEL_obs_L[i]) ** 2)
 
-        for i in range(len(AZ1)):  # 連続波データ
-            rms_vals_obs.append(dAZ_obs_C[i] ** 2 + dEL_obs_C[i] ** 2)
-            rms_vals_fit.append((dAZ_fit_C[i] - dAZ_obs_C[i]) ** 2 + (dEL_fit_C[i] - dEL_obs_C[i]) ** 2)
+def run_search(max_terms=termsearch.MAX_TERMS, n_folds=termsearch.FOLDS, workers=1, seed=None):
+    """
+    SEARCH_MODELS（60cm model 改良版と Optical pointing model）の項を合わせた候補から、
+    max_terms 個までの全ての項の組み合わせを n_folds-fold 交差検証の RMS と AIC, BIC で評価する（termsearch.py）。
+    項の数と交差検証の RMS のパレート最適な組み合わせを表示し、pointingmodel.py の MODEL_DEFS の宣言も出力する。
+    バッチ実行 (--batch) の場合、結果を result_search.json に保存する。
+    """
+    offsets = load_offsets(folder)
+    if offsets is None:
+        return None
 
-        beforeRMS = np.sqrt(np.mean(rms_vals_obs)) * 3600
-        afterRMS = np.sqrt(np.mean(rms_vals_fit)) * 3600
+    # 候補の項全体の計画行列を1回だけ作る
+    terms = termsearch.candidate_terms()
+    data = pointingfit.stack_offsets(offsets['AZ'], offsets['EL'], offsets['dAZ_obs_L'], offsets['dEL_obs_L'],
+                                     offsets['AZ1'], offsets['EL1'], offsets['dAZ_obs_C'],
+                                     offsets['AZ2'], offsets['EL2'], offsets['dEL_obs_C'])
+    A, y, w = pointingfit.linear_system(lambda AZ, EL: termsearch.term_design(terms, AZ, EL), data)
+
+    print(f"候補の項 {len(terms)} 個から {min(max_terms, len(terms))} 個までの組み合わせを評価します")
+    for i, term in enumerate(terms):
+        print(f"  [{i:2d}] {term['label']}  ({', '.join(term['sources'])})")
+
+    result = termsearch.search(A, y, w, max_terms, n_folds, seed=seed, workers=workers)
+    front = termsearch.pareto(result)
+    valid = result['rank'] == result['n_terms']
+    print(f"{len(result['subsets'])} 個の組み合わせを評価しました")
+
+    print("項の数   CV RMS [\"]   RMS [\"]       AIC         BIC    項")
+    for i in front:
+        print(f"{result['n_terms'][i]:6d}  {result['cv_rms'][i]:10.2f}  {result['rms'][i]:8.2f}  "
+              f"{result['aic'][i]:10.1f}  {result['bic'][i]:10.1f}    {list(result['subsets'][i])}")
+
+    best = {}
+    for key in ('cv_rms', 'aic', 'bic'):
+        i = int(np.flatnonzero(valid)[np.argmin(result[key][valid])])
+        best[key] = i
+        print(f"{key} が最小の組み合わせ: {list(result['subsets'][i])}")
+        print("    " + repr(termsearch.declaration(terms, result['subsets'][i], f"term search (min {key})")))
+
+    plot_search(result, front)
+
+    ret = {
+        'terms': [{'label': term['label'], 'sources': term['sources']} for term in terms],
+        'n_candidates': len(result['subsets']),
+        'pareto': [{'subset': list(result['subsets'][i]), 'n_terms': int(result['n_terms'][i]),
+                    'cv_rms': float(result['cv_rms'][i]), 'rms': float(result['rms'][i]),
+                    'aic': float(result['aic'][i]), 'bic': float(result['bic'][i]),
+                    'declaration': termsearch.declaration(terms, result['subsets'][i])} for i in front],
+        'best': {key: list(result['subsets'][i]) for key, i in best.items()},
+    }
+    if batchmode.BATCH:
+        batchmode.write_json("result_search.json", ret)
 
-        beforeRMS = str(round(beforeRMS, 2)).rjust(6)
-        afterRMS = str(round(afterRMS, 2)).rjust(6)
+    return ret
 
-        print("観測結果のRMS　　　　　　　　:", beforeRMS, "\"")
-        print("フィッティング結果のRMS　　　:", afterRMS, "\"")
-        print("目標のRMS　　　　　　　　　　:  54    \"")
 
-        # プロット実行
-        dAZ_obs_all = np.concatenate((dAZ_obs_L, dAZ_obs_C))
-        dEL_obs_all = np.concatenate((dEL_obs_L, dEL_obs_C))
-        dAZ_fit_all = np.concatenate((dAZ_fit_L, dAZ_fit_C))
-        dEL_fit_all = np.concatenate((dEL_fit_L, dEL_fit_C))
-        # debug
-        #print("len(AZ)+len(AZ1)+len(AZ2) = ",len(AZ)+len(AZ1))
-        #print("len(dAZ_obs_L)+len(dAZ_obs_C) = ",len(dAZ_obs_L)+len(dAZ_obs_C))
-        #print("len(dEL_fit_L)+len(dEL_fit_C) = ",len(dEL_obs_L)+len(dEL_fit_C))
+def write_robust(filename, data, obs, fit_value, fit):
+    """
+    ロバストフィッティングの各行（輝線データ L, 連続波データ C の dAZ, dEL）の位置・観測値・モデルの値・重み・除外の有無を
+    filename に書き出し、除外した行のリストを返す。
+    """
+    n_az = data['dAZ'].size
+    n_L = data['n_L']
+    rows = []
+    for i in range(obs.size):
+        component = 'dAZ' if i < n_az else 'dEL'
+        j = i if i < n_az else i - n_az
+        kind = 'L' if j < n_L else 'C'
+        AZ = data['AZ_az'][j] if i < n_az else data['AZ_el'][j]
+        EL = data['EL_az'][j] if i < n_az else data['EL_el'][j]
+        rows.append({'kind': kind, 'index': j if kind == 'L' else j - n_L, 'component': component, 'AZ': float(AZ), 'EL': float(EL),
+                     'obs': float(obs[i]), 'fit': float(fit_value[i]), 'residual': float((obs[i] - fit_value[i]) * 3600),
+                     'weight': float(fit['weight'][i]), 'rejected': bool(fit['rejected'][i])})
 
-        plot_daz_del(dAZ_obs_all, dEL_obs_all, dAZ_fit_all - dAZ_obs_all, dEL_fit_all - dEL_obs_all, model_name)
-        plot_subplots_L_and_C(AZ, EL, AZ1, EL1, AZ2, EL2, dAZ_obs_all, dAZ_fit_all, dEL_obs_all, dEL_fit_all, model_name)
+    with open(filename, "w") as f:
+        f.write("kind, index, component, AZ [deg], EL [deg], obs [deg], fit [deg], residual [arcsec], weight, rejected\n")
+        for row in rows:
+            f.write(f"{row['kind']},{row['index']},{row['component']},{row['AZ']:.6f},{row['EL']:.6f},{row['obs']:.6f},"
+                    f"{row['fit']:.6f},{row['residual']:.2f},{row['weight']:.4f},{int(row['rejected'])}\n")
+    print(f"ロバストフィッティングの重みと除外した点を {filename} に保存しました")
 
-        print("器差パラメーター\n",popt)
+    return [row for row in rows if row['rejected']]
 
-        #save(AZ, EL, dAZ_obs, dAZ_fit, dEL_obs, dEL_fit, model_name)
 
-    else:
-        print("offset_L.txt または offset_C.txt が見つかりませんでした。")
+def run_update(model_name, state_file=None, forgetting=1.0, reset=False, write_conf=False):
+    """
+    offset_L.txt, offset_C.txt の前回から増えた行だけを器差モデルの正規方程式の状態 state_file に取り込み（pointingrls.py）、
+    器差パラメーターと誤差をすぐに求める。state_file が無い場合・reset=True の場合は最初から作る。
+    forgetting < 1 の場合は1行ごとに古い行の重みを forgetting 倍する（状態を作るときだけ指定できる）。
+    write_conf=True の場合は確認せずに ant30_phaseC0.conf に書き込む。
+    バッチ実行 (--batch) の場合、結果を result_update_<model_name>.json に保存する。
+    """
+    if state_file is None:
+        state_file = f"rls_{model_name}.npz"
+
+    offsets = load_offsets(folder)
+    if offsets is None:
         return None
 
-    return popt
+    if os.path.exists(state_file) and not reset:
+        state = pointingrls.load_state(state_file)
+        if state['model_name'] != model_name:
+            raise ValueError(f"{state_file} is the state of {state['model_name']}, not {model_name} (use --reset)")
+        if forgetting != state['forgetting']:
+            print(f"{state_file} の忘却係数 {state['forgetting']} を使います（変更する場合は --reset）")
+    else:
+        state = pointingrls.new_state(model_name, len(MODEL_PARAMS[model_name]), forgetting)
+        print(f"{state_file} を新しく作ります")
+
+    n_L, n_C = offsets['AZ'].size, offsets['AZ1'].size
+    if n_L < state['n_L'] or n_C < state['n_C']:
+        raise ValueError(f"offset files have fewer rows than already folded into {state_file} "
+                         f"(L: {n_L} < {state['n_L']} or C: {n_C} < {state['n_C']}); use --reset")
+
+    # 取り込んだ行が書き換えられていないか（先頭 n_L, n_C 行の値のハッシュ）
+    columns_L = [offsets[key] for key in ('AZ', 'EL', 'dAZ_obs_L', 'dEL_obs_L')]
+    columns_C = [offsets[key] for key in ('AZ1', 'EL1', 'dAZ_obs_C', 'AZ2', 'EL2', 'dEL_obs_C')]
+    for name, key, columns in (('offset_L.txt', 'L', columns_L), ('offset_C.txt', 'C', columns_C)):
+        if pointingrls.prefix_hash(columns, state[f'n_{key}']) != state[f'hash_{key}']:
+            raise ValueError(f"the first {state[f'n_{key}']} rows of {name} have changed since they were folded into {state_file}; use --reset")
+
+    # 前回から増えた行だけの計画行列
+    new_L = slice(state['n_L'], n_L)
+    new_C = slice(state['n_C'], n_C)
+    n_new_L, n_new_C = n_L - state['n_L'], n_C - state['n_C']
+    if n_new_L or n_new_C:
+        data = pointingfit.stack_offsets(offsets['AZ'][new_L], offsets['EL'][new_L], offsets['dAZ_obs_L'][new_L], offsets['dEL_obs_L'][new_L],
+                                         offsets['AZ1'][new_C], offsets['EL1'][new_C], offsets['dAZ_obs_C'][new_C],
+                                         offsets['AZ2'][new_C], offsets['EL2'][new_C], offsets['dEL_obs_C'][new_C])
+        # 重み（輝線・連続波の片方だけの場合は 1/標準偏差）は全ての行から pointingrls.solve で求めて掛ける
+        A, y, _ = pointingfit.linear_system(pointingmodel.design_function(model_name), data)
+        pointingrls.update(state, A, y)
+        state['n_L'], state['n_C'] = n_L, n_C
+        state['hash_L'] = pointingrls.prefix_hash(columns_L, n_L)
+        state['hash_C'] = pointingrls.prefix_hash(columns_C, n_C)
+        pointingrls.save_state(state_file, state)
+    n_new = n_new_L + n_new_C
+    print(f"新しい行 {n_new} 行（輝線 {n_new_L} 行, 連続波 {n_new_C} 行）を取り込みました（合計 {state['n_rows']} 行）")
+
+    fit = pointingrls.solve(state)
+    if not fit['complete']:
+        print(f"行が足りないため器差パラメーターが決まりません（ランク {fit['rank']} / {len(MODEL_PARAMS[model_name])}）")
+    print("器差パラメーター\n", fit['popt'])
+    print("器差パラメーターの誤差\n", fit['perr'])
+    print("フィッティング結果のRMS　　　:", str(round(fit['rms'], 2)).rjust(6), "\"")
+
+    ret = {
+        'model_name': model_name,
+        'popt': fit['popt'],
+        'perr': fit['perr'],
+        'cov': fit['cov'],
+        'afterRMS': round(fit['rms'], 2),
+        'n_new': n_new,
+        'n_rows': state['n_rows'],
+        'n_L': state['n_L'],
+        'n_C': state['n_C'],
+        'forgetting': state['forgetting'],
+        'state_file': state_file,
+    }
+
+    if fit['complete']:
+        if write_conf:
+            write_in_conf(ant30conf, fit['popt'], model_name, confirm=False)
+        elif not batchmode.BATCH:
+            write_in_conf(ant30conf, fit['popt'], model_name)
+
+    if batchmode.BATCH:
+        result = dict(ret)
+        result['params'] = dict(zip(MODEL_PARAMS[model_name], fit['popt'].tolist()))
+        result['conf_written'] = bool(write_conf and fit['complete'])
+        batchmode.write_json(f"result_update_{model_name}.json", result)
+
+    return ret
+
+
+def print_bootstrap(summary):
+    """
+    ブートストラップの結果（pointingboot.summarize の戻り値）を表示する。
+    """
+    print("パラメーター      推定値         誤差")
+    for name, value in summary['params'].items():
+        print(f"{name:>6}  {value['estimate']: .6e}  {value['err']:.6e}")
+    print("相関行列\n", np.array2string(summary['corr'], precision=2, suppress_small=True))
+    for key, label in (('before_rms', '観測結果のRMS　　　　　　'), ('after_rms', 'フィッティング結果のRMS')):
+        rms = summary[key]
+        print(f"{label}: {rms['median']:.2f} \" ({rms['low']:.2f} - {rms['high']:.2f} \")")
 
 
 def find_offset_C(folder):
@@ -405,9 +562,10 @@ def find_offset_L(folder):
     return None 
 
 
-def write_in_conf(ant30conf, popt, model_name):
+def write_in_conf(ant30conf, popt, model_name, confirm=True):
     """
     器差パラメーターを ant30_phaseC0.conf に自動書き込み
+    confirm=False の場合は確認せずに書き込む
     """
     date = datetime.now().strftime('%Y/%m/%d %H:%M:%S')
 
@@ -415,35 +573,21 @@ def write_in_conf(ant30conf, popt, model_name):
     with open(ant30conf, "r", encoding="utf-8") as file:
         old_data = file.readlines()
 
-    # 新しく書き込む器差パラメーターの設定
-    if model_name == "60cm_model":
-        kisapara = [
-            ('AntRadioInst0', popt[:4]),                     # B0, B1, B2, B3
-            ('AntRadioInst1', [popt[4], popt[5], 0.0, 0.0]), # B4, B5, 0,  0
-            ('AntRadioInst2', [0.0, 0.0, 0.0, 0.0])          # 0,  0,  0,  0
-        ]
-    elif model_name == "60cm_model_2":
-        kisapara = [
-            ('AntRadioInst0', popt[:4]),                     # B0, B1, B2, B3
-            ('AntRadioInst1', popt[4:8]),                    # B4, B5, B6, B7
-            ('AntRadioInst2', [popt[8], popt[9], 0.0, 0.0])  # B8, B9,  0,  0
-        ]
-    elif model_name == "optical_model":
-        kisapara = [
-            ('AntRadioInst0', popt[:5]),                     # A1, A2, A3, A4, A5
-            ('AntRadioInst1', popt[5:10]),                   # A6, A7, A8, A9, A10
-            ('AntRadioInst2', popt[10:15])                   # A11, A12, A13, A14, A15
-        ]
-    else:
+    # 新しく書き込む器差パラメーターの設定（AntRadioInst0, 1, 2 の並びは pointingmodel.py の宣言から作る）
+    if model_name not in pointingmodel.MODELS:
         print("無効なモデル名です。")
         return
+    kisapara = pointingmodel.conf_rows(model_name, popt)
 
     # 書き込む内容を表示
     for name, values in kisapara:
         formatted_values = '\t'.join(f'{v:.9f}' for v in values)
         print(f'{name}\t{formatted_values}')
     
-    proceed = input("\nこのまま ant30_phaseC0.conf に書き込みますか？：[y]es / [n]o: ").strip().lower()
+    if confirm:
+        proceed = input("\nこのまま ant30_phaseC0.conf に書き込みますか？：[y]es / [n]o: ").strip().lower()
+    else:
+        proceed = 'y'
 
     if proceed == 'y':
         with open(ant30conf, "w", encoding="utf-8") as p:
@@ -478,36 +622,13 @@ def read_old_kisapara_from_conf(model_name):
         with open(ant30conf, 'r', encoding='utf-8') as file:
             log_lines = file.readlines()
         
+        conf_values = {}
         for line in log_lines:
-            if model_name == "60cm_model":
-                if line.startswith("AntRadioInst0"):
-                    match = re.findall(r"[-+]?\d*\.\d+|\d+", line)
-                    kisapara_old_list.extend([float(num) for num in match[1:5]])  
-                elif line.startswith("AntRadioInst1"):
-                    match = re.findall(r"[-+]?\d*\.\d+|\d+", line)
-                    kisapara_old_list.extend([float(num) for num in match[1:3]])  
-            
-            elif model_name == "60cm_model_2":
-                if line.startswith("AntRadioInst0"):
-                    match = re.findall(r"[-+]?\d*\.\d+|\d+", line)
-                    kisapara_old_list.extend([float(num) for num in match[1:5]]) 
-                elif line.startswith("AntRadioInst1"):
+            for key in pointingmodel.CONF_KEYS:
+                if line.startswith(key):
                     match = re.findall(r"[-+]?\d*\.\d+|\d+", line)
-                    kisapara_old_list.extend([float(num) for num in match[1:5]])  
-                elif line.startswith("AntRadioInst2"):
-                    match = re.findall(r"[-+]?\d*\.\d+|\d+", line)
-                    kisapara_old_list.extend([float(num) for num in match[1:3]])  
-
-            elif model_name == "optical_model":
-                if line.startswith("AntRadioInst0"):
-                    match = re.findall(r"[-+]?\d*\.\d+|\d+", line)
-                    kisapara_old_list.extend([float(num) for num in match[1:6]])  
-                elif line.startswith("AntRadioInst1"):
-                    match = re.findall(r"[-+]?\d*\.\d+|\d+", line)
-                    kisapara_old_list.extend([float(num) for num in match[1:6]]) 
-                elif line.startswith("AntRadioInst2"):
-                    match = re.findall(r"[-+]?\d*\.\d+|\d+", line)
-                    kisapara_old_list.extend([float(num) for num in match[1:6]]) 
+                    conf_values[key] = [float(num) for num in match[1:]]  # match[0] は AntRadioInst の番号
+        kisapara_old_list = pointingmodel.params_from_conf(model_name, conf_values)
 
     except FileNotFoundError:
         print(f"Error: {ant30conf} が見つかりません。")
@@ -535,11 +656,14 @@ def get_data_continuum(offset_file):
     """
     rp_peaksearch.pyの出力結果を読み取る。
     連続波ポインティング結果 offset_C.txtから、AZ_1, EL_1, dAZ, AZ_2, EL_2, dEL を読み取って辞書に保存
+    rp_peaksearch.py --auto gauss の出力のようにピーク中心の誤差の列 (dAZ_err, dEL_err) があれば、それも保存
     """
     ret = {}
 
-    data = pd.read_csv(offset_file,skiprows=1, sep="\t",header=None, names=["AZ_1", "EL_1", "dAZ", "AZ_2", "EL_2","dEL"]).to_numpy()
+    data = pd.read_csv(offset_file,skiprows=1, sep="\t",header=None).to_numpy()
     ret["AZ_1"], ret["EL_1"], ret["dAZ"], ret["AZ_2"], ret["EL_2"], ret["dEL"] = data[:, 0], data[:, 1], data[:, 2],data[:, 3], data[:, 4], data[:, 5]
+    if data.shape[1] >= 8:
+        ret["dAZ_err"], ret["dEL_err"] = data[:, 6], data[:, 7]
 
     return ret
 
@@ -554,248 +678,8 @@ def get_result_data(result_file):
 
     return ret
 
-##################################################################################### 60 cm model
-def model_60cm_L(B, AZ, EL):
-    """
-    60cm telescope 器差モデル（Nakajima et al. 2007）
-    輝線データ用
-    """
-    AZ_rad = np.radians(AZ)
-    EL_rad = np.radians(EL)
-    B0, B1, B2, B3, B4, B5 = B
-    
-    dAZ_fit_L = B0 * np.sin(AZ_rad - EL_rad) + B1 * np.cos(AZ_rad - EL_rad) + B2 + B4 * np.cos(EL_rad) - B5 * np.sin(EL_rad)
-    dEL_fit_L = B0 * np.cos(AZ_rad - EL_rad) - B1 * np.sin(AZ_rad - EL_rad) + B3 + B4 * np.sin(EL_rad) + B5 * np.cos(EL_rad)
-    
-    return dAZ_fit_L, dEL_fit_L
-
-def model_60cm_C(B, AZ1, EL1, AZ2, EL2):
-    """
-    60cm telescope 器差モデル（Nakajima et al. 2007）
-    連続波データ用
-    """
-    AZ1 = np.radians(AZ1)
-    EL1 = np.radians(EL1)
-    AZ2 = np.radians(AZ2)
-    EL2 = np.radians(EL2)
-    B0, B1, B2, B3, B4, B5 = B
-
-    dAZ_fit_C = B0 * np.sin(AZ1 - EL1) + B1 * np.cos(AZ1 - EL1) + B2 + B4 * np.cos(EL1) - B5 * np.sin(EL1)
-    dEL_fit_C = B0 * np.cos(AZ2 - EL2) - B1 * np.sin(AZ2 - EL2) + B3 + B4 * np.sin(EL2) + B5 * np.cos(EL2)
-
-    return dAZ_fit_C, dEL_fit_C
-
-def residuals_60cm_L(B, AZ, EL, dAZ_obs, dEL_obs):
-    """
-    60cm model 用の残差を計算する関数
-    輝線データ用
-    """
-    dAZ_fit, dEL_fit = model_60cm_L(B, AZ, EL)
-    
-    # 観測データの標準偏差でスケーリング
-    dAZ_std = np.std(dAZ_obs)
-    dEL_std = np.std(dEL_obs)
-    residuals_dAZ = (dAZ_obs - dAZ_fit) / dAZ_std
-    residuals_dEL = (dEL_obs - dEL_fit) / dEL_std
-
-    return np.concatenate([residuals_dAZ, residuals_dEL])
-
-def residuals_60cm_C(B, AZ1, EL1, AZ2, EL2, dAZ_obs, dEL_obs):
-    """
-    60cm model 用の残差を計算する関数
-    連続波データ用
-    """
-    dAZ_fit, dEL_fit = model_60cm_C(B, AZ1, EL1, AZ2, EL2)
-    
-    # 観測データの標準偏差でスケーリング
-    dAZ_std = np.std(dAZ_obs)
-    dEL_std = np.std(dEL_obs)
-    residuals_dAZ = (dAZ_obs - dAZ_fit) / dAZ_std
-    residuals_dEL = (dEL_obs - dEL_fit) / dEL_std
-
-    return np.concatenate([residuals_dAZ, residuals_dEL])
-
-
-def residuals_60cm_C_and_L(B, dAZ_obs_C, dEL_obs_C, AZ1, EL1, AZ2, EL2, dAZ_obs_L, dEL_obs_L, AZ, EL):
-    if len(B) != 6:
-        raise ValueError("Parameter B must contain exactly 6 elements.")
-    # 連続波データの残差
-    dAZ_fit_C, dEL_fit_C = model_60cm_C(B, AZ1, EL1, AZ2, EL2)
-    if len(dAZ_obs_C) != len(dAZ_fit_C) or len(dEL_obs_C) != len(dEL_fit_C):
-        raise ValueError("Continuous wave data dimensions do not match the model output.")    
-    residuals_dAZ_C = dAZ_obs_C - dAZ_fit_C
-    residuals_dEL_C = dEL_obs_C - dEL_fit_C
-    
-    # 輝線データの残差
-    dAZ_fit_L, dEL_fit_L = model_60cm_L(B, AZ, EL)
-    if len(dAZ_obs_L) != len(dAZ_fit_L) or len(dEL_obs_L) != len(dEL_fit_L):
-        raise ValueError("Line data dimensions do not match the model output.")
-    residuals_dAZ_L = dAZ_obs_L - dAZ_fit_L
-    residuals_dEL_L = dEL_obs_L - dEL_fit_L
-
-    return np.concatenate([residuals_dAZ_C, residuals_dEL_C, residuals_dAZ_L, residuals_dEL_L])
-
-
-############################################################################# 60 cm model 改良版
-def model_60cm_L_2(B, AZ, EL): 
-    """
-    60cm モデルの改良版.　器差パラメータ10個　
-    輝線データ用
-    """
-    AZ_rad = np.radians(AZ)
-    EL_rad = np.radians(EL)
-    B0, B1, B2, B3, B4, B5, B6, B7, B8, B9 = B
-    
-    dAZ = B1 * np.cos(AZ_rad - EL_rad) - B0 * np.sin(AZ_rad - EL_rad) + B2 + B4 * np.cos(EL_rad) - B5 * np.sin(EL_rad) + B6 * np.cos(AZ_rad) - B7 * np.sin(AZ_rad) + B8 * np.cos(AZ_rad + EL_rad) - B9* np.sin(AZ_rad + EL_rad)
-    dEL = B1 * np.sin(EL_rad - EL_rad) + B0 * np.cos(AZ_rad - EL_rad) + B3 - B4 * np.sin(EL_rad) + B5 * np.cos(EL_rad) + B6 * np.sin(AZ_rad) + B7 * np.cos(AZ_rad) + B8 * np.sin(AZ_rad + EL_rad) + B9* np.cos(AZ_rad + EL_rad)
-    
-    return dAZ, dEL
-
-def model_60cm_C_2(B, AZ1, EL1, AZ2, EL2): 
-    """
-    60cm モデルの改良版.　器差パラメータ10個　]
-    連続波データ用
-    """
-    AZ1 = np.radians(AZ1)
-    EL1 = np.radians(EL1)
-    AZ2 = np.radians(AZ2)
-    EL2 = np.radians(EL2)
-    B0, B1, B2, B3, B4, B5, B6, B7, B8, B9 = B
-    
-    dAZ = B1 * np.cos(AZ1 - EL1) - B0 * np.sin(AZ1 - EL1) + B2 + B4 * np.cos(EL1) - B5 * np.sin(EL1) + B6 * np.cos(AZ1) - B7 * np.sin(AZ1) + B8 * np.cos(AZ1 + EL1) - B9* np.sin(AZ1 + EL1)
-    dEL = B1 * np.sin(EL2 - EL2) + B0 * np.cos(AZ2 - EL2) + B3 - B4 * np.sin(EL2) + B5 * np.cos(EL2) + B6 * np.sin(AZ2) + B7 * np.cos(AZ2) + B8 * np.sin(AZ2 + EL2) + B9* np.cos(AZ2 + EL2)
-    
-    return dAZ, dEL
-
-def residuals_60cm_L_2(B, AZ, EL, dAZ_obs, dEL_obs):
-    """
-    60cm model 改良版 用の残差を計算する関数　輝線データ用
-    """
-    dAZ_fit, dEL_fit = model_60cm_L_2(B, AZ, EL)
-    # 観測データの標準偏差でスケーリング
-    dAZ_std = np.std(dAZ_obs)
-    dEL_std = np.std(dEL_obs)
-    residuals_dAZ = (dAZ_obs - dAZ_fit) / dAZ_std
-    residuals_dEL = (dEL_obs - dEL_fit) / dEL_std
-
-    return np.concatenate([residuals_dAZ, residuals_dEL])
-
-def residuals_60cm_C_2(B, AZ1, EL1, AZ2, EL2, dAZ_obs, dEL_obs):
-    """
-    60cm model 改良版 用の残差を計算する関数　連続波データ用
-    """
-    dAZ_fit, dEL_fit = model_60cm_C_2(B, AZ1, EL1, AZ2, EL2)
-    # 観測データの標準偏差でスケーリング
-    dAZ_std = np.std(dAZ_obs)
-    dEL_std = np.std(dEL_obs)
-    residuals_dAZ = (dAZ_obs - dAZ_fit) / dAZ_std
-    residuals_dEL = (dEL_obs - dEL_fit) / dEL_std
-
-    return np.concatenate([residuals_dAZ, residuals_dEL])
-
-def residuals_60cm_C_and_L_2(B, dAZ_obs_C, dEL_obs_C, AZ1, EL1, AZ2, EL2, dAZ_obs_L, dEL_obs_L, AZ, EL):
-    if len(B) != 10:
-        raise ValueError("Parameter B must contain exactly 10 elements.")
-    # 連続波データの残差
-    dAZ_fit_C, dEL_fit_C = model_60cm_C_2(B, AZ1, EL1, AZ2, EL2)
-    if len(dAZ_obs_C) != len(dAZ_fit_C) or len(dEL_obs_C) != len(dEL_fit_C):
-        raise ValueError("Continuous wave data dimensions do not match the model output.")    
-    residuals_dAZ_C = dAZ_obs_C - dAZ_fit_C
-    residuals_dEL_C = dEL_obs_C - dEL_fit_C
-    
-    # 輝線データの残差
-    dAZ_fit_L, dEL_fit_L = model_60cm_L_2(B, AZ, EL)
-    if len(dAZ_obs_L) != len(dAZ_fit_L) or len(dEL_obs_L) != len(dEL_fit_L):
-        raise ValueError("Line data dimensions do not match the model output.")
-    residuals_dAZ_L = dAZ_obs_L - dAZ_fit_L
-    residuals_dEL_L = dEL_obs_L - dEL_fit_L
-
-    return np.concatenate([residuals_dAZ_C, residuals_dEL_C, residuals_dAZ_L, residuals_dEL_L])
-
-
-###################################################################################### optical model
-def opt_model_L(A, AZ, EL):
-    """
-    光学ポインティングで使用していた式 (Koyama master thesis 2021)
-    器差パラメーター15個　輝線データ用
-    """
-    AZ_rad = np.radians(AZ)
-    EL_rad = np.radians(EL)
-    A1, A2, A3, A4, A5, A6, A7, A8, A9, A10, A11, A12, A13, A14, A15 = A
-    
-    dAZ = A1 + A2*np.cos(AZ_rad)*np.tan(EL_rad) + A3*np.sin(AZ_rad)*np.tan(EL_rad) + A4*np.tan(EL_rad) + A5/np.cos(EL_rad) 
-    + A8*np.cos(AZ_rad) + A9*np.sin(AZ_rad) + A12*np.cos(AZ_rad)*np.cos(EL_rad)
-    + A13*np.cos(AZ_rad)*np.sin(EL_rad) + A14*np.sin(AZ_rad)*np.cos(EL_rad) + A15*EL
-    
-    dEL = -A2*np.sin(AZ_rad) + A3*np.cos(AZ_rad) + A6 + A7*np.cos(EL_rad) + A10*np.cos(AZ_rad) +A11*np.sin(AZ_rad)
-    
-    return dAZ, dEL
-
-def opt_model_C(A, AZ1, EL1, AZ2, EL2):
-    """
-    光学ポインティングで使用していた式 (Koyama master thesis 2021)
-    器差パラメーター15個　連続波データ用
-    """
-    AZ1 = np.radians(AZ1)
-    EL1_rad = np.radians(EL1)
-    AZ2 = np.radians(AZ2)
-    EL2 = np.radians(EL2)
-    A1, A2, A3, A4, A5, A6, A7, A8, A9, A10, A11, A12, A13, A14, A15 = A
-    
-    dAZ = A1 + A2*np.cos(AZ1)*np.tan(EL1_rad) + A3*np.sin(AZ1)*np.tan(EL1_rad) + A4*np.tan(EL1_rad) + A5/np.cos(EL1_rad) 
-    + A8*np.cos(AZ1) + A9*np.sin(AZ1) + A12*np.cos(AZ1)*np.cos(EL1_rad)
-    + A13*np.cos(AZ1)*np.sin(EL1_rad) + A14*np.sin(AZ1)*np.cos(EL1_rad) + A15*EL1
-    
-    dEL = -A2*np.sin(AZ2) + A3*np.cos(AZ2) + A6 + A7*np.cos(EL2) + A10*np.cos(AZ2) +A11*np.sin(AZ2)
-    
-    return dAZ, dEL
-
-def residuals_opt_L(A, AZ, EL, dAZ_obs, dEL_obs):
-    """
-    Opical pointing model 用の残差を計算する関数　輝線データ用
-    """
-    dAZ_fit, dEL_fit = opt_model_L(A, AZ, EL)
-    # 観測データの標準偏差でスケーリング
-    dAZ_std = np.std(dAZ_obs)
-    dEL_std = np.std(dEL_obs)
-    residuals_dAZ = (dAZ_obs - dAZ_fit) / dAZ_std
-    residuals_dEL = (dEL_obs - dEL_fit) / dEL_std    
-
-    return np.concatenate([residuals_dAZ, residuals_dEL])
-
-def residuals_opt_C(A, AZ1, EL1, AZ2, EL2, dAZ_obs, dEL_obs):
-    """
-    Opical pointing model 用の残差を計算する関数　連続波データ用
-    """
-    dAZ_fit, dEL_fit = opt_model_C(A, AZ1, EL1, AZ2, EL2)
-    # 観測データの標準偏差でスケーリング
-    dAZ_std = np.std(dAZ_obs)
-    dEL_std = np.std(dEL_obs)
-    residuals_dAZ = (dAZ_obs - dAZ_fit) / dAZ_std
-    residuals_dEL = (dEL_obs - dEL_fit) / dEL_std    
-
-    return np.concatenate([residuals_dAZ, residuals_dEL])
-
-def residuals_opt_C_and_L(B, dAZ_obs_C, dEL_obs_C, AZ1, EL1, AZ2, EL2, dAZ_obs_L, dEL_obs_L, AZ, EL):
-    if len(B) != 15:
-        raise ValueError("Parameter B must contain exactly 15 elements.")
-    # 連続波データの残差
-    dAZ_fit_C, dEL_fit_C = opt_model_C(B, AZ1, EL1, AZ2, EL2)
-    if len(dAZ_obs_C) != len(dAZ_fit_C) or len(dEL_obs_C) != len(dEL_fit_C):
-        raise ValueError("Continuous wave data dimensions do not match the model output.")    
-    residuals_dAZ_C = dAZ_obs_C - dAZ_fit_C
-    residuals_dEL_C = dEL_obs_C - dEL_fit_C
-    
-    # 輝線データの残差
-    dAZ_fit_L, dEL_fit_L = opt_model_L(B, AZ, EL)
-    if len(dAZ_obs_L) != len(dAZ_fit_L) or len(dEL_obs_L) != len(dEL_fit_L):
-        raise ValueError("Line data dimensions do not match the model output.")
-    residuals_dAZ_L = dAZ_obs_L - dAZ_fit_L
-    residuals_dEL_L = dEL_obs_L - dEL_fit_L
-
-    return np.concatenate([residuals_dAZ_C, residuals_dEL_C, residuals_dAZ_L, residuals_dEL_L])
-
 ##################################################################################################  other model
+# （使う場合は pointingmodel.py の MODEL_DEFS に宣言する）
 #def model_60cm_3(B, AZ, EL):
 #    """
 #    ant30/instrument.cppにあったモデル式
@@ -849,7 +733,7 @@ def plot_daz_del(dAZ_obs, dEL_obs, dAZ_fit, dEL_fit, model_name):
 
     plt.tight_layout()
     plt.savefig(f'result1_{model_name}.png')
-    plt.show()
+    batchmode.show()
 
 # 輝線データ用プロット
 # AZ vs dAZ, AZ vs dEL, EL vs dAZ, EL vs dEL のプロット
@@ -894,7 +778,7 @@ def plot_subplots_L(AZ, EL, dAZ_obs, dAZ_fit, dEL_obs, dEL_fit, model_name):
 
     plt.tight_layout()
     plt.savefig(f'result2_{model_name}_L.png')
-    plt.show()
+    batchmode.show()
 
 # 連続波データ専用プロット
 def plot_subplots_C(AZ1, EL1, AZ2, EL2, dAZ_obs, dAZ_fit, dEL_obs, dEL_fit, model_name):
@@ -942,7 +826,7 @@ def plot_subplots_C(AZ1, EL1, AZ2, EL2, dAZ_obs, dAZ_fit, dEL_obs, dEL_fit, mode
 
     plt.tight_layout()
     plt.savefig(f'result2_{model_name}_C.png')
-    plt.show()
+    batchmode.show()
 
 # 輝線＋連続波データ用プロット
 def plot_subplots_L_and_C(AZ, EL, AZ1, EL1, AZ2, EL2, dAZ_obs, dAZ_fit, dEL_obs, dEL_fit, model_name):
@@ -991,7 +875,40 @@ def plot_subplots_L_and_C(AZ, EL, AZ1, EL1, AZ2, EL2, dAZ_obs, dAZ_fit, dEL_obs,
 
     plt.tight_layout()
     plt.savefig(f'result2_{model_name}_L_and_C.png')
-    plt.show()
+    batchmode.show()
+
+
+def plot_bootstrap(samples, summary, model_name):
+    """
+    ブートストラップのフィッティング前後の RMS の分布を表示する
+    """
+    fig, ax = plt.subplots(1, 2, figsize=(12, 5))
+    for axis, key, title in ((ax[0], 'before_rms', 'before'), (ax[1], 'after_rms', 'after')):
+        axis.hist(samples[key], bins=50, color='gray')
+        axis.axvline(summary[key]['median'], color='red', label='median')
+        axis.axvspan(summary[key]['low'], summary[key]['high'], color='red', alpha=0.2, label='68%')
+        axis.set(xlabel=r"RMS [arcsec]", ylabel="count", title=f"{title} (n={summary['n']})")
+        axis.legend()
+
+    plt.tight_layout()
+    plt.savefig(f'bootstrap_{model_name}.png')
+    batchmode.show()
+
+
+def plot_search(result, front):
+    """
+    全ての組み合わせの項の数と交差検証の RMS、パレート最適な組み合わせを表示する
+    """
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.scatter(result['n_terms'], result['cv_rms'], c="gray", s=5, alpha=0.3, label="candidates")
+    ax.plot(result['n_terms'][front], result['cv_rms'][front], "o-", c="red", label="Pareto front")
+    ax.set(xlabel="number of terms", ylabel=r"cross-validated RMS [arcsec]")
+    ax.set_ylim(0, np.nanpercentile(result['cv_rms'], 99) * 1.1)
+    ax.legend()
+
+    plt.tight_layout()
+    plt.savefig('result_search.png')
+    batchmode.show()
 
 
 def save(AZ, EL, dAZ_obs, dAZ_fit, dEL_obs, dEL_fit, model_name):
@@ -1003,4 +920,37 @@ def save(AZ, EL, dAZ_obs, dAZ_fit, dEL_obs, dEL_fit, model_name):
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', help='pointing model (without this, the interactive menu is used)', choices=list(MODEL_PARAMS), default=None)
+    parser.add_argument('--initial', help="initial parameters: 'conf' (values in ant30_phaseC0.conf) or comma separated values", default='conf')
+    parser.add_argument('--write-conf', help='write the fitted parameters to ant30_phaseC0.conf without asking', action='store_true')
+    parser.add_argument('--solver', help='auto: solve the linear least-squares problem directly, least_squares: iterate with scipy least_squares', choices=SOLVERS, default='auto')
+    parser.add_argument('--bootstrap', help='number of bootstrap resamples of the offset rows for the parameter errors', type=int, default=0)
+    parser.add_argument('--seed', help='random seed for --bootstrap and the --search folds', type=int, default=None)
+    parser.add_argument('-j', '--workers', help='number of processes for --bootstrap and --search (0: number of CPUs)', type=int, default=1)
+    parser.add_argument('--robust', help='robust fit: clip (iterative sigma clipping), huber or cauchy loss', choices=pointingfit.ROBUST_METHODS, default=None)
+    parser.add_argument('--robust-threshold', help='residual threshold for --robust in units of the robust standard deviation (default: 3.0 for clip, 1.345 for huber, 2.385 for cauchy)', type=float, default=None)
+    parser.add_argument('--update', help='fold only the new offset rows into the saved normal equations and solve (recursive least squares); requires --model', action='store_true')
+    parser.add_argument('--state', help='state file for --update (default: rls_<model>.npz)', default=None)
+    parser.add_argument('--forgetting', help='exponential forgetting factor per offset row for --update (1: no forgetting)', type=float, default=1.0)
+    parser.add_argument('--reset', help='rebuild the --update state from all offset rows', action='store_true')
+    parser.add_argument('--search', help='search all combinations of the terms in 60cm_model_2 and optical_model by cross-validated RMS and AIC/BIC', action='store_true')
+    parser.add_argument('--max-terms', help='maximum number of terms for --search', type=int, default=termsearch.MAX_TERMS)
+    parser.add_argument('--folds', help='number of cross-validation folds for --search', type=int, default=termsearch.FOLDS)
+    batchmode.add_arguments(parser)
+
+    args = batchmode.parse_args(parser)
+    if args.update:
+        if args.model is None:
+            parser.error("--model is required with --update")
+        run_update(args.model, args.state, args.forgetting, args.reset, args.write_conf)
+    elif args.search:
+        run_search(args.max_terms, args.folds, args.workers or None, args.seed)
+    elif args.model is None:
+        if args.batch:
+            parser.error("--model is required with --batch")
+        main(args.bootstrap, args.workers or None, args.seed, args.robust, args.robust_threshold)
+    else:
+        run_batch(args.model, args.initial, args.write_conf, args.solver, args.bootstrap, args.workers or None, args.seed,
+                  args.robust, args.robust_threshold)
\ No newline at end of file
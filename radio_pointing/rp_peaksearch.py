@@ -4,32 +4,41 @@ import numpy as np
 import pandas as pd
 import glob
 import os
+import sys
 from scipy import interpolate
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
+# 非対話実行の共通モジュール (../common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import batchmode
+
+import peakfind
 
 """
 実行例　python3 rp_peaksearch.py 解析したいファイルが入ったディレクトリ名
 
 入力ファイル(ant30-2degrpsn-202410071532_plot_*.txt)を用いて
 指定した閾値と求めたピーク中心位置をプロット
+--auto を指定した場合は閾値を使わず、半値の交点（またはガウス関数のフィッティング）でピーク中心を自動で求める
 
 器差モデルフィットに必要な情報（AZ, EL, dAZ, dEL）
 出力ファイル(ant30-2degrpsn-202410071532_offset.txt) を作成
 """
 
-def main(directory):
+def main(directory, thresholds=None, method=None):
     """
     キーボード入力したSetNumberをもとに、各AZ, ELスキャンの閾値をキーボード入力で設定。
     閾値の線と、エッジの範囲を網掛けした図を表示する
     器差パラ計算に必要な情報をテキストファイルに保存
+    thresholds を指定した場合は threshold.tmp の代わりにその閾値 [K] を使う
+    method ('halfmax', 'gauss') を指定した場合は閾値を使わず、peakfind でピーク中心を自動で求める
     """
     # 入力したディレクトリ内にある _scanplot_*.txt ファイルの総数を2で割った値をSetNumberに格納
     plot_files = glob.glob(os.path.join(directory, '*_scanplot_*.txt'))
     SetNumber = len(plot_files) // 2
-    plot_and_write(directory, SetNumber)
+    plot_and_write(directory, SetNumber, thresholds, method)
 
 
 def read_inputfile(directory, SetNumber):
@@ -84,18 +93,70 @@ def load_thresholds_from_temp(temp_file, SetNumber):
 
     return thresholds_AZ, thresholds_EL
 
-def plot_and_write(directory, SetNumber):
+def split_thresholds(thresholds, SetNumber):
+    """
+    コマンドラインで指定した閾値のリストを AZ, EL のリストに分ける。
+    1つだけの場合は全スキャン共通、2*SetNumber 個の場合は threshold.tmp と同じ順 (AZ_1, EL_1, AZ_2, EL_2, ...)。
+    """
+    if len(thresholds) == 1:
+        thresholds = list(thresholds) * (2 * SetNumber)
+    if len(thresholds) != 2 * SetNumber:
+        raise ValueError(f"Number of thresholds must be 1 or {2 * SetNumber}, not {len(thresholds)}")
+
+    return list(thresholds[0::2]), list(thresholds[1::2])
+
+def find_intersections(x, y, threshold):
+    """
+    スキャンのデータ (x, y) と閾値の線の交点の x を線形補間で求めてリストで返す。
+    """
+    index = np.where(np.diff(np.sign(y - threshold)))[0]
+    intersections = []
+
+    # 線形補間で交点を計算
+    for idx in index:
+        x1, x2 = x[idx], x[idx + 1]
+        y1, y2 = y[idx], y[idx + 1]
+        slope = (y2 - y1) / (x2 - x1)
+        intercept = y1 - slope * x1
+        intersections.append((threshold - intercept) / slope)
+
+    return intersections
+
+def plot_auto_peak(axis, peak, method):
+    """
+    peakfind で求めた半値の高さ（またはフィッティング曲線）をプロットし、交点のリストを返す。
+    中心が求まらなかった場合は空のリストを返す。
+    """
+    axis.plot(peak['x'], peak['level'], color='r', linestyle='-', label='half maximum')
+    if method == 'gauss':
+        axis.plot(peak['x'], peak['model'], color='orange', linestyle='-', label='gauss fit')
+    if not np.isfinite(peak['center']):
+        return []
+
+    return peak['crossings']
+
+def plot_and_write(directory, SetNumber, thresholds=None, method=None):
     """
     read_inputfile()で作成した辞書を使って、AZとELのスキャンをプロット。
     閾値とエッジ部分を表示し、確認のためのプロットを行う。タイトルには閾値とオフセットを入れる。
+    method を指定した場合は閾値のかわりに peakfind.find_peak で求めた半値の交点と中心を使う（gauss の場合、中心はフィッティング結果）。
     出力ファイル(offset_c.txt) 単位は全て[deg]
-    AZ_1, EL_1, dAZ, AZ_2, EL_2, dEL を作成。
+    AZ_1, EL_1, dAZ, AZ_2, EL_2, dEL を作成。AZ, EL スキャンの片方でも中心が求まらなかったセットは書かずに表示する。
     """
     ret = read_inputfile(directory, SetNumber) 
     fig, ax = plt.subplots(SetNumber, 2, figsize=(3 * SetNumber, 3 * SetNumber)) 
 
     # AZとELの閾値を保持するリスト
-    thresholds_AZ, thresholds_EL = load_thresholds_from_temp(temp_file, SetNumber)
+    if method is not None:
+        thresholds_AZ = thresholds_EL = [None] * SetNumber
+        # 全セットの AZ, EL スキャン (AZ_1, EL_1, AZ_2, EL_2, ...) のピークをまとめて求める
+        keys = [(f"{axis}_{count}", f"{axis}_scanoffset") for count in range(1, SetNumber + 1) for axis in ('AZ', 'EL')]
+        peaks = peakfind.find_peaks([np.array(ret[key][column]) for key, column in keys],
+                                    [np.array(ret[key]["T_B"]) for key, _ in keys], method)
+    elif thresholds is None:
+        thresholds_AZ, thresholds_EL = load_thresholds_from_temp(temp_file, SetNumber)
+    else:
+        thresholds_AZ, thresholds_EL = split_thresholds(thresholds, SetNumber)
 
     # 輝線データ用
     #az_at_center_list = [] # AZ
@@ -114,9 +175,18 @@ def plot_and_write(directory, SetNumber):
     el_at_center_list2 = [] # EL2
     xx_center_list = []     # dEL    
 
+    # ピーク中心の誤差（method='gauss' の場合のみ）
+    x_err_list = []         # dAZ_err
+    xx_err_list = []        # dEL_err
+
+    # AZ, EL スキャンの片方でもピーク中心が求まらなかったセット（offset_C.txt には書かない）
+    skipped = []
+
     for count in range(1, SetNumber + 1):
         threshold_AZ = thresholds_AZ[count - 1]
         threshold_EL = thresholds_EL[count - 1]
+        az_result = None    # (AZ1, EL1, dAZ, dAZ_err)
+        el_result = None    # (AZ2, EL2, dEL, dEL_err)
 
         ###################################################################### AZデータ処理
         x = np.array(ret[f"AZ_{count}"]["AZ_scanoffset"])
@@ -125,23 +195,17 @@ def plot_and_write(directory, SetNumber):
         el_real_1 = np.array(ret[f"AZ_{count}"]["EL"])   
         
         ax[count - 1, 0].scatter(x, y, label="data",s=10)
-        ax[count - 1, 0].axhline(y=threshold_AZ, color='r', linestyle='-', label=f'threshold = {threshold_AZ}')
         ax[count - 1, 0].set_xlabel("AZ Scan Offset [arcsec]")
         ax[count - 1, 0].set_ylabel(r"$T_B$ [K]")
         ax[count - 1, 0].set_title(f"AZ_scan, Set {count}")
         
         # 交点の計算と描画
-        index = np.where(np.diff(np.sign(y - threshold_AZ)))[0]
-        x_intersections = []
-
-        # 線形補間で交点を計算
-        for idx in index:
-            x1, x2 = x[idx], x[idx + 1]
-            y1, y2 = y[idx], y[idx + 1]
-            slope = (y2 - y1) / (x2 - x1)
-            intercept = y1 - slope * x1
-            cross_x = (threshold_AZ - intercept) / slope
-            x_intersections.append(cross_x)
+        if method is None:
+            ax[count - 1, 0].axhline(y=threshold_AZ, color='r', linestyle='-', label=f'threshold = {threshold_AZ}')
+            x_intersections = find_intersections(x, y, threshold_AZ)
+        else:
+            peak = peaks[2 * (count - 1)]
+            x_intersections = plot_auto_peak(ax[count - 1, 0], peak, method)
         
         # 垂直な点線を閾値とプロットの交点に描画
         for cross_x in x_intersections:
@@ -149,7 +213,7 @@ def plot_and_write(directory, SetNumber):
         
         # 両端の交点の中心に青線を描画（点線の中心）
         if len(x_intersections) >= 2:
-            x_center = np.mean(x_intersections)
+            x_center = np.mean(x_intersections) if method != 'gauss' else peak['center']
             ax[count - 1, 0].axvline(x=x_center, color='b', linestyle='-', label=f'Center x = {x_center:.2f}') 
 
             # 線形補間で az_scanoffset = 0 のときの AZ, EL の値を取得
@@ -158,10 +222,7 @@ def plot_and_write(directory, SetNumber):
             az_at_zero = f_az_1(0)  
             el_at_zero = f_el_1(0)              
 
-            # リストに追加
-            az_at_center_list.append(az_at_zero) # AZ1
-            el_at_center_list.append(el_at_zero) # EL1
-            x_center_list.append(x_center)       # dAZ
+            az_result = (az_at_zero, el_at_zero, x_center, peak['center_err'] if method == 'gauss' else np.nan)
 
         ax[count - 1, 0].legend()
 
@@ -172,28 +233,23 @@ def plot_and_write(directory, SetNumber):
         el_real_2 = np.array(ret[f"EL_{count}"]["EL"])  
         
         ax[count - 1, 1].scatter(xx, yy, label="data",s=10)
-        ax[count - 1, 1].axhline(y=threshold_EL, color='r', linestyle='-', label=f'threshold = {threshold_EL}')
         ax[count - 1, 1].set_xlabel("EL Scan Offset [arcsec]")
         ax[count - 1, 1].set_ylabel(r"$T_B$ [K]")
         ax[count - 1, 1].set_title(f"EL_scan, Set {count}")
         
         # 交点の計算とプロット
-        index = np.where(np.diff(np.sign(yy - threshold_EL)))[0]
-        xx_intersections = []
-
-        for idx in index:
-            x1, x2 = xx[idx], xx[idx + 1]
-            y1, y2 = yy[idx], yy[idx + 1]
-            slope = (y2 - y1) / (x2 - x1)
-            intercept = y1 - slope * x1
-            cross_xx = (threshold_EL - intercept) / slope
-            xx_intersections.append(cross_xx)
+        if method is None:
+            ax[count - 1, 1].axhline(y=threshold_EL, color='r', linestyle='-', label=f'threshold = {threshold_EL}')
+            xx_intersections = find_intersections(xx, yy, threshold_EL)
+        else:
+            peak = peaks[2 * (count - 1) + 1]
+            xx_intersections = plot_auto_peak(ax[count - 1, 1], peak, method)
         
         for cross_xx in xx_intersections:
             ax[count - 1, 1].axvline(x=cross_xx, color='g', linestyle='--', label=f'x = {cross_xx:.2f}')
         
         if len(xx_intersections) >= 2:
-            xx_center = np.mean(xx_intersections)
+            xx_center = np.mean(xx_intersections) if method != 'gauss' else peak['center']
             ax[count - 1, 1].axvline(x=xx_center, color='b', linestyle='-', label=f'Center x = {xx_center:.2f}') 
 
             # 線形補間で el_scanoffset = 0 のときの AZ, EL の値を取得
@@ -202,17 +258,30 @@ def plot_and_write(directory, SetNumber):
             az_at_zero_2 = f_az_2(0)
             el_at_zero_2 = f_el_2(0)   
 
-            # リストに追加
-            el_at_center_list2.append(el_at_zero_2) # EL2
-            az_at_center_list2.append(az_at_zero_2) # AZ2
-            xx_center_list.append(xx_center)      # dEL
+            el_result = (az_at_zero_2, el_at_zero_2, xx_center, peak['center_err'] if method == 'gauss' else np.nan)
 
         ax[count - 1, 1].legend()
 
+        # AZ, EL スキャンの両方で中心が求まったセットだけリストに追加する（行の AZ と EL の組がずれないように）
+        if az_result is None or el_result is None:
+            failed = [name for name, result in (('AZ', az_result), ('EL', el_result)) if result is None]
+            print(f"Set {count}: {' and '.join(failed)} scan peak center not found, skipped")
+            skipped.append(count)
+            continue
+
+        az_at_center_list.append(az_result[0])   # AZ1
+        el_at_center_list.append(az_result[1])   # EL1
+        x_center_list.append(az_result[2])       # dAZ
+        x_err_list.append(az_result[3])
+        az_at_center_list2.append(el_result[0])  # AZ2
+        el_at_center_list2.append(el_result[1])  # EL2
+        xx_center_list.append(el_result[2])      # dEL
+        xx_err_list.append(el_result[3])
+
     fig.tight_layout()
     #plt.savefig(os.path.join(directory, directory + "_threshold.png"))
     plt.savefig(os.path.join(directory, "threshold.png"))
-    plt.show()
+    batchmode.show()
 
     # 結果をテキストファイルに保存
     # 輝線データ用フォーマット
@@ -223,16 +292,34 @@ def plot_and_write(directory, SetNumber):
     #        f.write(f"{az_at_center:.6f},{el_at_center:.6f},{x_center/3600:.6f},{xx_center/3600:.6f}\n")
 
     # 連続波データ用フォーマット（クロススキャンで得られるデータセットはこっち）
+    # method='gauss' の場合は、ピーク中心の誤差 dAZ_err, dEL_err [deg] の列を後ろに加える
     outputfile = os.path.join(directory, "offset_C.txt")
     with open(outputfile, 'w') as f:
-        f.write("AZ1, EL1, dAZ, AZ2, EL2, dEL\n")
-        for az_at_center, el_at_center, x_center, az_at_center2, el_at_center2, xx_center in zip(az_at_center_list, el_at_center_list, x_center_list, az_at_center_list2, el_at_center_list2, xx_center_list):
-            f.write(f"{az_at_center:.6f}\t{el_at_center:.6f}\t{x_center/3600:.6f}\t{az_at_center2:.6f}\t{el_at_center2:.6f}\t{xx_center/3600:.6f}\n")# x_center [arcsec] → [deg]
+        if method == 'gauss':
+            f.write("AZ1, EL1, dAZ, AZ2, EL2, dEL, dAZ_err, dEL_err\n")
+        else:
+            f.write("AZ1, EL1, dAZ, AZ2, EL2, dEL\n")
+        for az_at_center, el_at_center, x_center, az_at_center2, el_at_center2, xx_center, x_err, xx_err in zip(az_at_center_list, el_at_center_list, x_center_list, az_at_center_list2, el_at_center_list2, xx_center_list, x_err_list, xx_err_list):
+            line = f"{az_at_center:.6f}\t{el_at_center:.6f}\t{x_center/3600:.6f}\t{az_at_center2:.6f}\t{el_at_center2:.6f}\t{xx_center/3600:.6f}"# x_center [arcsec] → [deg]
+            if method == 'gauss':
+                line += f"\t{x_err/3600:.6f}\t{xx_err/3600:.6f}"
+            f.write(line + "\n")
+    if skipped:
+        print(f"{len(skipped)} of {SetNumber} sets skipped (Set {', '.join(map(str, skipped))}); {SetNumber - len(skipped)} rows written to {outputfile}")
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('directory', help='Enter directories you want to analyze')
+    parser.add_argument('--thresholds', help='T_B thresholds [K] instead of threshold.tmp (one for all scans, or AZ_1 EL_1 AZ_2 EL_2 ...)', type=float, nargs='+', default=None)
+    parser.add_argument('--auto', help='find peak centers automatically instead of thresholds (halfmax: half-maximum crossings, gauss: gaussian + baseline fit)', choices=peakfind.METHODS, default=None)
+    batchmode.add_arguments(parser)
     
-    args = parser.parse_args()
-    main(args.directory)
+    args = batchmode.parse_args(parser)
+    if args.auto is not None and args.thresholds is not None:
+        parser.error("--auto and --thresholds cannot be used together")
+    method = args.auto
+    if args.batch and method is None and args.thresholds is None and not os.path.exists(temp_file):
+        print("threshold.tmp not found: finding peak centers automatically (--auto halfmax)")
+        method = 'halfmax'
+    main(args.directory, args.thresholds, method)
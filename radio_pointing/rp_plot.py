@@ -1,10 +1,8 @@
 #!python3
 
 import numpy as np
-import pandas as pd
-import datetime
-import re
-import datetime
+import os
+import sys
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
@@ -12,6 +10,14 @@ import scipy
 from scipy import signal
 from scipy import interpolate
 
+# ant30ログ・パワーメーターログの共通読み込みモジュール (../common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import align
+import batchmode
+import logindex
+import interval
+import logtime
+
 """
 ant30ログ、アンテナログ、パワーメーターログから、横軸：スキャンオフセット、縦軸：輝度温度T_B
 のプロットをscan sequenceごとに表示させるプログラム。
@@ -30,400 +36,137 @@ Set Patternを何回繰り返すかを指定するSetNumberはいくつでもよ
 """
 
 
-def get_azel_scanoffset_ant30log(filename,linemargin=0,starting_keyword='(Az, El) ='):
+def get_azel_scanoffset_ant30log(log_index):
     """
-    ant30ログからdate, timestamp, AZ, EL, AZ_scanoffset, EL_scanoffsetを取得して辞書で保存。
+    ant30ログの索引からdate, timestamp, AZ, EL, AZ_scanoffset, EL_scanoffsetを取得して辞書で保存。
     np.arrayに変換。
-    linemerginのところは要変更。
     """
     ret = {}
 
-    # file reading
-    datalines = ''
-    with open(filename)as f:
-        datalines= f.readlines()
-        pass
+    azel = log_index['azel'][:-1]  # 従来どおり最後の (Az, El) 行は含めない
+    dt = azel['time']
+    ts = logtime.ns_to_timestamp(dt.astype(np.int64))
 
-    # get target-line region
-    tmp = np.where([starting_keyword in d for d in datalines])[0]
-    lnbgn = tmp[0] - linemargin
-    lnend = tmp[-1] + linemargin
-    
-    # get azel lines
-    dl_ri = np.array([l.replace('\n','').replace(',','').replace('[','').replace(']','').replace('(','').replace(')','').split(' ') for l in datalines[lnbgn:lnend] if '(Az, El) =' in l])
-
-    # convert line strings to azel or time
-    dt = np.array([datetime.datetime.strptime(' '.join(x.split('-')[:2]),'%Y/%m/%d %H:%M:%S.%f') for x in dl_ri[:,0]])
-    ts = np.array([x.timestamp() for x in dt])
-
-    AZ = np.array([float(x) for x in dl_ri[:,4]]) 
-    EL = np.array([float(x) for x in dl_ri[:,5]]) 
-    AZ_scanoffset = np.array([float(x) for x in dl_ri[:,9]]) 
-    EL_scanoffset = np.array([float(x) for x in dl_ri[:,10]]) 
-
-    ret['AZ'] = AZ
-    ret['EL'] = EL
-    ret['AZ_scanoffset'] = AZ_scanoffset
-    ret['EL_scanoffset'] = EL_scanoffset
+    ret['AZ'] = azel['az']
+    ret['EL'] = azel['el']
+    ret['AZ_scanoffset'] = azel['az_scanoffset']
+    ret['EL_scanoffset'] = azel['el_scanoffset']
     ret['date'] = dt
     ret['timestamp'] = ts
-    ret['fn'] = '.'.join(filename.split('/')[-1].split('.')[:-1])
+    ret['fn'] = log_index['fn']
 
     return ret
     
 
-def get_powerdata(filename):
+def get_powerdata(filename, use_cache=True):
     """
-    パワーメーターログから、date, timestamp, power[dBm]を抽出し、辞書に格納しnp.array形式で保存。
+    パワーメーターログから、time [ns], date, timestamp, power[dBm]を抽出し、辞書に格納しnp.array形式で保存。
     """
-    ret = {}
-
-    spa_pd = pd.read_csv(filename, sep='\t', header=None, names=['date','power'])
-    ret['date'] = np.array([datetime.datetime.strptime(x[:25],'[%Y/%m/%d-%H:%M:%S.%f]') for x in spa_pd.date])
-    ret['timestamp'] = np.array([x.timestamp() for x in ret['date']])
-    ret['power'] = np.array(spa_pd.power)
-    ret['fn'] = '.'.join(filename.split('/')[-1].split('.')[:-1])
+    ret = dict(interval.load_powerlog(filename, use_cache))
+    ret['date'] = logtime.ns_to_datetime64(ret['time'])
+    ret['timestamp'] = logtime.ns_to_timestamp(ret['time'])
 
     return ret
 
 
-def extract_SetNumber(ant30log):
-    """
-    ant30ログからSetNumberを抽出する
-    """
-    SetNumber = None
-
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
-
-    for line in log_lines:
-            SetNumber_match = re.search(r'SetNumber\s+(\d+)', line)
-
-            if SetNumber_match:
-                SetNumber = SetNumber_match.group(1)
-                
-    return SetNumber  
-
-def extract_ON_time_from_ant30(ant30log):
+def extract_ON_time_from_ant30(log_index):
     """
-    ant30logからon開始時のon_start_timeとON終了時刻on_end_timeをdatetimeに変換し、辞書に保存。
+    ant30ログの索引からon開始時のon_start_timeとON終了時刻on_end_timeを取得し、辞書に保存。
     クロススキャンの場合、OnOffTimeはずれるので使わない。
     """
     ret = {}
 
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
-
-    count = 1 
-
-    for line in log_lines:
-        if '# On-Point  Integ start' in line:  # 助走分も含める        
-            time_match = re.search(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})', line)
-            if time_match:
-                on_time_str = time_match.group(1)
-                on_start_time = datetime.datetime.strptime(on_time_str, "%Y/%m/%d-%H:%M:%S.%f")
-
-        if '# On-Point  Integ end' in line:          
-            time_match = re.search(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})', line)
-            if time_match:
-                on_time_str = time_match.group(1)
-                on_end_time = datetime.datetime.strptime(on_time_str, "%Y/%m/%d-%H:%M:%S.%f")
-
-                # on_end_timeを追加する前に、その前に取得した値が正しいか確認。
-                if 'on_end_time' in locals():  # on_end_time が定義されている場合にのみ追加
-                    ret[f"on_end_time_{count}"] = on_end_time
-                    ret[f"on_start_time_{count}"] = on_start_time
-                    count += 1
-    return ret
-
-
-def extract_OnOfftime_from_ant30(ant30log):
-    """
-    abt30ログからOnOffTimeを読み取る。OFF点の観測開始と終了時間の取得に必要
-    """
-    OnOffTime = None
+    on_start_time, on_end_time = logindex.get_integ_time(log_index, 'on')  # 助走分も含める
 
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
+    for count, (start_time, end_time) in enumerate(zip(on_start_time, on_end_time), start=1):
+        ret[f"on_end_time_{count}"] = end_time
+        ret[f"on_start_time_{count}"] = start_time
 
-    for line in log_lines:
-            OnOffTime_match = re.search(r'OnOffTime\s+(\d+)', line)
-            if OnOffTime_match:
-                OnOffTime = OnOffTime_match.group(1)
-                
-    return OnOffTime    
+    return ret
 
 
-def extract_OFF_time_from_ant30(ant30log, OnOffTime):
+def extract_OFF_time_from_ant30(log_index, OnOffTime):
     """
-    ant30logからON終了時刻off_end_timeをdatetimeに変換し、辞書に保存。
+    ant30ログの索引からOFF終了時刻off_end_timeを取得し、辞書に保存。
     OnOffTimeから、off_end_timeをもとにoff_start_timeを計算して、辞書に保存。
     """
     ret = {}
 
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
+    off_start_time, off_end_time = logindex.get_integ_time(log_index, 'off', OnOffTime)
 
-    count = 1 
-
-    for line in log_lines:
-        if '# Off-Point Integ end' in line:          
-            time_match = re.search(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})', line)
-
-            if time_match:
-                off_time_str = time_match.group(1)
-                off_end_time = datetime.datetime.strptime(off_time_str, "%Y/%m/%d-%H:%M:%S.%f")
-                off_start_time = off_end_time - datetime.timedelta(seconds=int(OnOffTime))
-
-                ret[f"off_end_time_{count}"] = off_end_time
-                ret[f"off_start_time_{count}"] = off_start_time
-
-                count += 1
+    for count, (start_time, end_time) in enumerate(zip(off_start_time, off_end_time), start=1):
+        ret[f"off_end_time_{count}"] = end_time
+        ret[f"off_start_time_{count}"] = start_time
 
     return ret 
 
 
-def calculate_average_OFFpower(ant30log, powerlog, off_dict):
+def calculate_average_window_power(log_index, dict_power, window_dict, prefix, name):
     """
-    各ON点ごとの観測開始(off_start_time)から終了(off_end_time)までの範囲のパワーメーター出力値を
-    カウントごと取得し平均値を計算。辞書形式で保存。
+    各セットごとの観測開始({prefix}_start_time)から終了({prefix}_end_time)までの範囲のパワーメーター出力値の
+    平均値を全セットまとめて計算。average_{name}_power_{count} をキーとした辞書形式で保存。
     """ 
-    average_OFF_power = {}
+    average_power = {}
 
-    power_dict = get_powerdata(powerlog)
-    SetNumber = int(extract_SetNumber(ant30log))
+    SetNumber = log_index['SetNumber']
 
+    counts = []
     for count in range(1, SetNumber + 1): # SetNumberの回数分ループを作成
-        start_key = f"off_start_time_{count}" 
-        end_key = f"off_end_time_{count}"
-        #print(f"calculate_average_OFFpower() Checking keys: {start_key}, {end_key}")
+        start_key = f"{prefix}_start_time_{count}" 
+        end_key = f"{prefix}_end_time_{count}"
 
-        if start_key not in off_dict or end_key not in off_dict:
-            print(f"calculate_average_OFFpower() Key not found: {start_key} or {end_key}")
+        if start_key not in window_dict or end_key not in window_dict:
+            print(f"calculate_average_window_power() Key not found: {start_key} or {end_key}")
             continue
+        counts.append(count)
 
-        # 各カウント数ごとの時刻範囲に含まれるパワーログの値を保存するためのリスト
-        power_values = []  
-
-        # 各タイムスタンプを個別に確認して、範囲内にあるかチェック
-        for i, timestamp in enumerate(power_dict['date']):
-            if off_dict[start_key] <= timestamp <= off_dict[end_key]:
-                power_values.append(power_dict['power'][i])
-                #print(f"calculate_average_OFFpower() Power value in range: {power_dict['power'][i]}")
+    # 全セットの時刻範囲を一度に渡して平均値を計算
+    start_time = [window_dict[f"{prefix}_start_time_{count}"] for count in counts]
+    end_time = [window_dict[f"{prefix}_end_time_{count}"] for count in counts]
+    stats = interval.interval_stats(dict_power['time'], dict_power['power'], start_time, end_time)
 
-        if power_values:
-            average_OFF_power[f"average_OFF_power_{count}"] = np.mean(power_values)
-        else:
-            average_OFF_power[f"average_OFF_power_{count}"] = None
+    for count, mean, n in zip(counts, stats['mean'].tolist(), stats['count'].tolist()):
+        average_power[f"average_{name}_power_{count}"] = mean if n > 0 else None
 
-    return average_OFF_power
+    return average_power
 
 
-def extract_RSkyTime_from_ant30(ant30log):
+def calculate_average_OFFpower(log_index, dict_power, off_dict):
     """
-    R終了時間から逆算して求めるため、ant30ログからRskyTimeを読み取る。
-    """
-    RSkyTime = None
-
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
-
-    for line in log_lines:
-            RSkyTime_match = re.search(r'RSkyTime\s+(\d+)', line)
-            if RSkyTime_match:
-                RSkyTime = int(RSkyTime_match.group(1))
-                
-    return RSkyTime    
-
-
-def extract_Rtime_from_ant30(ant30log, RSkyTime):
-    """
-    ant30logを読み込み、R終了時の時刻情報をdatetimeに変換して辞書形式で保存。
-    """
-    ret = {}
-    count = 1  # R終了時の時刻に順番をつけるためのカウンタ
-
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
-
-    for line in log_lines:
-        if '# R-Sky     Integ end' in line:   
-                time_match = re.search(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})', line)
-                if time_match:
-                    R_time_str = time_match.group(1)
-                    R_end_time = datetime.datetime.strptime(R_time_str, "%Y/%m/%d-%H:%M:%S.%f")
-                    R_start_time = R_end_time - datetime.timedelta(seconds=int(RSkyTime))
-                    ret[f"R_end_time_{count}"] = R_end_time
-                    ret[f"R_start_time_{count}"] = R_start_time
-                    count += 1
-
-    return ret 
-
-
-def calculate_average_Rpower(ant30log, powerlog, R_dict):
-    """
-    各Rごとの観測開始(R_start_time)から終了(R_end_time)までの範囲のパワーメーター出力値を
-    カウントごとに取得し、平均値を計算して辞書に保存。
+    各セットごとの観測開始(off_start_time)から終了(off_end_time)までの範囲のパワーメーター出力値の
+    平均値を計算。辞書形式で保存。
     """ 
-    average_R_power = {}
-
-    power_dict = get_powerdata(powerlog)
-    SetNumber = int(extract_SetNumber(ant30log))
-
-    for count in range(1, SetNumber + 1): # SetNumberの回数分ループを作成
-        start_key = f"R_start_time_{count}" 
-        end_key = f"R_end_time_{count}"
-        #print(f"calculate_average_Rpower() Checking keys: {start_key}, {end_key}")
-
-        if start_key not in R_dict or end_key not in R_dict:
-            print(f"calculate_average_OFFpower() Key not found: {start_key} or {end_key}")
-            continue
-
-        # 各カウント数ごとの時刻範囲に含まれるパワーログの値を保存するためのリスト
-        power_values = []  
-
-        # 各タイムスタンプを個別に確認して、範囲内にあるかチェック
-        for i, timestamp in enumerate(power_dict['date']):
-            if R_dict[start_key] <= timestamp <= R_dict[end_key]:
-                power_values.append(power_dict['power'][i])
-                #print(f"calculate_average_Rpower() Power value in range: {power_dict['power'][i]}")
-
-        if power_values:
-            average_R_power[f"average_R_power_{count}"] = np.mean(power_values)
-        else:
-            average_R_power[f"average_R_power_{count}"] = None
-
-    return average_R_power
+    return calculate_average_window_power(log_index, dict_power, off_dict, 'off', 'OFF')
 
 
-def extract_SetNumber_from_ant30(ant30log):
+def extract_Rtime_from_ant30(log_index, RSkyTime):
     """
-    ant30ログからSetNumberを読み取る。scan sequenceごとのプロットに必要。
+    ant30ログの索引から、R終了時の時刻情報を取得して辞書形式で保存。
     """
-    SetNumber = None
-
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
-
-    for line in log_lines:
-            SetNumber_match = re.search(r'SetNumber\s+(\d+)', line)
-
-            if SetNumber_match:
-                SetNumber = int(SetNumber_match.group(1))
-                
-    return SetNumber   
-
-
-def extract_RSkyTime_from_ant30(ant30log):
-    """
-    R終了時間から逆算して求めるため、ant30ログからRskyTimeを読み取る。
-    """
-    RSkyTime = None
-
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
-
-    for line in log_lines:
-            RSkyTime_match = re.search(r'RSkyTime\s+(\d+)', line)
-
-            if RSkyTime_match:
-                RSkyTime = int(RSkyTime_match.group(1))
-                
-    return RSkyTime    
-
-
-def calculate_average_power_R(powerlog, R_start_time, R_end_time):
-    """
-    R観測の時刻範囲でパワーメーター出力値の平均値V_Rを戻り値として得る。
-    """
-    # パワーメーターログのフォーマット [yyyy/mm/dd-hh:mm:ss.ms] data
-    powerlog_format = re.compile(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})\]\s+([\d\.]+)')
-
-    power_values = []
-
-    with open(powerlog, 'r') as file:
-        lines = file.readlines()
-
-        for line in lines:
-            line = line.strip()
-
-            match = powerlog_format.match(line)
-            if match:
-                timestamp_str = match.group(1)  # [yyyy/mm/dd-hh:mm:ss.ms]
-                powerlog_time = datetime.datetime.strptime(timestamp_str, '%Y/%m/%d-%H:%M:%S.%f')
-                power_value = float(match.group(2)) 
-
-                if R_start_time <= powerlog_time <= R_end_time:
-                    power_values.append(power_value)
-                    #print(f"calculate_average_power_R() Added power value: {power_value} at {powerlog_time}")
-
-    # 指定された範囲内にパワー値があれば平均を計算し、そうでなければNoneを返す
-    if power_values:
-        V_R = np.mean(power_values)
-        return V_R
-    else:
-        print(f"No power values found within the range {R_start_time} to {R_end_time}")
-        return None
-    
-
-def extract_OnOfftime_from_ant30(ant30log):
-    """
-    各OFF点ごとの観測開始時間を観測終了時間から逆算して求めるため、ant30ログからOnOffTimeを読み取る。
-    """
-    OnOffTime = None
+    ret = {}
 
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
+    R_start_time, R_end_time = logindex.get_integ_time(log_index, 'r', RSkyTime)
 
-    for line in log_lines:
-            OnOffTime_match = re.search(r'OnOffTime\s+(\d+)', line)
+    for count, (start_time, end_time) in enumerate(zip(R_start_time, R_end_time), start=1):  # R終了時の時刻に順番をつける
+        ret[f"R_end_time_{count}"] = end_time
+        ret[f"R_start_time_{count}"] = start_time
 
-            if OnOffTime_match:
-                OnOffTime = OnOffTime_match.group(1)
-                
-    return OnOffTime  
+    return ret 
 
 
-def calculate_average_power_ON(powerlog, off_start_time, off_end_time):
+def calculate_average_Rpower(log_index, dict_power, R_dict):
     """
-    各OFF点ごとの観測開始(on_start_time)から終了(on_end_time)までの範囲のパワーメーター出力値を
-    カウントごとに取得し、平均値を計算してリストに保存。
+    各Rごとの観測開始(R_start_time)から終了(R_end_time)までの範囲のパワーメーター出力値の
+    平均値を計算して辞書に保存。
     """ 
-    # パワーログのフォーマット（仮定） [yyyy/mm/dd-hh:mm:ss.ms] data
-    powerlog_contents = re.compile(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})\]\s+([\d\.]+)')
-    
-    average_OFFpower_list = []
-
-    with open(powerlog, 'r') as file:
-        lines = file.readlines()
+    return calculate_average_window_power(log_index, dict_power, R_dict, 'R', 'R')
 
-    for count in range(len(off_start_time)):
-        start_time = off_start_time[count]  
-        end_time = off_end_time[count]      
 
-        # 指定されたカウントの範囲に含まれるパワー値を取得
-        power_values = []
-        for line in lines:
-            match = powerlog_contents.match(line)
-            if match:
-                timestamp_str = match.group(1)  # [yyyy/mm/dd-hh:mm:ss.ms] タイムスタンプ部分を抽出
-                powerlog_time = datetime.datetime.strptime(timestamp_str, '%Y/%m/%d-%H:%M:%S.%f')  # タイムスタンプをdatetimeに変換
-                power_value = float(match.group(2))  # パワー値を数値として取得
+# ant30ログの (Az, El) 行の間隔がこれより長い時刻（ログの途切れ）は使わない [s]
+MAX_GAP = 1.0
 
-                if start_time <= powerlog_time <= end_time:
-                    power_values.append(power_value)
 
-        if power_values:
-            average_OFFpower = np.mean(power_values)
-        else:
-            average_OFFpower = None 
-
-        average_OFFpower_list.append(average_OFFpower)
-
-    return average_OFFpower_list
-
-import os
-def create_scanplot_dicts(ant30log, powerlog,T_atm, dict_azel, dict_power, on_dict, SetNumber):
+def create_scanplot_dicts(log_index, T_atm, dict_azel, dict_power, on_dict, SetNumber, interp='linear', max_gap=MAX_GAP):
     """
     各ON区間に対して、az, az_scanoffset, el, el_scanoffset, power をフィルタリングし、
     新しい辞書を作成する。
@@ -434,86 +177,68 @@ def create_scanplot_dicts(ant30log, powerlog,T_atm, dict_azel, dict_power, on_di
     SetNumber = 2 の場合、az_scan_1,2, el_scan_1,2
     SetNumber = 3 の場合、az_scan_1,2,3, el_scan_1,2,3
 
+    ant30ログの (Az, El) 行とパワーメーターログは行番号が対応しないので、AZ, EL, スキャンオフセットを
+    パワーメーターの時刻に align.resample でまとめて補間する（interp: linear, nearest, previous）。
+    (Az, El) 行の間隔が max_gap [s] より長い時刻と、ant30ログの範囲外の時刻は除く。
+    各ON区間の範囲は、パワーメーターの時刻に searchsorted でまとめて求め、スライス（コピーしないビュー）で取り出す。
+
     プロットの結果をテキストファイルに保存する。
     """
     ret = {}
 
     # 各セットごとのOFF点観測時の平均出力を計算（T_B計算用）
-    OnOffTime = extract_OnOfftime_from_ant30(ant30log)  # ant30ログからOnOffTImeを取得
-    off_dict = extract_OFF_time_from_ant30(ant30log, OnOffTime)  # ant30ログからOFF点観測時間を取得
-    dict_off_power = calculate_average_OFFpower(ant30log, powerlog, off_dict)  # OFF点観測時の平均出力を計算
+    OnOffTime = log_index['OnOffTime']  # ant30ログからOnOffTImeを取得
+    off_dict = extract_OFF_time_from_ant30(log_index, OnOffTime)  # ant30ログからOFF点観測時間を取得
+    dict_off_power = calculate_average_OFFpower(log_index, dict_power, off_dict)  # OFF点観測時の平均出力を計算
 
     # 各セットごとのR観測時の平均出力を計算（T_B計算用）
-    RSkyTime = extract_RSkyTime_from_ant30(ant30log)
-    R_dict = extract_Rtime_from_ant30(ant30log, RSkyTime)
-    dict_R_power = calculate_average_Rpower(ant30log, powerlog, R_dict)
+    RSkyTime = log_index['RSkyTime']
+    R_dict = extract_Rtime_from_ant30(log_index, RSkyTime)
+    dict_R_power = calculate_average_Rpower(log_index, dict_power, R_dict)
 
     # プロット結果を保存するディレクトリを作成
-    ret = get_azel_scanoffset_ant30log(ant30log)
-    directory = ret['fn'] + '_plot'
+    directory = dict_azel['fn'] + '_plot'
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-    for count in range(1, SetNumber + 1):
-        az_idx = 2 * count - 1  # 奇数インデックス (1, 3, 5...)
-        el_idx = 2 * count      # 偶数インデックス (2, 4, 6...)
-
-        # AZ_scanoffset 
-        az_filter = np.where(np.logical_and(on_dict[f"on_start_time_{az_idx}"] <= dict_azel['date'],
-                                            dict_azel['date'] <= on_dict[f"on_end_time_{az_idx}"]))
-        az_scanoffset = dict_azel["AZ_scanoffset"][az_filter].tolist()
-        az_real = dict_azel["AZ"][az_filter].tolist()
-        el_real = dict_azel["EL"][az_filter].tolist()
-        az_power_data = np.array(dict_power["power"][az_filter])
-        
-        # T_Bの計算
-        off_power = dict_off_power[f"average_OFF_power_{count}"]
-        R_power = dict_R_power[f"average_R_power_{count}"]
-        T_B_az = T_atm * (az_power_data - off_power) / (R_power - off_power)
-
-        ret[f"az_scan_{count}"] = {
-            "AZ": az_real, "EL": el_real, "AZ_scanoffset": az_scanoffset, 
-            "power_az": az_power_data, f"T_B_az_{count}": T_B_az.tolist()
-        }
-
-        # EL_scanoffset
-        el_filter = np.where(np.logical_and(on_dict[f"on_start_time_{el_idx}"] <= dict_azel['date'],
-                                            dict_azel['date'] <= on_dict[f"on_end_time_{el_idx}"]))
-        el_scanoffset = dict_azel["EL_scanoffset"][el_filter].tolist()
-        az_real = dict_azel["AZ"][el_filter].tolist()
-        el_real = dict_azel["EL"][el_filter].tolist()
-        el_power_data = dict_power["power"][el_filter].tolist()
-
-        # T_B の計算
-        T_B_el = T_atm * (np.array(el_power_data) - off_power) / (R_power - off_power)
-        ret[f"el_scan_{count}"] = {
-            "AZ": az_real, "EL": el_real, "EL_scanoffset": el_scanoffset, 
-            "power_el": el_power_data, f"T_B_el_{count}": T_B_el.tolist()
-        }
+    # AZ, EL, スキャンオフセットをパワーメーターの時刻に補間し、補間できた時刻だけを使う
+    columns = ('AZ', 'EL', 'AZ_scanoffset', 'EL_scanoffset')
+    aligned = align.resample(dict_azel['date'].astype(np.int64), {key: dict_azel[key] for key in columns},
+                             dict_power['time'], method=interp, max_gap=None if max_gap is None else int(max_gap * 1e9))
+    valid = aligned['valid']
+    time = dict_power['time'][valid]
+    power = dict_power['power'][valid]
+    aligned = {key: aligned[key][valid] for key in columns}
+
+    # 全ON区間 (AZ_1, EL_1, AZ_2, EL_2, ...) の範囲を searchsorted でまとめて求める
+    n_scan = 2 * SetNumber
+    on_start = [on_dict[f"on_start_time_{idx}"] for idx in range(1, n_scan + 1)]
+    on_end = [on_dict[f"on_end_time_{idx}"] for idx in range(1, n_scan + 1)]
+    i_start, i_end = interval.window_index(time, on_start, on_end)
+
+    # 各セットの T_B = T_atm * (power - OFF) / (R - OFF) の係数をまとめて計算
+    off_power = np.array([dict_off_power[f"average_OFF_power_{count}"] for count in range(1, SetNumber + 1)], dtype=np.float64)
+    R_power = np.array([dict_R_power[f"average_R_power_{count}"] for count in range(1, SetNumber + 1)], dtype=np.float64)
+    T_B_scale = T_atm / (R_power - off_power)
 
-        # AZスキャンデータを保存
-        az_filename = os.path.join(directory, f"az_scanplot_{az_idx}.txt")
-        with open(az_filename, "w") as f:
-            f.write("AZ [deg], EL [deg], AZ_scanoffset [arcsec], power [dBm], T_B [K]\n")
-            output_data_az = np.column_stack([ret[f"az_scan_{count}"]["AZ"], 
-                                              ret[f"az_scan_{count}"]["EL"], 
-                                              ret[f"az_scan_{count}"]["AZ_scanoffset"], 
-                                              ret[f"az_scan_{count}"]["power_az"], 
-                                              ret[f"az_scan_{count}"][f"T_B_az_{count}"]])
-            for row in output_data_az:
-                f.write(f"{row[0]:.6f},{row[1]:.6f},{row[2]:.6f},{row[3]:.6f},{row[4]:.6f}\n")
-
-        # ELスキャンデータを保存
-        el_filename = os.path.join(directory, f"el_scanplot_{el_idx}.txt")
-        with open(el_filename, "w") as f:
-            f.write("AZ [deg], EL [deg], EL_scanoffset [arcsec], power [dBm], T_B [K]\n")
-            output_data_el = np.column_stack([ret[f"el_scan_{count}"]["AZ"],
-                                              ret[f"el_scan_{count}"]["EL"], 
-                                              ret[f"el_scan_{count}"]["EL_scanoffset"], 
-                                              ret[f"el_scan_{count}"]["power_el"], 
-                                              ret[f"el_scan_{count}"][f"T_B_el_{count}"]])
-            for row in output_data_el:
-                f.write(f"{row[0]:.6f},{row[1]:.6f},{row[2]:.6f},{row[3]:.6f},{row[4]:.6f}\n")
+    for count in range(1, SetNumber + 1):
+        for axis, idx in (('az', 2 * count - 1), ('el', 2 * count)):  # AZ は奇数 (1, 3, 5...)、EL は偶数 (2, 4, 6...)
+            window = slice(i_start[idx - 1], i_end[idx - 1])
+            scanoffset_key = f"{axis.upper()}_scanoffset"
+            power_data = power[window]
+            T_B = (power_data - off_power[count - 1]) * T_B_scale[count - 1]
+
+            scan = {
+                "AZ": aligned["AZ"][window], "EL": aligned["EL"][window], scanoffset_key: aligned[scanoffset_key][window],
+                f"power_{axis}": power_data, f"T_B_{axis}_{count}": T_B
+            }
+            ret[f"{axis}_scan_{count}"] = scan
+
+            # スキャンデータを保存
+            filename = os.path.join(directory, f"{axis}_scanplot_{idx}.txt")
+            output_data = np.column_stack([scan["AZ"], scan["EL"], scan[scanoffset_key], power_data, T_B])
+            np.savetxt(filename, output_data, fmt='%.6f', delimiter=',', comments='',
+                       header=f"AZ [deg], EL [deg], {scanoffset_key} [arcsec], power [dBm], T_B [K]")
 
     return ret
 
@@ -588,7 +313,7 @@ def motion(event):
     save_thresholds_to_temp() # 閾値をtemoファイルに保存
 
 
-def plot_azel_scans(ant30log, plot_dict, SetNumber):
+def plot_azel_scans(fn, plot_dict, SetNumber):
     """AZELスキャンのプロットを作成し、インタラクティブな線を追加"""
     global ax, y_positions, lines
     fig, ax = plt.subplots(SetNumber, 2, figsize=(10, 5 * SetNumber))
@@ -628,33 +353,58 @@ def plot_azel_scans(ant30log, plot_dict, SetNumber):
     # プロット間の余白を調整
     fig.subplots_adjust(top=0.95, hspace=0.5, wspace=0.3)
 
+    # プロットを保存
+    directory = fn + '_plot'
+    os.makedirs(directory, exist_ok=True)
+    #plt.savefig(os.path.join(directory, ret['fn'] + '_plot.png'))
+
+    # バッチ実行では閾値線を動かせないので、図を保存するだけにする
+    if batchmode.BATCH:
+        plt.savefig(os.path.join(directory, fn + '_plot.png'))
+        batchmode.show()
+        return
+
     # インタラクティブ機能を登録
     fig.canvas.mpl_connect('button_press_event', on_click)
     fig.canvas.mpl_connect('motion_notify_event', motion)
 
-    # プロットを保存
-    ret = get_azel_scanoffset_ant30log(ant30log)
-    directory = ret['fn'] + '_plot'
-    os.makedirs(directory, exist_ok=True)
-    #plt.savefig(os.path.join(directory, ret['fn'] + '_plot.png'))
     plt.show()
 
 
-def main(ant30log, powerlog):
+def main(ant30log, powerlog, use_cache=True, T_amb=None, interp='linear', max_gap=MAX_GAP):
     """
     プロット
-    T_ambをキーボード入力し、縦軸T_Bとして表示させる。
+    T_ambを指定しない場合はキーボード入力し、縦軸T_Bとして表示させる。
+    interp, max_gap はアンテナの位置をパワーメーターの時刻に補間する方法と、補間に使う (Az, El) 行の最大の間隔 [s]。
+    use_cache=True の場合、読み込んだログを .logcache/ にキャッシュし、次回から再利用する
+    バッチ実行 (--batch) の場合、図を保存して、結果を <ant30ログ名>_plot/<ant30ログ名>_result.json に保存する
     """
-    dict_azel = get_azel_scanoffset_ant30log(ant30log) # ant30ログからaz_scanoffset, el_scanpffset, timestampを取得
-    dict_power = get_powerdata(powerlog) # パワメーターログからpower, timestampを取得
+    log_index = logindex.load_ant30log(ant30log, use_cache) # ant30ログを1回だけ読み込み、ヘッダーパラメーターと積分区間の索引を作成
+    dict_azel = get_azel_scanoffset_ant30log(log_index) # ant30ログからaz_scanoffset, el_scanpffset, timestampを取得
+    dict_power = get_powerdata(powerlog, use_cache) # パワメーターログからpower, timestampを取得
 
-    SetNumber = SetNumber = int(extract_SetNumber(ant30log)) # ant30ログから何セット観測したかを取得。プロット、T_B計算で分岐処理に使用
+    SetNumber = log_index['SetNumber'] # ant30ログから何セット観測したかを取得。プロット、T_B計算で分岐処理に使用
     
     # 横軸scanoffset, 縦軸T_B のプロット
-    T_amb = float(input("キャリブレーターの温度 T_amb [K] を入力: "))
-    on_dict = extract_ON_time_from_ant30(ant30log) # 縦軸のT_B計算用 
-    plot_dict = create_scanplot_dicts(ant30log, powerlog, T_amb, dict_azel, dict_power, on_dict, SetNumber)
-    plot_azel_scans(ant30log, plot_dict, SetNumber)
+    T_amb = batchmode.ask(T_amb, "キャリブレーターの温度 T_amb [K] を入力: ")
+    on_dict = extract_ON_time_from_ant30(log_index) # 縦軸のT_B計算用 
+    plot_dict = create_scanplot_dicts(log_index, T_amb, dict_azel, dict_power, on_dict, SetNumber, interp, max_gap)
+    plot_azel_scans(dict_azel['fn'], plot_dict, SetNumber)
+
+    if batchmode.BATCH:
+        ret = {
+            'ant30log': ant30log,
+            'powerlog': powerlog,
+            'T_amb': T_amb,
+            'SetNumber': SetNumber,
+            'interp': interp,
+            'max_gap': max_gap,
+            'scanplot_files': [f"{axis}_scanplot_{2 * count - (axis == 'az')}.txt" for count in range(1, SetNumber + 1) for axis in ('az', 'el')],
+            'plot_file': dict_azel['fn'] + '_plot.png',
+        }
+        batchmode.write_json(os.path.join(dict_azel['fn'] + '_plot', dict_azel['fn'] + '_result.json'), ret)
+
+    return plot_dict
      
 
 # ターミナルからコマンドを打ち込んで実行
@@ -664,9 +414,15 @@ if __name__ == '__main__':
     parser.add_argument('ant30log', help='ant30 logfile name')
     parser.add_argument('powerlog', help='powermeter logfile name')
     #parser.add_argument('output_filename', help='Output file name of calculation results')
+    parser.add_argument('--no-cache', help='do not use/create parsed log cache (.logcache/)', action='store_true')
+    parser.add_argument('--T_amb', help='calibrator temperature [K] (asked if omitted)', type=float, default=None)
+    parser.add_argument('--interp', help='interpolation of antenna AZ/EL/scan offsets onto powermeter timestamps', choices=align.METHODS, default='linear')
+    parser.add_argument('--max-gap', help=f'maximum interval [s] of (Az, El) lines used for interpolation (default {MAX_GAP}, negative: no limit)', type=float, default=MAX_GAP)
+    batchmode.add_arguments(parser)
     
-    args = parser.parse_args()
-    main(args.ant30log,args.powerlog)
+    args = batchmode.parse_args(parser)
+    max_gap = None if args.max_gap < 0 else args.max_gap
+    main(args.ant30log,args.powerlog,use_cache=not args.no_cache,T_amb=args.T_amb,interp=args.interp,max_gap=max_gap)
 
 #ant30log = "ant30-2degrpsn-20240927161948.log"
 #powerlog = "power-2024092716.log"
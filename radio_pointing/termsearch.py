@@ -0,0 +1,258 @@
+#!python3
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import pointingmodel
+
+"""
+器差モデルの項の自動選択（全探索）モジュール。
+
+SEARCH_MODELS の器差モデルの器差パラメーター（計画行列の列 = dAZ, dEL の基底関数の組）を集めて重複を除いたものを候補の項とし、
+max_terms 個までの全ての組み合わせを k-fold 交差検証の RMS と AIC, BIC で評価する。
+
+候補の項全体の計画行列を1回だけ作り、全データ・各 fold の学習データ・テストデータの正規方程式の行列 (A^T A, A^T y, y^T y) を
+先に計算しておく。各組み合わせは その行・列を取り出した 項の数 × 項の数 の小さな行列を解くだけなので（データ点数によらない）、
+同じ項の数の組み合わせをまとめて解き、CHUNK_SIZE 個ずつプロセスプールで並列に計算する。
+"""
+
+# 候補の項を集める器差モデル
+SEARCH_MODELS = ('60cm_model_2', 'optical_model')
+
+# 交差検証の分割数、組み合わせる項の数の上限
+FOLDS = 5
+MAX_TERMS = 8
+
+# 1回の計算でまとめて評価する組み合わせの数（メモリ使用量の上限）
+CHUNK_SIZE = 20000
+
+
+def _format_expression(coef, param):
+    """
+    基底関数の係数（BASIS の順）から "P0 sin(AZ-EL) - P0 cos(EL)" のような式を作る（係数は ±1）。
+    """
+    expr = ''
+    for basis, value in zip(pointingmodel.BASIS, coef):
+        if value == 0:
+            continue
+        term = param if basis == '1' else f"{param} {basis}"
+        expr += (' - ' if value < 0 else ' + ') + term
+
+    return expr[3:] if expr.startswith(' + ') else expr.strip()
+
+
+def candidate_terms(models=SEARCH_MODELS):
+    """
+    models の器差パラメーターを、BASIS の順の dAZ, dEL の係数 (S_az, S_el) にして重複（符号違いを含む）を除いたリストを返す。
+    各項は {'S_az', 'S_el', 'sources'（元のモデルのパラメーター名のリスト）, 'label'} の辞書。
+    """
+    n_basis = len(pointingmodel.BASIS)
+    ret = []
+    for name in models:
+        model = pointingmodel.MODELS[name]
+        for k, param in enumerate(model['params']):
+            S_az = np.zeros(n_basis)
+            S_el = np.zeros(n_basis)
+            S_az[model['columns']] = model['S_az'][:, k]
+            S_el[model['columns']] = model['S_el'][:, k]
+            v = np.concatenate((S_az, S_el))
+            if not v.any():
+                continue
+            # 最初の0でない係数が正になるように符号をそろえる
+            if v[np.flatnonzero(v)[0]] < 0:
+                S_az, S_el, v = -S_az, -S_el, -v
+
+            for term in ret:
+                if np.array_equal(np.concatenate((term['S_az'], term['S_el'])), v):
+                    term['sources'].append(f"{name}:{param}")
+                    break
+            else:
+                ret.append({'S_az': S_az, 'S_el': S_el, 'sources': [f"{name}:{param}"],
+                            'label': f"dAZ: {_format_expression(S_az, 'P') or '0'} / dEL: {_format_expression(S_el, 'P') or '0'}"})
+
+    return ret
+
+
+def term_design(terms, AZ, EL):
+    """
+    候補の項全体の計画行列 (D_az, D_el)（点数 × 項の数）を返す（基底関数の値は pointingmodel.features のキャッシュを使う）。
+    """
+    T = pointingmodel.features(AZ, EL)['T']
+    S_az = np.column_stack([term['S_az'] for term in terms])
+    S_el = np.column_stack([term['S_el'] for term in terms])
+
+    return T @ S_az, T @ S_el
+
+
+def prepare(A, y, w=None, n_folds=FOLDS, seed=None):
+    """
+    計画行列 A、観測値 y、重み w（pointingfit.linear_system の戻り値。dAZ の行, dEL の行 の順）から、
+    全データと各 fold の正規方程式の行列をまとめた辞書を返す。
+    offset の行（dAZ の行 i と dEL の行 n + i の組）単位で n_folds 個に分ける。
+    フィッティングは重み付き、RMS は重みなし（rp_instrument.py の afterRMS と同じ）で計算する。
+    """
+    A = np.asarray(A, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    w = np.ones(y.size) if w is None else np.broadcast_to(np.asarray(w, dtype=np.float64), y.shape)
+    n = y.size // 2
+    n_folds = min(n_folds, n)
+
+    rng = np.random.default_rng(seed)
+    fold = rng.permutation(n) % n_folds
+    fold = np.concatenate((fold, fold))
+
+    Aw = A * w[:, None]
+    yw = y * w
+
+    ret = {}
+    # 全データ（重み付き: フィッティング・AIC・BIC 用、重みなし: RMS 用）
+    ret['G'] = Aw.T @ Aw
+    ret['h'] = Aw.T @ yw
+    ret['yy'] = float(yw @ yw)
+    ret['G_u'] = A.T @ A
+    ret['h_u'] = A.T @ y
+    ret['yy_u'] = float(y @ y)
+    ret['n_rows'] = y.size
+    ret['n'] = n
+    # 各 fold の学習データ（重み付き）とテストデータ（重みなし）
+    train = [fold != f for f in range(n_folds)]
+    ret['G_train'] = np.array([Aw[m].T @ Aw[m] for m in train])
+    ret['h_train'] = np.array([Aw[m].T @ yw[m] for m in train])
+    ret['G_test'] = np.array([A[~m].T @ A[~m] for m in train])
+    ret['h_test'] = np.array([A[~m].T @ y[~m] for m in train])
+    ret['yy_test'] = np.array([y[~m] @ y[~m] for m in train])
+
+    return ret
+
+
+def _solve(G, h):
+    """
+    組み合わせ数 × k × k の正規方程式 G x = h を固有値分解でまとめて解き、解（最小ノルム解）とランクを返す。
+    """
+    e, V = np.linalg.eigh(G)
+    tol = e.max(axis=1, keepdims=True) * G.shape[1] * np.finfo(np.float64).eps
+    inv = np.where(e > tol, 1 / np.where(e > tol, e, 1), 0.0)
+    x = np.einsum('mij,mj,mkj,mk->mi', V, inv, V, h)
+
+    return x, (e > tol).sum(axis=1)
+
+
+def _sse(x, G, h, yy):
+    """
+    残差の二乗和 y^T y - 2 x^T h + x^T G x（組み合わせごと）。
+    """
+    return np.maximum(yy - 2 * np.einsum('mi,mi->m', x, h) + np.einsum('mi,mij,mj->m', x, G, x), 0.0)
+
+
+def _evaluate_chunk(args):
+    """
+    同じ項の数の組み合わせ（組み合わせ数 × k の項の番号）をまとめて評価する（ProcessPoolExecutor 用）。
+    """
+    stats, subsets = args
+    k = subsets.shape[1]
+    rows, cols = subsets[:, :, None], subsets[:, None, :]
+
+    # 全データ
+    x, rank = _solve(stats['G'][rows, cols], stats['h'][subsets])
+    sse_w = _sse(x, stats['G'][rows, cols], stats['h'][subsets], stats['yy'])
+    sse_u = _sse(x, stats['G_u'][rows, cols], stats['h_u'][subsets], stats['yy_u'])
+
+    # 交差検証（各 fold の学習データで解き、テストデータの残差の二乗和を足す）
+    sse_cv = np.zeros(subsets.shape[0])
+    for f in range(stats['G_train'].shape[0]):
+        x_f, _ = _solve(stats['G_train'][f][rows, cols], stats['h_train'][f][subsets])
+        sse_cv += _sse(x_f, stats['G_test'][f][rows, cols], stats['h_test'][f][subsets], stats['yy_test'][f])
+
+    n_rows = stats['n_rows']
+    with np.errstate(divide='ignore'):
+        log_likelihood = n_rows * np.log(sse_w / n_rows)
+
+    ret = {}
+    ret['rank'] = rank
+    ret['rms'] = np.sqrt(sse_u / stats['n']) * 3600
+    ret['cv_rms'] = np.sqrt(sse_cv / stats['n']) * 3600
+    ret['aic'] = log_likelihood + 2 * k
+    ret['bic'] = log_likelihood + k * np.log(n_rows)
+
+    return ret
+
+
+def _tasks(stats, n_terms, max_terms, min_terms=1):
+    """
+    min_terms 個から max_terms 個までの全ての組み合わせを CHUNK_SIZE 個ずつに分けた (stats, 組み合わせ) を順に返す。
+    """
+    for k in range(min_terms, max_terms + 1):
+        combinations = itertools.combinations(range(n_terms), k)
+        while True:
+            chunk = list(itertools.islice(combinations, CHUNK_SIZE))
+            if not chunk:
+                break
+            yield stats, np.array(chunk, dtype=np.intp)
+
+
+def search(A, y, w=None, max_terms=MAX_TERMS, n_folds=FOLDS, seed=None, workers=1):
+    """
+    候補の項全体の計画行列 A から、max_terms 個までの全ての項の組み合わせを評価し、以下の辞書を返す。
+    subsets      : 項の番号のタプルのリスト
+    n_terms      : 項の数
+    rank         : 計画行列のランク（項の数より小さい組み合わせは項が独立でない）
+    rms, cv_rms  : 全データのフィッティングの RMS と k-fold 交差検証の RMS [arcsec]
+    aic, bic     : 重み付き残差の二乗和から求めた AIC, BIC
+    workers が1でない場合はプロセスプールで並列に計算する（None の場合は CPU 数）。
+    """
+    stats = prepare(A, y, w, n_folds, seed)
+    n_terms = np.asarray(A).shape[1]
+    max_terms = min(max_terms, n_terms)
+
+    tasks = list(_tasks(stats, n_terms, max_terms))
+    if workers == 1 or len(tasks) == 1:
+        chunks = list(map(_evaluate_chunk, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_evaluate_chunk, tasks))
+    subsets = [subset for _, subset in tasks]
+
+    ret = {}
+    ret['subsets'] = [tuple(s) for chunk in subsets for s in chunk.tolist()]
+    ret['n_terms'] = np.concatenate([np.full(chunk.shape[0], chunk.shape[1]) for chunk in subsets])
+    for key in ('rank', 'rms', 'cv_rms', 'aic', 'bic'):
+        ret[key] = np.concatenate([chunk[key] for chunk in chunks])
+
+    return ret
+
+
+def pareto(result):
+    """
+    項の数と交差検証の RMS のパレート最適な組み合わせ（項が独立なもの）の番号を、項の数の順に返す。
+    """
+    valid = result['rank'] == result['n_terms']
+    order = np.lexsort((result['cv_rms'], result['n_terms']))
+
+    ret = []
+    best = np.inf
+    for i in order[valid[order]]:
+        if result['cv_rms'][i] < best:
+            best = result['cv_rms'][i]
+            ret.append(int(i))
+
+    return ret
+
+
+def declaration(terms, subset, title='selected model'):
+    """
+    項の組み合わせ subset を、pointingmodel.MODEL_DEFS の宣言（パラメーター名は P0, P1, ...）にして返す。
+    """
+    params = [f"P{i}" for i in range(len(subset))]
+    S_az = np.column_stack([terms[j]['S_az'] for j in subset])
+    S_el = np.column_stack([terms[j]['S_el'] for j in subset])
+
+    ret = {}
+    ret['title'] = title
+    ret['params'] = params
+    ret['dAZ'] = ' + '.join(filter(None, (_format_expression(S_az[:, i], p) for i, p in enumerate(params)))).replace('+ -', '-')
+    ret['dEL'] = ' + '.join(filter(None, (_format_expression(S_el[:, i], p) for i, p in enumerate(params)))).replace('+ -', '-')
+    ret['conf_width'] = max(4, -(-len(params) // len(pointingmodel.CONF_KEYS)))
+
+    return ret
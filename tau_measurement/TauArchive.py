@@ -0,0 +1,201 @@
+#!python3
+
+import contextlib
+import numpy as np
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# ant30ログ・パワーメーターログの共通読み込みモジュール (../common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import batchmode
+import interval
+import logarchive
+import logindex
+
+import TauCalculator
+import skydipfit
+import tatm
+import taustore
+
+"""
+実行例　python3 TauArchive.py ログのディレクトリ --T_atm 270 -o tau_history.csv
+
+ディレクトリ以下（またはグロブに一致する）ant30-tau*.log と power-*.log を集め、時間範囲が重なるもの同士を自動で対応付ける。
+各スカイディップのログを TauCalculator と同じ方法で並列に読み込み、全スカイディップの直線フィッティングを skydipfit でまとめて解いて、
+tau_0, T_rx, T_sys などを1つの表 (CSV) に保存する。
+"""
+
+# 出力する表の列
+COLUMNS = ('time', 'ant30log', 'powerlog', 'tau_0', 'T_rx', 'T_sys', 'T_atm', 'a', 'b', 'V_R', 'residual_rms', 'residual_max', 'n_points')
+
+
+def load_session(ant30log, powerlogs, use_cache=True):
+    """
+    1つのスカイディップ（ant30ログと、時間範囲が重なるパワーメーターログ）を読み込み、
+    TauCalculator.measure_skydip の secZ, 各ON点の平均出力, V_R と時刻を辞書で返す（フィッティングはまとめて行う）。
+    time は TauCalculator.skydip_time（ON点の観測時間の中央の時刻）の文字列、skydip_time はその datetime64（T_atm を求める時刻）。
+    """
+    log_index = logindex.load_ant30log(ant30log, use_cache)
+    power_data = interval.load_powerlogs(powerlogs, use_cache)
+
+    skydip = TauCalculator.measure_skydip(log_index, power_data)
+
+    ret = {}
+    ret['skydip_time'] = TauCalculator.skydip_time(skydip)
+    ret['time'] = str(ret['skydip_time'].astype('datetime64[ms]'))
+    ret['ant30log'] = ant30log
+    ret['powerlog'] = ';'.join(powerlogs)
+    ret['secZ'] = skydip['secZ']
+    ret['power'] = skydip['power']
+    ret['V_R'] = skydip['V_R']
+    ret['Lo1'] = log_index['Lo1']
+
+    return ret
+
+
+def _load(args):
+    """
+    ProcessPoolExecutor 用。読み込めなかったスカイディップは例外を投げずに (ant30ログ, None, エラー) を返す。
+    """
+    ant30log, powerlogs, use_cache = args
+    try:
+        return ant30log, load_session(ant30log, powerlogs, use_cache), None
+    except (ValueError, TypeError, IndexError, KeyError, OSError) as e:
+        return ant30log, None, f"{type(e).__name__}: {e}"
+
+
+def fit_sessions(sessions, T_atm, freq=None):
+    """
+    load_session の結果のリストを skydipfit.fit_skydips で一度にフィッティングし、表の行の辞書のリストを返す。
+    T_atm=None の場合は、各スカイディップの時刻と観測周波数 freq [GHz]（省略した場合は各 ant30ログの Lo1）の
+    T_atm を am/MERRA2 の大気モデルの表（tatm.py）から求める（時刻は TauCalculator.main と同じ skydip_time）。
+    residual_rms, residual_max は ln[(V_R - V(Z)) / V_R] の直線フィットからの残差の RMS と最大値（絶対値）。
+    n_points はフィッティングに使った（V < V_R の）ON点の数。
+    """
+    if not sessions:
+        return []
+
+    if T_atm is None:
+        freqs = [s['Lo1'] if freq is None else freq for s in sessions]
+        if None in freqs:
+            raise ValueError("Observation frequency is unknown (no Lo1 in some ant30 logs); specify it with --freq")
+        T_atm = [tatm.lookup(s['skydip_time'], f) for s, f in zip(sessions, freqs)]
+        if tatm.method() != 'am':
+            print("Warning: am is not installed. T_atm is the h2o-weighted mean layer temperature of the MERRA2 models "
+                  "and does not depend on frequency")
+    T_atm = np.broadcast_to(np.asarray(T_atm, dtype=np.float64), (len(sessions),))
+
+    fit = skydipfit.fit_skydips([s['secZ'] for s in sessions], [s['power'] for s in sessions],
+                                [s['V_R'] for s in sessions], T_atm)
+    residual = np.abs(np.where(fit['valid'], fit['residual'], 0.0))
+    n = np.maximum(fit['n'], 1)
+    residual_rms = np.sqrt((residual ** 2).sum(axis=1) / n)
+    residual_max = residual.max(axis=1)
+
+    rows = []
+    for i, session in enumerate(sessions):
+        row = {key: session[key] for key in ('time', 'ant30log', 'powerlog', 'V_R')}
+        row['tau_0'] = float(fit['tau_0'][i])
+        row['T_rx'] = float(fit['T_rx'][i])
+        row['T_sys'] = float(fit['T_sys'][i])
+        row['T_atm'] = float(T_atm[i])
+        row['a'] = float(fit['a'][i])
+        row['b'] = float(fit['b'][i])
+        row['residual_rms'] = float(residual_rms[i])
+        row['residual_max'] = float(residual_max[i])
+        row['n_points'] = int(fit['n'][i])
+        rows.append(row)
+
+    return rows
+
+
+def write_table(filename, rows):
+    """
+    解析結果の行を時刻順に並べて CSV に保存する。
+    """
+    rows = sorted(rows, key=lambda row: row['time'])
+    with open(filename, 'w') as f:
+        f.write(','.join(COLUMNS) + '\n')
+        for row in rows:
+            values = []
+            for key in COLUMNS:
+                value = row[key]
+                values.append(f'{value:.6f}' if isinstance(value, (float, np.floating)) else str(value))
+            f.write(','.join(values) + '\n')
+    print(f"Result saved to {filename} ({len(rows)} sessions)")
+
+
+def main(paths, T_atm=None, output='tau_history.csv', workers=None, use_cache=True,
+         ant30_pattern='ant30-tau*.log', power_pattern='power-*.log', freq=None, store=None):
+    """
+    paths 以下の ant30ログとパワーメーターログを対応付け、全スカイディップを workers 個のプロセスで解析して
+    output に保存する。workers=1 の場合はプロセスを使わずに順に解析する。
+    T_atm=None の場合は各スカイディップの T_atm を am/MERRA2 の大気モデルの表から求める（fit_sessions）。
+    store に保存ファイル名を指定した場合、結果を taustore で追記する（同じログの結果は追加しない）。
+    解析結果の行のリストと、失敗した (ant30ログ, エラー) のリストを返す。
+    """
+    ant30logs = logarchive.find_logs(paths, ant30_pattern)
+    powerlogs = logarchive.find_logs(paths, power_pattern)
+    print(f"Found {len(ant30logs)} ant30 logs and {len(powerlogs)} power-meter logs")
+
+    pairs = logarchive.pair_logs(ant30logs, powerlogs)
+    tasks = [(ant30log, matched, use_cache) for ant30log, matched in pairs]
+
+    # ログの読み込みと区間平均はプロセスごとに並列に行う
+    if workers == 1:
+        results = map(_load, tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_load, tasks, chunksize=max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1))))
+
+    sessions = []
+    failed = []
+    try:
+        for ant30log, session, error in results:
+            if session is None:
+                print(f"Failed {ant30log} ({error})")
+                failed.append((ant30log, error))
+            else:
+                sessions.append(session)
+    finally:
+        if workers != 1:
+            executor.shutdown()
+
+    # フィッティングは全スカイディップをまとめて1回で行う
+    rows = fit_sessions(sessions, T_atm, freq)
+    for row in rows:
+        print(f"{row['time']}  tau_0 = {row['tau_0']:.3f}, T_rx = {row['T_rx']:.3f} K, T_sys = {row['T_sys']:.3f} K  ({row['ant30log']})")
+
+    write_table(output, rows)
+    if store is not None:
+        with contextlib.closing(taustore.open_store(store)) as conn:
+            added = taustore.append(conn, rows)
+        print(f"{added} results added to {store}")
+    if failed:
+        print(f"{len(failed)} sessions failed")
+
+    return rows, failed
+
+
+# ターミナルからコマンドを打ち込んで実行
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', help='directories (searched recursively) or globs of ant30 and powermeter logs', nargs='+')
+    parser.add_argument('--T_atm', help='atmospheric temperature [K] for all sessions', type=float, default=None)
+    parser.add_argument('--auto-T_atm', help='take T_atm of each session from the am/MERRA2 atmosphere table', action='store_true')
+    parser.add_argument('--freq', help='observation frequency [GHz] for --auto-T_atm (default: Lo1 in each ant30 log)', type=float, default=None)
+    parser.add_argument('-o', '--output', help='output table (CSV)', default='tau_history.csv')
+    parser.add_argument('-j', '--workers', help='number of processes (default: number of CPUs)', type=int, default=None)
+    parser.add_argument('--ant30-pattern', help='file name pattern of ant30 logs', default='ant30-tau*.log')
+    parser.add_argument('--power-pattern', help='file name pattern of powermeter logs', default='power-*.log')
+    parser.add_argument('--store', help='append the results to this tau store (SQLite file, see taustore.py)', default=None)
+    parser.add_argument('--no-cache', help='do not use/create parsed log cache (.logcache/)', action='store_true')
+    batchmode.add_arguments(parser)
+
+    args = batchmode.parse_args(parser)
+    if args.T_atm is None and not args.auto_T_atm:
+        parser.error("--T_atm or --auto-T_atm is required (on the command line or in --config)")
+    main(args.paths, args.T_atm, output=args.output, workers=args.workers, use_cache=not args.no_cache,
+         ant30_pattern=args.ant30_pattern, power_pattern=args.power_pattern, freq=args.freq, store=args.store)
@@ -1,13 +1,27 @@
 #!python3
 
 import numpy as np
-import datetime
-import re
-import datetime
+import contextlib
+import os
+import sys
+import time
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
+# ant30ログ・パワーメーターログの共通読み込みモジュール (../common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import batchmode
+import logindex
+import logtail
+import logtime
+import interval
+
+import skydipboot
+import skydipfit
+import tatm
+import taustore
+
 """
 2024/11/28
 出力プロットのファイル名をant30ログ名+pngとした。
@@ -15,214 +29,318 @@ from mpl_toolkits.axes_grid1 import make_axes_locatable
 """
 
 
-def extract_el_ON_from_ant30(ant30log):
+def extract_el_ON_from_ant30(log_index):
     """
-    ant30logを読み込み、各ON点ごとのELを数値としてリストに保存。
+    ant30ログの索引から、各ON点ごとのELを数値としてリストに保存。
     """
-    on_el_list = []
-
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
+    on_windows = logindex.get_windows(log_index, 'on')
+    on_el_list = on_windows['el'][on_windows['count'] >= 0].tolist()
 
-    for line in log_lines:
+    return on_el_list
 
-        if '# On-Point  Integ end' in line:
-            count_match = re.search(r'On-Count:(\d+)', line)
 
-            if count_match:
-                el_match = re.search(r'\(AZ,EL\) = \([\d\.\-]+, ([\d\.\-]+)\)', line)
 
-                if el_match:
-                    el_value = float(el_match.group(1))
-                    on_el_list.append(el_value)
+def extract_R_time_from_ant30(log_index, RSkyTime):
+    """
+    ant30ログの索引からR終了時刻R_end_timeを取得。
+    RSkyTimeから、R_end_timeをもとにR_start_timeを計算する。
+    """
+    R_start_time, R_end_time = logindex.get_integ_time(log_index, 'r', RSkyTime)
 
-    return on_el_list
+    return R_end_time[-1], R_start_time[-1]
 
 
 
-def extract_OnOfftime_from_ant30(ant30log):
+def extract_ON_time_from_ant30(log_index, OnOffTime):
     """
-    各ON点ごとの観測開始時間を観測終了時間から逆算して求めるため、ant30ログからOnOffTimeを読み取る。
+    ant30ログの索引からON終了時刻on_end_timeを取得し、datetime64の配列に保存。
+    OnOffTimeから、on_end_timeをもとにon_start_timeを計算して、datetime64の配列に保存。
     """
-    OnOffTime = None
+    on_start_time, on_end_time = logindex.get_integ_time(log_index, 'on', OnOffTime)
+
+    return on_end_time, on_start_time
 
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
 
-    for line in log_lines:
-            OnOffTime_match = re.search(r'OnOffTime\s+(\d+)', line)
 
-            if OnOffTime_match:
-                OnOffTime = OnOffTime_match.group(1)
-                
-    return OnOffTime    
+def calculate_average_power_ON(power_data, on_start_time, on_end_time):
+    """
+    各ON点ごとの観測開始(on_start_time)から終了(on_end_time)までの範囲のパワーメーター出力値の平均値を
+    全ON点まとめて計算してリストに保存。範囲内に値が無いON点は None とする。
+    """ 
+    stats = interval.interval_stats(power_data['time'], power_data['power'], on_start_time, on_end_time)
+    average_ONpower_list = [mean if count > 0 else None for mean, count in zip(stats['mean'].tolist(), stats['count'].tolist())]
+
+    return average_ONpower_list
 
 
 
-def extract_RSkyTime_from_ant30(ant30log):
+def calculate_average_power_R(power_data, R_start_time, R_end_time):
     """
-    R終了時間から逆算して求めるため、ant30ログからRskyTimeを読み取る。
+    R観測の時刻範囲でパワーメーター出力値の平均値V_Rを戻り値として得る。
     """
-    RSkyTime = None
+    stats = interval.interval_stats(power_data['time'], power_data['power'], [R_start_time], [R_end_time])
 
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
-
-    for line in log_lines:
-            RSkyTime_match = re.search(r'RSkyTime\s+(\d+)', line)
-
-            if RSkyTime_match:
-                RSkyTime = int(RSkyTime_match.group(1))
-                
-    return RSkyTime    
+    # 指定された範囲内にパワー値があれば平均を計算し、そうでなければNoneを返す
+    if stats['count'][0] > 0:
+        V_R = stats['mean'][0]
+        return V_R
+    else:
+        print(f"No power values found within the range {R_start_time} to {R_end_time}")
+        return None
 
 
 
-def extract_R_time_from_ant30(ant30log, RSkyTime):
+def fit_skydip(secZ, power, V_R, power_err=None):
     """
-    ant30logからR終了時刻R_end_timeをdatetimeに変換。
-    RSkyTimeから、R_end_timeをもとにR_start_timeを計算する。
+    y = ln[ (V_R - V(Z)) / V_R ] を secZ に対して最小二乗法で線形フィッティングし、y, 傾き a, 切片 b を返す。
+    V(Z) >= V_R などで y が計算できない点は nan とし、フィッティングから除く。
+    power_err（各点の平均出力の誤差）を指定した場合は、y の誤差 power_err / (V_R - V(Z)) で重み付けする。
     """
+    y = skydipfit.skydip_y(power, V_R)[0]
+    sigma = None if power_err is None else np.abs(np.asarray(power_err) / (V_R - np.asarray(power)))
+    fit = skydipfit.fit_lines(secZ, y, sigma)
 
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
+    n_invalid = int(np.size(y) - fit['n'][0])
+    if n_invalid:
+        print(f"{n_invalid} points excluded from the fit (V >= V_R or missing power)")
 
-    for line in log_lines:
+    return y, fit['a'][0], fit['b'][0]
 
-        if '# R-Sky     Integ end' in line:                
-                time_match = re.search(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})', line)
 
-                if time_match:
-                    R_time_str = time_match.group(1)
-                    R_end_time = datetime.datetime.strptime(R_time_str, "%Y/%m/%d-%H:%M:%S.%f")
-                    R_start_time = R_end_time - datetime.timedelta(seconds=int(RSkyTime))  
 
-    return R_end_time, R_start_time
+def calculate_temperature(a, b, T_atm):
+    """
+    フィッティングの傾き a, 切片 b と大気の温度 T_atm から T_rx, T_sys を計算する。
+    """
+    T_rx =  (np.exp(-b) - 1) * T_atm 
+    T_sys = (np.exp( -(a+b)) - 1) * T_atm
 
+    return T_rx, T_sys
 
 
-def extract_ON_time_from_ant30(ant30log, OnOffTime):
+def measure_skydip(log_index, power_data):
     """
-    ant30logからON終了時刻on_end_timeをdatetimeに変換し、リストに保存。
-    OnOffTimeから、on_end_timeをもとにon_start_timeを計算して、リストに保存。
+    ant30ログの索引とパワーメーターログの配列から、各ON点の積分時刻、EL, secZ, 平均出力と V_R を求めて辞書で返す。
     """
-    #RSkyTime = extract_RSkyTime_from_ant30(ant30log)
-    on_end_time_list = []
-    on_start_time_list = []
-
-    with open(ant30log, 'r', encoding='utf-8') as file:
-        log_lines = file.readlines()
+    ret = {}
 
-    for line in log_lines:
+    # 各ON点ごとのパワーメーター出力の平均値を計算
+    OnOffTime = log_index['OnOffTime']
+    on_end_time, on_start_time = extract_ON_time_from_ant30(log_index, OnOffTime)
+    average_ONpower = calculate_average_power_ON(power_data, on_start_time, on_end_time)
+    average_ONpower = np.array(average_ONpower, dtype=np.float64)
 
-        if '# On-Point  Integ end' in line:          
-                time_match = re.search(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})', line)
+    # 各ON点観測時のELをNumPy配列に変換
+    on_el = np.array(extract_el_ON_from_ant30(log_index))
 
-                if time_match:
-                    on_time_str = time_match.group(1)
-                    on_end_time = datetime.datetime.strptime(on_time_str, "%Y/%m/%d-%H:%M:%S.%f")
-                    on_end_time_list.append(on_end_time)
+    secZ = 1 / np.cos(np.radians(90 - on_el))
 
-                    on_start_time = on_end_time - datetime.timedelta(seconds=int(OnOffTime))  
-                    on_start_time_list.append(on_start_time)
+    # R時のパワーメーター出力の平均値を計算
+    RSkyTime = log_index['RSkyTime']
+    R_end_time, R_start_time = extract_R_time_from_ant30(log_index, RSkyTime)
+    V_R = calculate_average_power_R(power_data, R_start_time, R_end_time)
+    V_R = float(V_R)
 
-    return on_end_time_list, on_start_time_list
+    ret['on_start_time'] = on_start_time
+    ret['on_end_time'] = on_end_time
+    ret['on_el'] = on_el
+    ret['secZ'] = secZ
+    ret['power'] = average_ONpower
+    ret['R_start_time'] = R_start_time
+    ret['R_end_time'] = R_end_time
+    ret['V_R'] = V_R
 
+    return ret
 
 
-def calculate_average_power_ON(powerlog, on_start_time, on_end_time):
+def measure_continuous_skydip(log_index, power_data, bins=50, el_range=None):
     """
-    各ON点ごとの観測開始(on_start_time)から終了(on_end_time)までの範囲のパワーメーター出力値を
-    カウントごとに取得し、平均値を計算してリストに保存。
-    """ 
-    # パワーログのフォーマット（仮定） [yyyy/mm/dd-hh:mm:ss.ms] data
-    powerlog_contents = re.compile(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})\]\s+([\d\.]+)')
-    
-    average_ONpower_list = []
+    ELを連続的に動かすスカイディップ用。ant30ログの追尾行 (trk.cpp-817) の実測ELを、
+    パワーメーターの各サンプルの時刻に線形補間して secZ を求める（R の積分区間と、追尾行の範囲外のサンプルは使わない）。
+    el_range=(ELの下限, 上限) [deg] を指定した場合はその範囲のサンプルだけを使う。
+    bins > 0 の場合は secZ を等間隔の bins 個のビンに分けて、ビンごとの平均 EL, secZ, 出力と出力の平均の誤差 power_err を返す。
+    bins = 0 の場合は全サンプルをそのまま返す。V_R は measure_skydip と同じく最後の R の積分区間の平均。
+    """
+    ret = {}
 
-    with open(powerlog, 'r') as file:
-        lines = file.readlines()
+    track = log_index['track']
+    if len(track) < 2:
+        raise ValueError("No antenna tracking lines (trk.cpp-817) in the ant30 log for the continuous mode")
+    track_time = track['time'].astype(np.int64)
+    order = np.argsort(track_time, kind='stable')
+    track_time = track_time[order]
+    track_el = track['el'][order]
 
-    for count in range(len(on_start_time)):
-        start_time = on_start_time[count]  
-        end_time = on_end_time[count]      
+    # R時のパワーメーター出力の平均値を計算
+    RSkyTime = log_index['RSkyTime']
+    R_end_time, R_start_time = extract_R_time_from_ant30(log_index, RSkyTime)
+    V_R = calculate_average_power_R(power_data, R_start_time, R_end_time)
+    V_R = float(V_R)
 
-        # 指定されたカウントの範囲に含まれるパワー値を取得
-        power_values = []
-        for line in lines:
-            match = powerlog_contents.match(line)
-            if match:
-                timestamp_str = match.group(1)  # [yyyy/mm/dd-hh:mm:ss.ms] タイムスタンプ部分を抽出
-                powerlog_time = datetime.datetime.strptime(timestamp_str, '%Y/%m/%d-%H:%M:%S.%f')  # タイムスタンプをdatetimeに変換
-                power_value = float(match.group(2))  # パワー値を数値として取得
+    # 追尾行の範囲内で、R の積分区間以外のサンプルを使う
+    time = power_data['time']
+    use = (track_time[0] <= time) & (time <= track_time[-1])
+    R_start, R_end = logindex.get_integ_time(log_index, 'r', RSkyTime)
+    for start, end in zip(interval.to_ns(R_start).tolist(), interval.to_ns(R_end).tolist()):
+        use &= (time < start) | (end < time)
+
+    # 精度を保つため、最初の追尾行からの経過秒で補間する
+    t0 = track_time[0]
+    el = np.interp((time[use] - t0) / 1e9, (track_time - t0) / 1e9, track_el)
+    power = power_data['power'][use]
+    if el_range is not None:
+        in_range = (min(el_range) <= el) & (el <= max(el_range))
+        el, power = el[in_range], power[in_range]
+    if el.size == 0:
+        raise ValueError("No power-meter samples during the elevation sweep")
+
+    secZ = 1 / np.cos(np.radians(90 - el))
+
+    if bins > 0:
+        edges = np.linspace(secZ.min(), secZ.max(), bins + 1)
+        index = np.clip(np.searchsorted(edges, secZ, side='right') - 1, 0, bins - 1)
+        count = np.bincount(index, minlength=bins)
+        filled = count > 0
+        n = count[filled]
+
+        def bin_mean(value):
+            return np.bincount(index, weights=value, minlength=bins)[filled] / n
+
+        # 桁落ちを抑えるため、ビンの平均を引いてから分散を計算する
+        power_mean = bin_mean(power)
+        power_mean_full = np.zeros(bins)
+        power_mean_full[filled] = power_mean
+        power_var = bin_mean((power - power_mean_full[index]) ** 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            power_err = np.where(n > 1, np.sqrt(power_var / (n - 1)), np.nan)
+
+        ret['on_el'] = bin_mean(el)
+        ret['secZ'] = bin_mean(secZ)
+        ret['power'] = power_mean
+        ret['power_err'] = power_err
+        ret['n_samples'] = n
+    else:
+        ret['on_el'] = el
+        ret['secZ'] = secZ
+        ret['power'] = power
+        ret['n_samples'] = np.ones(el.size, dtype=np.int64)
 
-                if start_time <= powerlog_time <= end_time:
-                    power_values.append(power_value)
+    ret['R_start_time'] = R_start_time
+    ret['R_end_time'] = R_end_time
+    ret['V_R'] = V_R
 
-        if power_values:
-            average_ONpower = np.mean(power_values)
-        else:
-            average_ONpower = None 
+    return ret
 
-        average_ONpower_list.append(average_ONpower)
 
-    return average_ONpower_list
+def calculate_skydip(log_index, power_data, continuous=False, bins=50, el_range=None):
+    """
+    measure_skydip（continuous=True の場合は measure_continuous_skydip）の結果に、
+    ln[ (V_R - V(Z)) / V_R ] vs secZ を線形フィッティングした y, a, b を加えて返す。
+    """
+    if continuous:
+        ret = measure_continuous_skydip(log_index, power_data, bins, el_range)
+        print(f"Continuous skydip: {int(ret['n_samples'].sum())} samples, {len(ret['secZ'])} points")
+    else:
+        ret = measure_skydip(log_index, power_data)
+    ret['y'], ret['a'], ret['b'] = fit_skydip(ret['secZ'], ret['power'], ret['V_R'], ret.get('power_err'))
 
+    return ret
 
 
-def calculate_average_power_R(powerlog, R_start_time, R_end_time):
+def skydip_time(skydip):
     """
-    R観測の時刻範囲でパワーメーター出力値の平均値V_Rを戻り値として得る。
+    スカイディップの代表時刻 (datetime64[ns])。最初のON点の積分開始から最後のON点の積分終了までの中央の時刻
+    （ELを連続的に動かす場合は R の積分終了時刻）。
+    結果の時刻と、T_atm を大気モデルから求める時刻（TauCalculator.main, TauArchive.fit_sessions）の両方にこれを使う。
     """
-    # パワーメーターログのフォーマット [yyyy/mm/dd-hh:mm:ss.ms] data
-    powerlog_format = re.compile(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})\]\s+([\d\.]+)')
-
-    power_values = []
+    if 'on_start_time' not in skydip or len(skydip['on_start_time']) == 0:
+        return np.datetime64(skydip['R_end_time'], 'ns')
 
-    with open(powerlog, 'r') as file:
-        lines = file.readlines()
-
-        for line in lines:
-            line = line.strip()
+    on_start = skydip['on_start_time'].astype(np.int64)
+    on_end = skydip['on_end_time'].astype(np.int64)
 
-            match = powerlog_format.match(line)
-            if match:
-                timestamp_str = match.group(1)  # [yyyy/mm/dd-hh:mm:ss.ms]
-                powerlog_time = datetime.datetime.strptime(timestamp_str, '%Y/%m/%d-%H:%M:%S.%f')
-                power_value = float(match.group(2)) 
+    return np.datetime64(int((on_start.min() + on_end.max()) // 2), 'ns')
 
-                if R_start_time <= powerlog_time <= R_end_time:
-                    power_values.append(power_value)
-                    #print(f"Added power value: {power_value} at {powerlog_time}")
 
-    # 指定された範囲内にパワー値があれば平均を計算し、そうでなければNoneを返す
-    if power_values:
-        V_R = np.mean(power_values)
-        return V_R
+def lookup_T_atm(log_index, time, freq=None, use_cache=True):
+    """
+    観測日時 time と観測周波数 freq [GHz]（省略した場合は ant30ログの Lo1）の T_atm を、
+    am/MERRA2 の大気モデルから作った表（tatm.py）で補間して返す。
+    am が無い場合は周波数によらない値（各層の温度の平均）になるので、そのことを表示する。
+    """
+    if freq is None:
+        freq = log_index['Lo1']
+    if freq is None:
+        raise ValueError("Observation frequency is unknown (no Lo1 in the ant30 log); specify it with --freq")
+
+    T_atm = tatm.lookup(time, freq, use_cache)
+    if tatm.method() == 'am':
+        print(f"T_atm = {T_atm:.3f} K from the am/MERRA2 table ({freq:.3f} GHz, {np.datetime64(time, 's')})")
     else:
-        print(f"No power values found within the range {R_start_time} to {R_end_time}")
-        return None
+        print(f"Warning: am is not installed. T_atm = {T_atm:.3f} K is the h2o-weighted mean layer temperature "
+              f"of the MERRA2 models ({np.datetime64(time, 's')}) and does not depend on frequency ({freq:.3f} GHz is not used)")
 
+    return T_atm
 
-def main(ant30log, powerlog):
+
+def calculate_uncertainty(skydip, power_data, T_atm, n_boot=0, jackknife=False, raw=False, workers=1, seed=None, ci=0.68):
+    """
+    calculate_skydip の結果について、tau_0, T_rx, T_sys の誤差と信頼区間を求めて表示し、辞書で返す。
+    n_boot > 0 の場合はON点のブートストラップ（raw=True の場合はON点の代わりに積分区間内の生データを選び直す）、
+    jackknife=True の場合はジャックナイフを行う。workers はブートストラップのプロセス数。
+    """
+    a, b = skydip['a'], skydip['b']
+    T_rx, T_sys = calculate_temperature(a, b, T_atm)
+    estimate = {'tau_0': -a, 'T_rx': T_rx, 'T_sys': T_sys}
+    secZ, power, V_R = skydip['secZ'], skydip['power'], skydip['V_R']
+
+    ret = {}
+    if n_boot > 0:
+        raw_samples = None
+        if raw and 'on_start_time' not in skydip:
+            print("--raw is ignored for the continuous mode")
+        elif raw:
+            on_samples, on_count = skydipboot.window_samples(power_data, skydip['on_start_time'], skydip['on_end_time'])
+            R_samples, R_count = skydipboot.window_samples(power_data, [skydip['R_start_time']], [skydip['R_end_time']])
+            raw_samples = (on_samples, on_count, R_samples, R_count)
+        samples = skydipboot.bootstrap(secZ, power, V_R, T_atm, n_boot, seed=seed, raw=raw_samples, workers=workers)
+        ret['bootstrap'] = skydipboot.summarize(estimate, samples, 'bootstrap', ci)
+    if jackknife:
+        samples = skydipboot.jackknife(secZ, power, V_R, T_atm)
+        ret['jackknife'] = skydipboot.summarize(estimate, samples, 'jackknife', ci)
+
+    for method, summary in ret.items():
+        print(f"{method} ({100 * ci:.0f}% interval):")
+        for key, value in summary.items():
+            unit = '' if key == 'tau_0' else ' K'
+            print(f"  {key} = {value['estimate']:.3f} +- {value['err']:.3f}{unit}  [{value['low']:.3f}, {value['high']:.3f}]")
+
+    return ret
+
+
+def main(ant30log, powerlog, use_cache=True, T_atm=None, n_boot=0, jackknife=False, raw=False, workers=1, seed=None, ci=0.68,
+         continuous=False, bins=50, el_range=None, auto_T_atm=False, freq=None, store=None):
     """
 　　 縦軸にln[ (V(R) - V(Z)) / V(R) ]、横軸にsecZ をとり最小二乗法で線形フィッティング
-　　 傾きから光学的厚み：τ0、切片からTsys, Trxを求める。ただしT_atmはキーボード入力する
+　　 傾きから光学的厚み：τ0、切片からTsys, Trxを求める。T_atmを指定しない場合はキーボード入力する
+     （auto_T_atm=True の場合は、skydip_time の時刻と観測周波数 freq から lookup_T_atm で求める）
+     use_cache=True の場合、読み込んだログを .logcache/ にキャッシュし、次回から再利用する
+     バッチ実行 (--batch) の場合、結果を ant30ログ名_result.json に保存する
+     n_boot > 0 または jackknife=True の場合、calculate_uncertainty で誤差と信頼区間も求める
+     continuous=True の場合、ELを連続的に動かしたスカイディップとして measure_continuous_skydip で解析する
+     store に保存ファイル名を指定した場合、結果を taustore で追記する
     """
 
-    # 各ON点ごとのパワーメーター出力の平均値を計算しリストに保存
-    OnOffTime = extract_OnOfftime_from_ant30(ant30log)
-    on_end_time, on_start_time = extract_ON_time_from_ant30(ant30log, OnOffTime)
-    average_ONpower= calculate_average_power_ON(powerlog, on_start_time, on_end_time)
-    average_ONpower = np.array(average_ONpower)
+    # ant30ログを1回だけ読み込み、ヘッダーパラメーターと積分区間の索引を作成
+    log_index = logindex.load_ant30log(ant30log, use_cache)
 
-    # 各ON点観測時のELをリストをNumPy配列に変換
-    on_el = extract_el_ON_from_ant30(ant30log)
-    on_el = np.array(on_el)
+    # パワーメーターログを1回だけ読み込み、時刻順の配列にする
+    power_data = interval.load_powerlog(powerlog, use_cache)
 
-    secZ = 1 / np.cos(np.radians(90 - on_el)) 
+    skydip = calculate_skydip(log_index, power_data, continuous, bins, el_range)
+    secZ, y, a, b, V_R = skydip['secZ'], skydip['y'], skydip['a'], skydip['b'], skydip['V_R']
 
-    output_data = np.column_stack((on_el, secZ, average_ONpower))
+    output_data = np.column_stack((skydip['on_el'], secZ, skydip['power']))
     
     output_filename = ant30log.replace('.log', '.txt')
     with open(output_filename, 'w') as f:
@@ -232,23 +350,11 @@ def main(ant30log, powerlog):
                 f.write(f'{row[0]:.6f},{row[1]:.6f},{row[2]:.6f}\n') 
             except ValueError as e:
               print(f"Error converting row {row}: {e}")
-            
-    secZ = output_data[:, 1]
-    power = output_data[:, 2]
-
-    # R時のパワーメーター出力の平均値を計算
-    RSkyTime = extract_RSkyTime_from_ant30(ant30log)
-    R_end_time, R_start_time = extract_R_time_from_ant30(ant30log, RSkyTime)
-    V_R = calculate_average_power_R(powerlog, R_start_time, R_end_time)
-    V_R = float(V_R)
-   
-    y = np.log( (V_R - power) / V_R ) 
-        
-    a, b = np.polyfit(secZ, y, 1)
 
-    T_atm = float(input("大気の温度 T_atm [K] を入力: "))
-    T_rx =  (np.exp(-b) - 1) * T_atm 
-    T_sys = (np.exp( -(a+b)) - 1) * T_atm
+    if T_atm is None and auto_T_atm:
+        T_atm = lookup_T_atm(log_index, skydip_time(skydip), freq, use_cache)
+    T_atm = batchmode.ask(T_atm, "大気の温度 T_atm [K] を入力: ")
+    T_rx, T_sys = calculate_temperature(a, b, T_atm)
 
     # 符号を条件付きで表示
     b_sign = "+" if b >= 0 else "-"
@@ -261,6 +367,10 @@ def main(ant30log, powerlog):
     print(f'T_rx = {T_rx:.3f} K')
     print(f'T_sys = {T_sys:.3f} K')
 
+    uncertainty = {}
+    if n_boot > 0 or jackknife:
+        uncertainty = calculate_uncertainty(skydip, power_data, T_atm, n_boot, jackknife, raw, workers, seed, ci)
+
     # τをconfに書き込む
     #modify_tau_value('../etc/ant30_phaseC0.conf',a)
 
@@ -282,7 +392,174 @@ def main(ant30log, powerlog):
     plt.grid(True)
     plt.tight_layout()
     plt.savefig(ant30log.replace('.log', '.png'))
-    plt.show()
+    batchmode.show()
+
+    ret = {
+        'time': str(skydip_time(skydip)),
+        'ant30log': ant30log,
+        'powerlog': powerlog,
+        'a': a,
+        'b': b,
+        'tau_0': -a,
+        'T_atm': T_atm,
+        'T_rx': T_rx,
+        'T_sys': T_sys,
+        'V_R': V_R,
+        'n_points': len(secZ),
+        'residual_rms': float(np.sqrt(np.nanmean((y - (a * secZ + b)) ** 2))),
+    }
+    ret.update(uncertainty)
+    if store is not None:
+        with contextlib.closing(taustore.open_store(store)) as conn:
+            added = taustore.append(conn, [ret])
+        print(f"{'Added to' if added else 'Already in'} {store}")
+    if batchmode.BATCH:
+        batchmode.write_json(ant30log.replace('.log', '_result.json'), ret)
+
+    return ret
+
+
+def read_powerlines(lines):
+    """
+    パワーメーターログの行のリストから time [ns] (int64), power (float64) の配列を返す（追従読み込み用）。
+    """
+    rows = [line.split() for line in lines]
+    rows = [row for row in rows if len(row) >= 2 and row[0].startswith('[')]
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    time_ns = logtime.stamps_to_ns([row[0] for row in rows], offset=1)
+    power = np.array([float(row[1]) for row in rows])
+
+    return time_ns, power
+
+
+def follow_ant30lines(state, lines):
+    """
+    追従読み込みした ant30ログの行から、ヘッダーパラメーターと R, ON の積分終了行を state に追加する。
+    積分区間の開始時刻は、main と同様に終了時刻から RSkyTime, OnOffTime だけ遡った時刻とする。
+    """
+    header = state['header']
+    for line in lines:
+        if '# ' in line and 'Integ end' in line:
+            match = logindex.event_format.search(line)
+            if not match:
+                continue
+            kind = logindex.EVENT_KINDS[match.group(2)]
+            duration = header['RSkyTime'] if kind == 'r' else header['OnOffTime']
+            if kind == 'off' or duration is None or (kind == 'on' and not match.group(4)):
+                continue
+            end_ns = int(logtime.stamps_to_ns([match.group(1)])[0])
+            el = float(match.group(6)) if match.group(6) else np.nan
+            state['pending'].append((kind, end_ns - int(duration) * 1_000_000_000, end_ns, el))
+        elif 'SetNumber' in line or 'OnOffTime' in line or 'RSkyTime' in line:
+            match = logindex.header_format.search(line)
+            if match:
+                header[match.group(1)] = int(match.group(2))
+
+
+def follow_powerlines(state, lines):
+    """
+    追従読み込みしたパワーメーターログの行を、state の time [ns], power の配列の後ろに追加する。
+    """
+    time_ns, power = read_powerlines(lines)
+    if time_ns.size:
+        state['power_time'] = np.concatenate((state['power_time'], time_ns))
+        state['power'] = np.concatenate((state['power'], power))
+
+
+def update_follow_fit(state, T_atm, final=False):
+    """
+    パワーメーターログが終了時刻まで書き込まれた積分区間だけ平均出力を計算し（final=True の場合は残り全て）、
+    ON点が増えたら ln[(V_R - V)/V_R] vs secZ を再フィッティングして tau_0, T_rx, T_sys を表示する。
+    """
+    time_ns = state['power_time']
+    updated = False
+    while state['pending'] and time_ns.size and (final or time_ns[-1] >= state['pending'][0][2]):
+        kind, start_ns, end_ns, el = state['pending'].pop(0)
+        i0 = np.searchsorted(time_ns, start_ns, side='left')
+        i1 = np.searchsorted(time_ns, end_ns, side='right')
+        stats = interval.interval_stats(time_ns[i0:i1], state['power'][i0:i1], [start_ns], [end_ns])
+        if stats['count'][0] == 0:
+            print(f"No power values found within the range {logtime.ns_to_datetime64(start_ns)} to {logtime.ns_to_datetime64(end_ns)}")
+            continue
+        if kind == 'r':
+            state['V_R'] = float(stats['mean'][0])
+            print(f"V_R = {state['V_R']:.3f}")
+        else:
+            state['on_el'].append(el)
+            state['on_power'].append(float(stats['mean'][0]))
+            updated = True
+
+    n = len(state['on_el'])
+    if not updated or state['V_R'] is None:
+        return
+    secZ = 1 / np.cos(np.radians(90 - np.array(state['on_el'])))
+    if n < 2:
+        print(f"[{n}] EL = {state['on_el'][-1]:.3f}, secZ = {secZ[-1]:.3f}, power = {state['on_power'][-1]:.3f}")
+        return
+
+    y, a, b = fit_skydip(secZ, np.array(state['on_power']), state['V_R'])
+    T_rx, T_sys = calculate_temperature(a, b, T_atm)
+    delta = '' if state['tau_0'] is None else f" (d tau_0 = {-a - state['tau_0']:+.4f})"
+    print(f"[{n}] EL = {state['on_el'][-1]:.3f}, secZ = {secZ[-1]:.3f}: "
+          f"tau_0 = {-a:.3f}{delta}, T_rx = {T_rx:.3f} K, T_sys = {T_sys:.3f} K")
+    state['tau_0'] = -a
+
+
+def follow(ant30log, powerlog, T_atm, poll=0.5, timeout=None):
+    """
+    観測中の ant30ログとパワーメーターログを追従して読み込む（ライブモード）。
+    '# On-Point  Integ end' の行が現れ、パワーメーターログがそのON点の終了時刻まで書き込まれるたびに、
+    そのON点の平均出力だけを計算して追加し、再フィッティングした tau_0, T_rx, T_sys を表示する。
+    timeout [sec] の間どちらのログにも追記が無ければ終了する（None の場合は Ctrl-C まで続ける）。
+    終了時に main と同じ形式で EL, secZ, power をテキストファイルに保存する。
+    """
+    ant30_tail = logtail.open_tail(ant30log)
+    power_tail = logtail.open_tail(powerlog)
+
+    state = {
+        'header': {key: None for key in logindex.HEADER_KEYS},
+        'pending': [],  # 終了行は出たがパワーがまだ揃っていない積分区間 (kind, start [ns], end [ns], el)
+        'power_time': np.zeros(0, dtype=np.int64),
+        'power': np.zeros(0, dtype=np.float64),
+        'V_R': None,
+        'on_el': [],
+        'on_power': [],
+        'tau_0': None,
+    }
+
+    print(f"Following {ant30log} and {powerlog} (Ctrl-C to stop)")
+    last_update = time.monotonic()
+    try:
+        while True:
+            ant30_lines = logtail.read_lines(ant30_tail)
+            power_lines = logtail.read_lines(power_tail)
+            if ant30_lines or power_lines:
+                last_update = time.monotonic()
+            elif timeout is not None and time.monotonic() - last_update > timeout:
+                print(f"No new log lines for {timeout} s, stopping.")
+                break
+
+            follow_ant30lines(state, ant30_lines)
+            follow_powerlines(state, power_lines)
+            update_follow_fit(state, T_atm)
+
+            time.sleep(poll)
+    except KeyboardInterrupt:
+        print("Stopped.")
+
+    # パワーメーターログが終了時刻まで届かなかった区間も、ある分だけで計算する
+    update_follow_fit(state, T_atm, final=True)
+
+    secZ = 1 / np.cos(np.radians(90 - np.array(state['on_el'])))
+    output_filename = ant30log.replace('.log', '.txt')
+    with open(output_filename, 'w') as f:
+        f.write('EL,secZ,power\n')
+        for row in zip(state['on_el'], secZ, state['on_power']):
+            f.write(f'{row[0]:.6f},{row[1]:.6f},{row[2]:.6f}\n')
+
+    return state
 
 
 def modify_tau_value(filename, TAU):
@@ -316,9 +593,38 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('ant30log', help='ant30 logfile name')
     parser.add_argument('powerlog', help='powermeter logfile name')
+    parser.add_argument('--no-cache', help='do not use/create parsed log cache (.logcache/)', action='store_true')
+    parser.add_argument('--follow', help='follow the logs during observation and refit after each ON point', action='store_true')
+    parser.add_argument('--T_atm', help='atmospheric temperature [K] (asked if omitted)', type=float, default=None)
+    parser.add_argument('--auto-T_atm', help='take T_atm from the am/MERRA2 atmosphere table at the observation date and frequency', action='store_true')
+    parser.add_argument('--freq', help='observation frequency [GHz] for --auto-T_atm (default: Lo1 in the ant30 log)', type=float, default=None)
+    parser.add_argument('--store', help='append the result to this tau store (SQLite file, see taustore.py)', default=None)
+    parser.add_argument('--poll', help='polling interval [sec] for --follow', type=float, default=0.5)
+    parser.add_argument('--timeout', help='stop --follow after this many seconds without new log lines', type=float, default=None)
+    parser.add_argument('--continuous', help='continuous elevation sweep: EL of each power sample is interpolated from trk.cpp-817 lines', action='store_true')
+    parser.add_argument('--bins', help='number of secZ bins for --continuous (0: fit every sample)', type=int, default=50)
+    parser.add_argument('--el-range', help='EL range [deg] used for --continuous', type=float, nargs=2, default=None)
+    parser.add_argument('--bootstrap', help='number of bootstrap resamples for the uncertainty of tau_0, T_rx, T_sys', type=int, default=0)
+    parser.add_argument('--jackknife', help='jackknife uncertainty of tau_0, T_rx, T_sys', action='store_true')
+    parser.add_argument('--raw', help='--bootstrap resamples the raw power samples in each integration window instead of the ON points', action='store_true')
+    parser.add_argument('--ci', help='confidence level of the intervals', type=float, default=0.68)
+    parser.add_argument('--seed', help='random seed for --bootstrap', type=int, default=None)
+    parser.add_argument('-j', '--workers', help='number of processes for --bootstrap (0: number of CPUs)', type=int, default=1)
+    batchmode.add_arguments(parser)
     
-    args = parser.parse_args()
-    main(args.ant30log,args.powerlog)
+    args = batchmode.parse_args(parser)
+    if args.follow:
+        T_atm = args.T_atm
+        if T_atm is None and args.auto_T_atm:
+            # 観測開始時のヘッダーと最初の時刻を使う
+            start, _ = logtime.file_time_range(args.ant30log)
+            T_atm = lookup_T_atm(logindex.parse_ant30log(args.ant30log), logtime.ns_to_datetime64(start), args.freq)
+        T_atm = batchmode.ask(T_atm, "大気の温度 T_atm [K] を入力: ")
+        follow(args.ant30log,args.powerlog,T_atm,poll=args.poll,timeout=args.timeout)
+    else:
+        main(args.ant30log,args.powerlog,use_cache=not args.no_cache,T_atm=args.T_atm,
+             n_boot=args.bootstrap,jackknife=args.jackknife,raw=args.raw,workers=args.workers or None,seed=args.seed,ci=args.ci,
+             continuous=args.continuous,bins=args.bins,el_range=args.el_range,auto_T_atm=args.auto_T_atm,freq=args.freq,store=args.store)
 
 #ant30log = 'ant30-tau1-202409025.log'
 #powerlog = 'power-202409025.log'
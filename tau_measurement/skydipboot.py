@@ -0,0 +1,155 @@
+#!python3
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.special import erfinv
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import interval
+
+import skydipfit
+
+"""
+tau_0, T_rx, T_sys の誤差（ブートストラップ・ジャックナイフ）を求めるモジュール。
+
+ブートストラップでは、ON点（secZ, 平均出力の組）を重複を許して選び直したデータセットを n_boot 個作り、
+skydipfit.fit_skydips で全データセットを一度にフィッティングする。raw=True の場合は、ON点は選び直さずに、各ON点・R の
+積分区間内のパワーメーターの生データを選び直して平均出力と V_R を計算し直す（ON点の平均出力のばらつきには生データの雑音が
+含まれているので、両方を選び直すと雑音を2重に数えてしまう）。
+ジャックナイフでは、ON点を1つずつ除いた n 個のデータセットを同様にまとめてフィッティングする。
+"""
+
+# 結果を求める量
+QUANTITIES = ('tau_0', 'T_rx', 'T_sys')
+
+# ブートストラップを1回の fit_skydips でまとめて計算する個数（メモリ使用量の上限）
+CHUNK_SIZE = 1000
+
+
+def window_samples(power_data, start, end):
+    """
+    各積分区間 [start, end] に入るパワーメーターの生データを、区間数 × 最大点数 の配列（足りない部分は nan）にして、
+    点数の配列と一緒に返す。
+    """
+    time = power_data['time']
+    i_start = np.searchsorted(time, interval.to_ns(start), side='left')
+    i_end = np.searchsorted(time, interval.to_ns(end), side='right')
+    count = np.maximum(i_end - i_start, 0)
+
+    j = np.arange(count.max() if count.size else 0)
+    inside = j[None, :] < count[:, None]
+    index = np.where(inside, i_start[:, None] + j[None, :], 0)
+    samples = np.where(inside, power_data['power'][index] if time.size else np.nan, np.nan)
+
+    return samples, count
+
+
+def _resample_means(rng, samples, count, n_boot):
+    """
+    各区間の生データを重複を許して選び直した平均を、n_boot × 区間数 の配列で返す（点数 0 の区間は nan）。
+    """
+    pick = np.floor(rng.random((n_boot,) + samples.shape) * count[None, :, None]).astype(np.int64)
+    resampled = np.take_along_axis(np.broadcast_to(samples, (n_boot,) + samples.shape), pick, axis=2)
+    inside = np.arange(samples.shape[1])[None, None, :] < count[None, :, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(inside, resampled, 0.0).sum(axis=2) / count[None, :]
+
+
+def _bootstrap_chunk(args):
+    """
+    n_boot 個分のブートストラップを1回の fit_skydips で計算する（ProcessPoolExecutor 用）。
+    """
+    secZ, power, V_R, T_atm, n_boot, seed, raw = args
+    rng = np.random.default_rng(seed)
+
+    if raw is None:
+        # ON点の選び直し
+        pick = rng.integers(0, secZ.size, (n_boot, secZ.size))
+        fit = skydipfit.fit_skydips(secZ[pick], power[pick], np.full(n_boot, V_R), T_atm)
+    else:
+        # 積分区間内の生データの選び直し（ON点はそのまま）
+        on_samples, on_count, R_samples, R_count = raw
+        power_b = _resample_means(rng, on_samples, on_count, n_boot)
+        V_R_b = _resample_means(rng, R_samples, R_count, n_boot)[:, 0]
+        fit = skydipfit.fit_skydips(np.broadcast_to(secZ, power_b.shape), power_b, V_R_b, T_atm)
+
+    return {key: fit[key] for key in QUANTITIES}
+
+
+def bootstrap(secZ, power, V_R, T_atm, n_boot=1000, seed=None, raw=None, workers=1):
+    """
+    ブートストラップした tau_0, T_rx, T_sys の分布（長さ n_boot の配列）を辞書で返す。
+    raw に (ON区間の生データ, 点数, R区間の生データ, 点数)（window_samples の結果）を渡すと、ON点の代わりに生データを選び直す。
+    CHUNK_SIZE 個ずつまとめて計算し、workers が1でない場合はプロセスプールで並列に計算する（None の場合は CPU 数）。
+    乱数列はまとめる単位ごとに seed から分岐させるので、同じ seed なら workers によらず同じ結果になる。
+    フィッティングできなかった（有効な点が2未満の）データセットは nan になる。
+    """
+    secZ = np.asarray(secZ, dtype=np.float64)
+    power = np.asarray(power, dtype=np.float64)
+
+    # CHUNK_SIZE 個ずつに分け、分けた単位ごとに seed から乱数列を分岐させる
+    sizes = [min(CHUNK_SIZE, n_boot - i) for i in range(0, n_boot, CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(secZ, power, V_R, T_atm, size, s, raw) for size, s in zip(sizes, seeds)]
+
+    if workers == 1 or len(tasks) == 1:
+        chunks = list(map(_bootstrap_chunk, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_bootstrap_chunk, tasks))
+
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in QUANTITIES}
+
+
+def jackknife(secZ, power, V_R, T_atm):
+    """
+    ON点を1つずつ除いてフィッティングした tau_0, T_rx, T_sys（長さ ON点数 の配列）を辞書で返す。
+    """
+    secZ = np.asarray(secZ, dtype=np.float64)
+    power = np.asarray(power, dtype=np.float64)
+    n = secZ.size
+
+    # i 行目は i 番目のON点を除いたデータセット
+    leave_out = ~np.eye(n, dtype=bool)
+    y = skydipfit.skydip_y(power, V_R)
+    fit = skydipfit.fit_lines(np.broadcast_to(secZ, (n, n)), np.broadcast_to(y, (n, n)), valid=leave_out)
+
+    a, b = fit['a'], fit['b']
+    T_atm = np.asarray(T_atm, dtype=np.float64)
+    ret = {}
+    ret['tau_0'] = -a
+    ret['T_rx'] = (np.exp(-b) - 1) * T_atm
+    ret['T_sys'] = (np.exp(-(a + b)) - 1) * T_atm
+
+    return ret
+
+
+def summarize(estimate, samples, method='bootstrap', ci=0.68):
+    """
+    点推定値 estimate と分布 samples の辞書から、量ごとに誤差 err と信頼区間 (low, high) の辞書を返す。
+    bootstrap: err は標準偏差、信頼区間はパーセンタイル区間。
+    jackknife: err は sqrt((n-1)/n Σ(θ_i - θ̄)^2)、信頼区間は estimate ± z err（正規近似）。
+    """
+    ret = {}
+    for key in QUANTITIES:
+        values = np.asarray(samples[key], dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if values.size < 2:
+            ret[key] = {'estimate': float(estimate[key]), 'err': np.nan, 'low': np.nan, 'high': np.nan, 'n': int(values.size)}
+            continue
+
+        if method == 'jackknife':
+            n = values.size
+            err = float(np.sqrt((n - 1) / n * np.sum((values - values.mean()) ** 2)))
+            z = float(np.sqrt(2) * erfinv(ci))
+            low, high = estimate[key] - z * err, estimate[key] + z * err
+        else:
+            err = float(values.std(ddof=1))
+            low, high = np.percentile(values, [50 * (1 - ci), 50 * (1 + ci)])
+
+        ret[key] = {'estimate': float(estimate[key]), 'err': err, 'low': float(low), 'high': float(high), 'n': int(values.size)}
+
+    return ret
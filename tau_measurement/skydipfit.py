@@ -0,0 +1,147 @@
+#!python3
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import ragged
+
+"""
+スカイディップの直線フィッティングをまとめて行うモジュール。
+
+y = ln[ (V_R - V(Z)) / V_R ] = a secZ + b の最小二乗フィッティングを、np.polyfit を1回ずつ呼ぶかわりに、
+多数のスカイディップ（行数 × 点数 の配列、点数が違う場合は NaN で埋める）について和の公式で一度に解く。
+V(Z) >= V_R のように y が計算できない点や NaN の点はフィッティングから除く。
+"""
+
+
+def _as_batch(x):
+    """
+    1次元配列（1つのスカイディップ）、2次元配列、長さの違う配列のリストを 行数 × 点数 の2次元配列にする。
+    """
+    if isinstance(x, (list, tuple)) and len(x) and np.ndim(x[0]) == 1 and len({np.size(a) for a in x}) > 1:
+        return ragged.pad(x)
+
+    return np.atleast_2d(np.asarray(x, dtype=np.float64))
+
+
+def fit_lines(x, y, sigma=None, valid=None):
+    """
+    各行ごとに y = a x + b を最小二乗フィッティングし、全行分をまとめて辞書で返す。
+    x, y は 行数 × 点数 の配列（または長さの違う配列のリスト）。x, y が有限でない点と valid=False の点は使わない。
+    sigma（y の誤差）を指定した場合は 1/sigma^2 で重み付けし、共分散はその誤差から計算する。
+    指定しない場合は各行の残差から誤差を見積もる（np.polyfit(..., cov='unscaled') に残差の分散を掛けたもの）。
+
+    a, b           : 傾き・切片（行ごと、点数が2未満の行は nan）
+    cov            : 行数 × 2 × 2 の (a, b) の共分散行列（点数が3未満の行で sigma 無しの場合は nan）
+    chi2, chi2_red : カイ二乗と自由度 (n - 2) で割った値
+    n              : 使った点数
+    valid          : 使った点の配列
+    """
+    x = _as_batch(x)
+    y = _as_batch(y)
+    x, y = np.broadcast_arrays(x, y)
+
+    ok = np.isfinite(x) & np.isfinite(y)
+    if valid is not None:
+        ok &= np.broadcast_to(np.asarray(valid, dtype=bool), ok.shape)
+    if sigma is None:
+        w = ok.astype(np.float64)
+    else:
+        sigma = np.broadcast_to(np.asarray(sigma, dtype=np.float64), ok.shape)
+        ok &= np.isfinite(sigma) & (sigma > 0)
+        with np.errstate(divide='ignore'):
+            w = np.where(ok, 1.0 / np.where(ok, sigma, 1.0) ** 2, 0.0)
+    x0 = np.where(ok, x, 0.0)
+    y0 = np.where(ok, y, 0.0)
+
+    n = ok.sum(axis=1)
+    S = w.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # 桁落ちを抑えるため、行ごとの重み付き平均を引いてから和をとる
+        x_mean = (w * x0).sum(axis=1) / S
+        y_mean = (w * y0).sum(axis=1) / S
+        dx = np.where(ok, x0 - x_mean[:, None], 0.0)
+        dy = np.where(ok, y0 - y_mean[:, None], 0.0)
+        Sxx = (w * dx * dx).sum(axis=1)
+        Sxy = (w * dx * dy).sum(axis=1)
+
+        a = Sxy / Sxx
+        b = y_mean - a * x_mean
+
+        residual = np.where(ok, y0 - (a[:, None] * x0 + b[:, None]), np.nan)
+        chi2 = (w * np.where(ok, residual, 0.0) ** 2).sum(axis=1)
+        dof = n - 2
+        chi2_red = np.where(dof > 0, chi2 / np.maximum(dof, 1), np.nan)
+
+        # 中心化した x での (a, b_c) の共分散を、b = b_c - a x_mean で元の切片に戻す
+        var_a = 1.0 / Sxx
+        var_bc = 1.0 / S
+        scale = chi2_red if sigma is None else np.ones_like(chi2_red)
+        cov = np.empty((len(a), 2, 2))
+        cov[:, 0, 0] = var_a * scale
+        cov[:, 0, 1] = cov[:, 1, 0] = -x_mean * var_a * scale
+        cov[:, 1, 1] = (var_bc + x_mean ** 2 * var_a) * scale
+
+    bad = n < 2
+    a[bad] = np.nan
+    b[bad] = np.nan
+    cov[bad] = np.nan
+
+    ret = {}
+    ret['a'] = a
+    ret['b'] = b
+    ret['cov'] = cov
+    ret['chi2'] = chi2
+    ret['chi2_red'] = chi2_red
+    ret['n'] = n
+    ret['residual'] = residual
+    ret['valid'] = ok
+
+    return ret
+
+
+def skydip_y(power, V_R):
+    """
+    y = ln[ (V_R - V(Z)) / V_R ] を計算する。V(Z) >= V_R, V_R <= 0 などで計算できない点は nan とする。
+    power は 行数 × 点数、V_R は行ごとの値（スカラーまたは行数の配列）。
+    """
+    power = _as_batch(power)
+    V_R = np.asarray(V_R, dtype=np.float64).reshape(-1, 1)
+    ratio = (V_R - power) / V_R
+    ok = np.isfinite(ratio) & (ratio > 0) & (V_R > 0)
+
+    return np.where(ok, np.log(np.where(ok, ratio, 1.0)), np.nan)
+
+
+def fit_skydips(secZ, power, V_R, T_atm, sigma=None):
+    """
+    多数のスカイディップの ln[ (V_R - V(Z)) / V_R ] vs secZ をまとめてフィッティングし、
+    fit_lines の結果に y と tau_0, T_rx, T_sys（およびその誤差 tau_0_err, T_rx_err, T_sys_err）を加えて返す。
+    secZ, power は 行数 × 点数 の配列（または長さの違う配列のリスト）、V_R, T_atm は行ごとの値またはスカラー。
+    sigma は y の誤差（省略した場合は残差から見積もる）。
+    """
+    y = skydip_y(power, V_R)
+    ret = fit_lines(secZ, y, sigma)
+
+    a, b, cov = ret['a'], ret['b'], ret['cov']
+    T_atm = np.broadcast_to(np.asarray(T_atm, dtype=np.float64), a.shape)
+
+    # T_rx = (e^{-b} - 1) T_atm, T_sys = (e^{-(a+b)} - 1) T_atm（誤差は1次の誤差伝播）
+    e_b = np.exp(-b)
+    e_ab = np.exp(-(a + b))
+    with np.errstate(invalid='ignore'):
+        var_ab = cov[:, 0, 0] + 2 * cov[:, 0, 1] + cov[:, 1, 1]
+        ret['tau_0_err'] = np.sqrt(cov[:, 0, 0])
+        ret['T_rx_err'] = T_atm * e_b * np.sqrt(cov[:, 1, 1])
+        ret['T_sys_err'] = T_atm * e_ab * np.sqrt(var_ab)
+
+    ret['y'] = y
+    ret['tau_0'] = -a
+    ret['T_rx'] = (e_b - 1) * T_atm
+    ret['T_sys'] = (e_ab - 1) * T_atm
+
+    return ret
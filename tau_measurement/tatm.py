@@ -0,0 +1,174 @@
+#!python3
+
+import functools
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import logcache
+
+"""
+大気の温度 T_atm の自動決定モジュール。
+
+../am/amc_file の MERRA2 から作った季節ごとの大気モデル (Dome_Fuji_MERRA2*.amc) から、
+周波数ごとの実効的な大気の温度 T_atm（大気の放射の輝度温度 / (1 - 透過率)）の表を作り、
+観測日時の季節と観測周波数で補間して返す。表は amc ファイルと同じフォルダの .logcache/ にキャッシュする。
+
+am (https://lweb.cfa.harvard.edu/~spaine/am/) がインストールされていれば am で天頂方向の tx, Tb を計算する。
+無い場合は、各層の温度を水蒸気の光学的厚み（水蒸気の柱密度 × 気圧に比例とする）で重み付けした平均を
+全周波数共通の値として使う。
+"""
+
+AMC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'am', 'amc_file')
+
+# 季節ごとの amc ファイルと、元にした MERRA2 データの期間（月）
+SEASONS = {
+    'summer': ('Dome_Fuji_MERRA2.amc', (11, 12, 1, 2)),
+    'winter': ('Dome_Fuji_MERRA2_winter.amc', (7, 8, 9)),
+}
+
+# 表の周波数範囲 [GHz]
+F_MIN = 100.0
+F_MAX = 1000.0
+DF = 1.0
+
+# 表の作り方を変えたら上げる（キャッシュの作り直し用）
+CACHE_VERSION = 1
+
+DAYS_PER_YEAR = 365.25
+
+layer_format = re.compile(r'^(Pbase|Tbase)\s+([\d.eE+-]+)')
+h2o_format = re.compile(r'^column\s+h2o\s+vmr\s+([\d.eE+-]+)')
+
+
+def read_amc_layers(filename):
+    """
+    amc ファイルの各層の Pbase [mbar], Tbase [K], h2o の体積混合比を上の層から順に配列で返す。
+    """
+    P, T, h2o = [], [], []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('layer'):
+                P.append(np.nan)
+                T.append(np.nan)
+                h2o.append(0.0)
+                continue
+            match = layer_format.match(line)
+            if match and P:
+                (P if match.group(1) == 'Pbase' else T)[-1] = float(match.group(2))
+                continue
+            match = h2o_format.match(line)
+            if match and P:
+                h2o[-1] = float(match.group(1))
+
+    return np.array(P), np.array(T), np.array(h2o)
+
+
+def profile_T_atm(filename):
+    """
+    am が無い場合の T_atm。各層（上の層の Pbase から自分の Pbase まで）の平均温度を、
+    水蒸気の光学的厚み（h2o の体積混合比 × 層の気圧差 × 層の平均気圧）で重み付けして平均する。
+    """
+    P, T, h2o = read_amc_layers(filename)
+    P_top = np.concatenate(([0.0], P[:-1]))
+    T_top = np.concatenate(([T[0]], T[:-1]))
+
+    weight = h2o * (P - P_top) * (P + P_top) / 2
+
+    return float(np.sum(weight * (T + T_top) / 2) / np.sum(weight))
+
+
+def run_am(filename, f_min, f_max, df):
+    """
+    am で天頂方向の周波数ごとの透過率 tx と輝度温度 Tb [K] を計算し、f [GHz], T_atm [K] の配列を返す。
+    T_atm = (Tb - T0 tx) / (1 - tx)（T0 は宇宙背景放射の 2.7 K）。
+    """
+    args = ['am', os.path.basename(filename), str(f_min), 'GHz', str(f_max), 'GHz', str(df), 'GHz', '0', 'deg', '1.0']
+    out = subprocess.run(args, cwd=os.path.dirname(os.path.abspath(filename)), capture_output=True, text=True, check=True).stdout
+    data = np.loadtxt(out.splitlines(), ndmin=2)
+    f, tx, Tb = data[:, 0], data[:, 1], data[:, 2]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return f, (Tb - 2.7 * tx) / (1 - tx)
+
+
+def method():
+    """
+    T_atm の表の計算方法を返す（am がインストールされていれば 'am'、無ければ周波数によらない 'profile'）。
+    """
+    return 'am' if shutil.which('am') else 'profile'
+
+
+def build_table(filename, f_min=F_MIN, f_max=F_MAX, df=DF):
+    """
+    1つの amc ファイルの f [GHz], T_atm [K] の表を辞書で返す（logcache.load 用）。
+    """
+    ret = {}
+    if method() == 'am':
+        ret['f'], ret['T_atm'] = run_am(filename, f_min, f_max, df)
+        ret['method'] = 'am'
+    else:
+        ret['f'] = np.array([f_min, f_max])
+        ret['T_atm'] = np.full(2, profile_T_atm(filename))
+        ret['method'] = 'profile'
+
+    return ret
+
+
+def load_table(filename, use_cache=True):
+    """
+    build_table の結果を、キャッシュ（.logcache/）があればそこから読み込む。
+    am の有無で表が変わるので、キャッシュの種類名に計算方法を含める。
+    """
+    kind = f"tatm-{method()}-{F_MIN:g}-{F_MAX:g}-{DF:g}"
+    parser = functools.partial(build_table, f_min=F_MIN, f_max=F_MAX, df=DF)
+
+    return logcache.load(parser, filename, kind, CACHE_VERSION, use_cache)
+
+
+def season_center(months):
+    """
+    月のタプル（例 (11, 12, 1, 2)）の期間の中央の通日（1月1日 = 0、年をまたぐ場合も可）を返す。
+    """
+    start = np.datetime64(f"2001-{months[0]:02d}-01")
+    end_month = np.datetime64(f"2001-{months[-1]:02d}") + np.timedelta64(1, 'M')
+    end = end_month.astype('datetime64[D]')
+    if end <= start:
+        end += np.timedelta64(365, 'D')
+
+    center = (start - np.datetime64('2001-01-01')).astype(float) + (end - start).astype(float) / 2
+
+    return center % DAYS_PER_YEAR
+
+
+def day_of_year(time):
+    """
+    datetime64 (またはその配列、ISO 形式の文字列) の1月1日からの通日（小数）を返す。
+    """
+    time = np.asarray(time, dtype='datetime64[ns]')
+    year = time.astype('datetime64[Y]')
+
+    return (time - year).astype('timedelta64[ns]').astype(np.int64) / 86400e9
+
+
+def lookup(time, freq, use_cache=True):
+    """
+    観測日時 time（datetime64 またはその配列）と観測周波数 freq [GHz] の T_atm [K] を返す。
+    季節ごとの表を周波数で補間し、さらに季節の中央の通日の間を1年周期で線形補間する。
+    """
+    centers = []
+    values = []
+    for name, (amc, months) in SEASONS.items():
+        table = load_table(os.path.join(AMC_DIR, amc), use_cache)
+        centers.append(season_center(months))
+        values.append(float(np.interp(freq, table['f'], table['T_atm'])))
+
+    ret = np.interp(day_of_year(time), centers, values, period=DAYS_PER_YEAR)
+
+    return float(ret) if np.ndim(ret) == 0 else ret
@@ -0,0 +1,183 @@
+#!python3
+
+import datetime
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import interval
+import logcache
+
+"""
+tau の解析結果の保存・検索モジュール。
+
+TauCalculator.py, TauArchive.py のフィッティング結果を SQLite のファイルに追記していき（書き換え・削除はしない）、
+時刻の索引を使って「時刻 t より前で最も近い tau」「ある時間範囲の tau」などをすぐに取り出せるようにする。
+ポインティングやビームの解析で、スカイディップを解析し直さずに大気の補正に使う。
+
+時刻はログと同じくタイムゾーン無しの int64 のエポックナノ秒 [ns] で保存する。
+同じ ant30ログ（内容のハッシュ）の同じ時刻の結果は2回目以降は追加しない。
+"""
+
+# 保存する列（time 以外は None 可）
+COLUMNS = (
+    ('time', 'INTEGER NOT NULL'),
+    ('tau_0', 'REAL'),
+    ('T_rx', 'REAL'),
+    ('T_sys', 'REAL'),
+    ('T_atm', 'REAL'),
+    ('a', 'REAL'),
+    ('b', 'REAL'),
+    ('V_R', 'REAL'),
+    ('residual_rms', 'REAL'),
+    ('n_points', 'INTEGER'),
+    ('ant30log', 'TEXT'),
+    ('powerlog', 'TEXT'),
+    ('ant30_hash', 'TEXT NOT NULL'),
+    ('power_hash', 'TEXT'),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS tau (
+    id INTEGER PRIMARY KEY,
+    {', '.join(f'{name} {decl}' for name, decl in COLUMNS)},
+    added TEXT NOT NULL,
+    UNIQUE (time, ant30_hash)
+);
+CREATE INDEX IF NOT EXISTS tau_time ON tau (time);
+"""
+
+
+def open_store(filename):
+    """
+    tau の保存ファイル（SQLite）を開く。無ければ作る。
+    """
+    conn = sqlite3.connect(filename)
+    conn.executescript(SCHEMA)
+
+    return conn
+
+
+def _to_ns(time):
+    """
+    datetime, datetime64, ISO 形式の文字列, int64 [ns] を int のエポックナノ秒 [ns] に変換する。
+    """
+    if isinstance(time, (int, np.integer)):
+        return int(time)
+
+    return int(interval.to_ns(np.datetime64(time, 'ns')))
+
+
+def _value(value):
+    """
+    NumPy の数値を sqlite3 に渡せる Python の数値にする（nan は None）。
+    """
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+
+    return value
+
+
+def file_hashes(ant30log, powerlogs):
+    """
+    ant30ログとパワーメーターログ（リストまたは ';' 区切り）の内容のハッシュを返す（パワーメーターログは ';' 区切り）。
+    """
+    if isinstance(powerlogs, str):
+        powerlogs = powerlogs.split(';')
+
+    return logcache.file_hash(ant30log), ';'.join(logcache.file_hash(fn) for fn in powerlogs)
+
+
+def append(conn, rows):
+    """
+    解析結果の行（COLUMN_NAMES をキーにした辞書、time は datetime64 など）を追加し、追加した行数を返す。
+    ant30_hash, power_hash が無い行は ant30log, powerlog の内容のハッシュを計算する。
+    """
+    added = datetime.datetime.now().isoformat(timespec='seconds')
+    records = []
+    for row in rows:
+        row = dict(row)
+        if row.get('ant30_hash') is None:
+            row['ant30_hash'], row['power_hash'] = file_hashes(row['ant30log'], row['powerlog'])
+        row['time'] = _to_ns(row['time'])
+        records.append(tuple(_value(row.get(name)) for name in COLUMN_NAMES) + (added,))
+
+    with conn:
+        before = conn.total_changes
+        conn.executemany(f"INSERT OR IGNORE INTO tau ({', '.join(COLUMN_NAMES)}, added) "
+                         f"VALUES ({', '.join('?' * (len(COLUMN_NAMES) + 1))})", records)
+
+    return conn.total_changes - before
+
+
+def _row_dict(row):
+    if row is None:
+        return None
+    ret = dict(zip(COLUMN_NAMES, row))
+    ret['time'] = np.datetime64(ret['time'], 'ns')
+
+    return ret
+
+
+def nearest_before(conn, time):
+    """
+    time 以前で最も新しい結果を辞書で返す（無ければ None）。
+    """
+    row = conn.execute(f"SELECT {', '.join(COLUMN_NAMES)} FROM tau WHERE time <= ? ORDER BY time DESC LIMIT 1",
+                       (_to_ns(time),)).fetchone()
+
+    return _row_dict(row)
+
+
+def nearest(conn, time):
+    """
+    time に最も近い（前後どちらでもよい）結果を辞書で返す（無ければ None）。
+    """
+    t = _to_ns(time)
+    before = conn.execute(f"SELECT {', '.join(COLUMN_NAMES)} FROM tau WHERE time <= ? ORDER BY time DESC LIMIT 1", (t,)).fetchone()
+    after = conn.execute(f"SELECT {', '.join(COLUMN_NAMES)} FROM tau WHERE time > ? ORDER BY time ASC LIMIT 1", (t,)).fetchone()
+    candidates = [row for row in (before, after) if row is not None]
+    if not candidates:
+        return None
+
+    return _row_dict(min(candidates, key=lambda row: abs(row[0] - t)))
+
+
+def query_range(conn, start, end):
+    """
+    start <= time <= end の結果を時刻順に、列ごとの配列の辞書で返す（time は datetime64[ns]、数値の None は nan）。
+    """
+    rows = conn.execute(f"SELECT {', '.join(COLUMN_NAMES)} FROM tau WHERE time BETWEEN ? AND ? ORDER BY time",
+                        (_to_ns(start), _to_ns(end))).fetchall()
+
+    ret = {}
+    columns = list(zip(*rows)) if rows else [()] * len(COLUMN_NAMES)
+    for (name, decl), values in zip(COLUMNS, columns):
+        if name == 'time':
+            ret[name] = np.array(values, dtype=np.int64).astype('datetime64[ns]')
+        elif decl.startswith('REAL'):
+            ret[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        elif decl.startswith('INTEGER'):
+            ret[name] = np.array([-1 if v is None else v for v in values], dtype=np.int64)
+        else:
+            ret[name] = np.array(values, dtype=object)
+
+    return ret
+
+
+def last(conn, hours, now=None):
+    """
+    now（省略した場合は現在時刻、ログと同じくタイムゾーン無しのローカル時刻）から hours 時間前までの結果を
+    query_range と同じ形式で返す。
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    end = _to_ns(now)
+
+    return query_range(conn, end - int(hours * 3600e9), end)
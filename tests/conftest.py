@@ -0,0 +1,15 @@
+#!python3
+
+import os
+import sys
+
+"""
+テスト用の設定。
+
+各プログラムと同じく、共通モジュール (../common) と radio_pointing, tau_measurement のモジュールを sys.path に追加して import する。
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+for folder in ('common', 'radio_pointing', 'tau_measurement'):
+    sys.path.append(os.path.join(ROOT, folder))
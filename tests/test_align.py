@@ -0,0 +1,96 @@
+#!python3
+
+import bisect
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import align
+import interval
+import logindex
+
+"""
+align.resample のまとめた補間を、パワーメーターの時刻ごとに bisect で前後の (Az, El) 行を探すループと比べる
+（サンプルの radio_pointing の ant30ログとパワーメーターログ）。
+"""
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'radio_pointing')
+ANT30LOG = os.path.join(DATA, 'ant30-2degrpsn-20240927161948.log')
+POWERLOG = os.path.join(DATA, 'power-2024092716.log')
+
+COLUMNS = ('az', 'el', 'az_scanoffset', 'el_scanoffset')
+
+
+def sample_logs():
+    """
+    (Az, El) 行の時刻 [ns] と列の辞書、パワーメーターの時刻 [ns] を返す。
+    """
+    azel = logindex.parse_ant30log(ANT30LOG)['azel']
+    power_data = interval.read_powerlog(POWERLOG)
+
+    return azel['time'].astype(np.int64), {key: azel[key] for key in COLUMNS}, power_data['time']
+
+
+def scalar_resample(src_time, values, dst_time, method, max_gap=None):
+    """
+    時刻ごとに1つずつ補間する（範囲外と、前後の間隔が max_gap より長い時刻は nan）。
+    """
+    src = src_time.tolist()
+    ret = {key: [] for key in values}
+    for t in dst_time.tolist():
+        i1 = bisect.bisect_right(src, t)
+        i0 = i1 - 1
+        if i1 >= 1 and src[i0] == t:
+            frac, i1 = 0.0, i0
+        elif i1 == 0 or i1 == len(src) or (max_gap is not None and src[i1] - src[i0] > max_gap):
+            for key in values:
+                ret[key].append(np.nan)
+            continue
+        else:
+            frac = (t - src[i0]) / (src[i1] - src[i0])
+
+        for key, v in values.items():
+            if method == 'previous':
+                ret[key].append(v[i0])
+            elif method == 'nearest':
+                ret[key].append(v[i0] if frac < 0.5 else v[i1])
+            else:
+                ret[key].append(v[i0] + (v[i1] - v[i0]) * frac)
+
+    return {key: np.array(value) for key, value in ret.items()}
+
+
+@pytest.mark.parametrize('method', align.METHODS)
+def test_resample_matches_loop(method):
+    src_time, values, dst_time = sample_logs()
+    aligned = align.resample(src_time, values, dst_time, method=method)
+    expected = scalar_resample(src_time, values, dst_time, method)
+
+    assert aligned['valid'].any()
+    for key in COLUMNS:
+        np.testing.assert_array_equal(np.isnan(aligned[key]), np.isnan(expected[key]))
+        np.testing.assert_allclose(aligned[key], expected[key], rtol=1e-12, atol=1e-12, equal_nan=True)
+        assert not np.isnan(aligned[key][aligned['valid']]).any()
+
+
+def test_linear_matches_np_interp():
+    src_time, values, dst_time = sample_logs()
+    aligned = align.resample(src_time, values, dst_time)
+    valid = aligned['valid']
+
+    # np.interp は float64 で計算するので、エポックナノ秒のままだと桁が足りない。最初の (Az, El) 行からの時刻にして比べる
+    for key in COLUMNS:
+        expected = np.interp((dst_time[valid] - src_time[0]).astype(np.float64), (src_time - src_time[0]).astype(np.float64), values[key])
+        np.testing.assert_allclose(aligned[key][valid], expected, rtol=1e-12, atol=1e-12)
+
+
+def test_max_gap_matches_loop():
+    src_time, values, dst_time = sample_logs()
+    max_gap = int(np.median(np.diff(src_time)) * 1.5)
+
+    aligned = align.resample(src_time, values, dst_time, max_gap=max_gap)
+    expected = scalar_resample(src_time, values, dst_time, 'linear', max_gap)
+    np.testing.assert_array_equal(aligned['valid'], ~np.isnan(expected['az']))
+    np.testing.assert_allclose(aligned['az'], expected['az'], rtol=1e-12, atol=1e-12, equal_nan=True)
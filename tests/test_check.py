@@ -0,0 +1,76 @@
+#!python3
+
+import datetime
+import mmap
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+pytest.importorskip('matplotlib')
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'beam_pattern', 'JAXA'))
+import check
+
+"""
+beam_pattern/JAXA/check.py の get_azel_ant30logdata（メモリマップしたログをチャンクごとに2回走査する読み込み）のテスト。
+"""
+
+
+def write_log(tmp_path, n=40):
+    """
+    trk.cpp-817 の cmd 行と他の行が混ざったログを書き、cmd 行の時刻と値を返す。
+    """
+    t0 = datetime.datetime(2024, 6, 20, 14, 31, 9, 884000)
+    times, values = [], []
+    lines = ['#### ant30 raster scan', 'Lo1     476.000000']
+    for i in range(n):
+        t = t0 + datetime.timedelta(milliseconds=250 * i)
+        stamp = t.strftime('%Y/%m/%d-%H:%M:%S.') + f'{t.microsecond // 1000:03d}'
+        v = (89.3 + 0.01 * i, 1.2 - 0.002 * i, 90.1 + 0.01 * i, 2.05 - 0.002 * i)
+        lines.append(f'[{stamp}-trk.cpp-817] cmd = {v[0]:.6f}, {v[1]:.6f} <--> data = {v[2]:.6f}, {v[3]:.6f}')
+        if i % 3 == 0:
+            lines.append(f'[{stamp}-calcBoth.cpp-510] (Az, El) = ({v[2]:.6f}, {v[3]:.6f}), scan offset = (0.000000, 0.000000)')
+        times.append(t)
+        values.append(v)
+
+    filename = tmp_path / 'ant30-raster.log'
+    filename.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(filename), times, np.array(values)
+
+
+@pytest.mark.parametrize('chunk_size', [check.CHUNK_SIZE, 200, 37, 1])
+def test_reads_every_cmd_line(tmp_path, chunk_size):
+    # チャンクの境界が行の途中に来ても、1行がチャンクより長くても、全ての cmd 行を1回ずつ読む
+    filename, times, values = write_log(tmp_path)
+    data = check.get_azel_ant30logdata(filename, chunk_size=chunk_size)
+
+    np.testing.assert_array_equal(data['date'], np.array(times, dtype='datetime64[ns]'))
+    for k, key in enumerate(('cmd_az', 'cmd_el', 'actual_az', 'actual_el')):
+        np.testing.assert_allclose(data[key], np.round(values[:, k], 6), rtol=0, atol=1e-12)
+    assert data['fn'] == 'ant30-raster'
+
+
+def test_iter_chunks_splits_at_newlines(tmp_path):
+    filename, _, _ = write_log(tmp_path, n=10)
+    with open(filename, 'rb') as f:
+        content = f.read()
+    with open(filename, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            chunks = list(check.iter_chunks(mm, 64))
+
+    assert b''.join(chunks) == content
+    assert all(chunk.endswith(b'\n') for chunk in chunks)
+
+
+def test_log_without_cmd_lines(tmp_path):
+    filename = tmp_path / 'empty.log'
+    filename.write_bytes(b'')
+    with pytest.raises(ValueError):
+        check.get_azel_ant30logdata(str(filename))
+
+    filename.write_text('[2024/06/20-14:31:09.884-calcBoth.cpp-510] (Az, El) = (1.0, 2.0), scan offset = (0.0, 0.0)\n')
+    with pytest.raises(ValueError):
+        check.get_azel_ant30logdata(str(filename))
@@ -0,0 +1,92 @@
+#!python3
+
+import datetime
+import os
+import re
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import interval
+import logindex
+
+"""
+interval.interval_stats の区間平均を、従来の TauCalculator.py のループ（区間ごとに全行を strptime して平均）と比べる。
+"""
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tau_measurement')
+ANT30LOG = os.path.join(DATA, 'ant30-tau1-20240925.log')
+POWERLOG = os.path.join(DATA, 'power-20240915.log')
+
+
+def old_integ_time(ant30log, marker, duration):
+    """
+    従来の extract_ON_time_from_ant30 / extract_R_time_from_ant30 と同じく、Integ end 行の時刻から開始時刻を逆算する。
+    """
+    start, end = [], []
+    with open(ant30log, 'r', encoding='utf-8') as file:
+        for line in file:
+            if marker in line:
+                time_match = re.search(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})', line)
+                if time_match:
+                    end_time = datetime.datetime.strptime(time_match.group(1), "%Y/%m/%d-%H:%M:%S.%f")
+                    end.append(end_time)
+                    start.append(end_time - datetime.timedelta(seconds=int(duration)))
+
+    return start, end
+
+
+def old_average_power(powerlog, start, end):
+    """
+    従来の calculate_average_power_ON と同じく、区間ごとにパワーメーターログの全行を見て平均する（値が無い区間は None）。
+    """
+    powerlog_contents = re.compile(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})\]\s+([\d\.]+)')
+    with open(powerlog, 'r') as file:
+        lines = file.readlines()
+
+    ret = []
+    for start_time, end_time in zip(start, end):
+        power_values = []
+        for line in lines:
+            match = powerlog_contents.match(line)
+            if match:
+                powerlog_time = datetime.datetime.strptime(match.group(1), '%Y/%m/%d-%H:%M:%S.%f')
+                if start_time <= powerlog_time <= end_time:
+                    power_values.append(float(match.group(2)))
+        ret.append(np.mean(power_values) if power_values else None)
+
+    return ret
+
+
+@pytest.mark.parametrize('kind, marker, key', [('on', '# On-Point  Integ end', 'OnOffTime'),
+                                               ('r', '# R-Sky     Integ end', 'RSkyTime')])
+def test_interval_stats_matches_loop(kind, marker, key):
+    log_index = logindex.parse_ant30log(ANT30LOG)
+    power_data = interval.read_powerlog(POWERLOG)
+
+    start, end = old_integ_time(ANT30LOG, marker, log_index[key])
+    expected = old_average_power(POWERLOG, start, end)
+    assert expected and None not in expected
+
+    stats = interval.interval_stats(power_data['time'], power_data['power'], start, end)
+    np.testing.assert_allclose(stats['mean'], expected, rtol=1e-12)
+
+    # 索引から求めた区間でも同じ平均になる
+    index_start, index_end = logindex.get_integ_time(log_index, kind, log_index[key])
+    stats = interval.interval_stats(power_data['time'], power_data['power'], index_start, index_end)
+    np.testing.assert_allclose(stats['mean'], expected, rtol=1e-12)
+
+
+
+def test_empty_and_inclusive_windows():
+    # 端の時刻は区間に含め、点の無い区間は count 0、mean と std は nan
+    time = np.array(['2024-09-25T00:00:00', '2024-09-25T00:00:01', '2024-09-25T00:00:02'], dtype='datetime64[ns]')
+    value = np.array([1.0, 2.0, 4.0])
+    start = np.array(['2024-09-25T00:00:00', '2024-09-25T00:00:01', '2024-09-25T00:00:05'], dtype='datetime64[ns]')
+    end = np.array(['2024-09-25T00:00:01', '2024-09-25T00:00:02', '2024-09-25T00:00:06'], dtype='datetime64[ns]')
+
+    stats = interval.interval_stats(time, value, start, end)
+    np.testing.assert_array_equal(stats['count'], [2, 2, 0])
+    np.testing.assert_allclose(stats['mean'], [1.5, 3.0, np.nan])
+    np.testing.assert_allclose(stats['std'], [0.5, 1.0, np.nan])
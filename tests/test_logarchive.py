@@ -0,0 +1,86 @@
+#!python3
+
+import os
+import shutil
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import logarchive
+import TauArchive
+
+"""
+logarchive による ant30ログとパワーメーターログの対応付けと、それを使う TauArchive.main のテスト。
+"""
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tau_measurement')
+ANT30LOG = 'ant30-tau1-20240925.log'
+POWERLOG = 'power-20240915.log'
+
+
+def shifted_copy(src, dst, old, new):
+    """
+    src の日付 old を new に置き換えて dst に書く（時間範囲だけが違うログ）。
+    """
+    with open(src, 'r', encoding='utf-8') as f:
+        content = f.read()
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    with open(dst, 'w', encoding='utf-8') as f:
+        f.write(content.replace(old, new))
+
+
+def make_archive(root):
+    """
+    サンプルのスカイディップ1つと、相手の無い ant30ログ・パワーメーターログを1つずつ置いたアーカイブを作る。
+    """
+    os.makedirs(os.path.join(root, '2024-09-25', 'power'))
+    shutil.copy(os.path.join(DATA, ANT30LOG), os.path.join(root, '2024-09-25', ANT30LOG))
+    shutil.copy(os.path.join(DATA, POWERLOG), os.path.join(root, '2024-09-25', 'power', POWERLOG))
+    shifted_copy(os.path.join(DATA, ANT30LOG), os.path.join(root, '2024-11-25', 'ant30-tau1-20241125.log'), '2024/09/25', '2024/11/25')
+    shifted_copy(os.path.join(DATA, POWERLOG), os.path.join(root, '2024-10-25', 'power-20241025.log'), '2024/09/25', '2024/10/25')
+    # .logcache/ などの隠しディレクトリの中は探さない
+    shifted_copy(os.path.join(DATA, ANT30LOG), os.path.join(root, '2024-09-25', '.logcache', ANT30LOG), '', '')
+
+
+def test_find_and_pair_logs(tmp_path):
+    root = str(tmp_path)
+    make_archive(root)
+
+    ant30logs = logarchive.find_logs([root], 'ant30-tau*.log')
+    powerlogs = logarchive.find_logs([os.path.join(root, '*', 'power-*.log'), os.path.join(root, '2024-09-25')], 'power-*.log')
+    assert [os.path.relpath(fn, root) for fn in ant30logs] == [os.path.join('2024-09-25', ANT30LOG), os.path.join('2024-11-25', 'ant30-tau1-20241125.log')]
+    assert [os.path.relpath(fn, root) for fn in powerlogs] == [os.path.join('2024-09-25', 'power', POWERLOG), os.path.join('2024-10-25', 'power-20241025.log')]
+
+    pairs = logarchive.pair_logs(ant30logs, powerlogs)
+    assert pairs == [(ant30logs[0], [powerlogs[0]])]
+
+
+def test_query_overlaps_matches_all_pairs():
+    rng = np.random.default_rng(1)
+    start = rng.integers(0, 1000, 60)
+    end = start + rng.integers(0, 200, 60)
+    order = np.argsort(start, kind='stable')
+    time_index = {'start': start[order], 'end': end[order], 'max_end': np.maximum.accumulate(end[order])}
+
+    q_start = rng.integers(-100, 1100, 40)
+    q_end = q_start + rng.integers(0, 100, 40)
+    for s, e, found in zip(q_start, q_end, logarchive.query_overlaps(time_index, q_start, q_end)):
+        expected = [i for i in range(len(order)) if time_index['start'][i] <= e and time_index['end'][i] >= s]
+        assert sorted(found.tolist()) == expected
+
+
+def test_archive_does_not_depend_on_workers(tmp_path):
+    root = str(tmp_path / 'archive')
+    make_archive(root)
+
+    rows, failed = TauArchive.main([root], 270.0, output=str(tmp_path / 'serial.csv'), workers=1, use_cache=False)
+    assert failed == []
+    assert len(rows) == 1 and rows[0]['ant30log'].endswith(ANT30LOG) and rows[0]['powerlog'].endswith(POWERLOG)
+    assert rows[0]['time'].startswith('2024-09-25T15:')
+    assert 0 < rows[0]['tau_0'] < 5
+
+    parallel, _ = TauArchive.main([root], 270.0, output=str(tmp_path / 'parallel.csv'), workers=2, use_cache=False)
+    assert parallel == rows
+    with open(tmp_path / 'serial.csv') as f1, open(tmp_path / 'parallel.csv') as f2:
+        assert f1.read() == f2.read()
@@ -0,0 +1,73 @@
+#!python3
+
+import os
+import shutil
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import interval
+import logcache
+
+"""
+logcache を通して読み込んだ結果を、キャッシュを使わずにログを読み込んだ結果と比べる。
+"""
+
+POWERLOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tau_measurement', 'power-20240915.log')
+
+
+def assert_same(cached, parsed):
+    assert set(cached) == set(parsed)
+    for key, value in parsed.items():
+        if isinstance(value, np.ndarray):
+            np.testing.assert_array_equal(cached[key], value)
+            assert cached[key].dtype == value.dtype
+        else:
+            assert cached[key] == value
+
+
+def test_cache_round_trip(tmp_path):
+    filename = str(tmp_path / 'power-20240915.log')
+    shutil.copy(POWERLOG, filename)
+    calls = []
+
+    def parser(fn):
+        calls.append(fn)
+        return interval.read_powerlog(fn)
+
+    parsed = interval.read_powerlog(filename)
+    assert_same(logcache.load(parser, filename, 'power', 1), parsed)
+    assert os.path.isdir(logcache.cache_path(filename, 'power'))
+
+    # 2回目はキャッシュ（メモリマップ）から読み込む
+    cached = logcache.load(parser, filename, 'power', 1)
+    assert_same(cached, parsed)
+    assert isinstance(cached['time'], np.memmap)
+    assert len(calls) == 1
+
+    # 更新時刻だけ変わった場合は内容のハッシュが一致するのでキャッシュを使う
+    st = os.stat(filename)
+    os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert_same(logcache.load(parser, filename, 'power', 1), parsed)
+    assert len(calls) == 1
+
+    # バージョンが変わった場合は読み込み直す
+    assert_same(logcache.load(parser, filename, 'power', 2), parsed)
+    assert len(calls) == 2
+
+
+def test_cache_rebuilt_when_log_changes(tmp_path):
+    filename = str(tmp_path / 'power-20240915.log')
+    shutil.copy(POWERLOG, filename)
+    logcache.load(interval.read_powerlog, filename, 'power', 1)
+
+    with open(filename, 'a') as f:
+        f.write('[2024/09/25-16:00:04.039]\t535621.5\n')
+
+    loaded = logcache.load(interval.read_powerlog, filename, 'power', 1)
+    assert_same(loaded, interval.read_powerlog(filename))
+    assert loaded['power'][-1] == 535621.5
+
+    logcache.clear(filename)
+    assert not os.path.exists(logcache.cache_path(filename, 'power'))
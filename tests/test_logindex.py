@@ -0,0 +1,93 @@
+#!python3
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import logindex
+
+"""
+logindex.parse_ant30log が作る索引（ヘッダーパラメーター、積分区間、(Az, El) 行）のテスト。
+"""
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tau_measurement', 'ant30-tau1-20240925.log')
+
+# 観測テーブルのヘッダーと、スカイディップ1セット分の積分区間・スキャン行を切り出した短いログ
+# （SetNumber は2回現れ、2つめの Off-Point には 'Integ start' 行が無い）
+LOG = """\
+OnOffTime       3
+RSkyTime        1
+SetNumber       1
+SetNumber       2
+[2024/09/25-15:57:15.357-tkb32Func.cpp-760] # R-Sky     Integ start
+[2024/09/25-15:57:17.999-tkb32Func.cpp-793] # R-Sky     Integ end  (AZ,EL) = (179.999993, 80.003189)
+[2024/09/25-15:57:17.999-tkb32Func.cpp-892] # Off-Point Integ start
+[2024/09/25-15:57:24.000-tkb32Func.cpp-1037] # Off-Point Integ end
+[2024/09/25-15:57:26.001-tkb32Func.cpp-889] # On-Point  Integ start
+[2024/09/27-16:20:11.681-calcBoth.cpp-510] (Az, El) = (263.173305, 18.032355), scan offset = (18000.000000, -600.500000)
+[2024/09/25-15:57:32.000-tkb32Func.cpp-1034] # On-Point  Integ end (On-Count:1) (AZ,EL) = (179.999993, 60.630233)
+[2024/09/25-15:57:40.500-tkb32Func.cpp-1037] # Off-Point Integ end
+"""
+
+
+def write_log(tmp_path):
+    filename = tmp_path / 'ant30-test.log'
+    filename.write_text(LOG, encoding='utf-8')
+    return str(filename)
+
+
+def test_header_uses_last_value(tmp_path):
+    log_index = logindex.parse_ant30log(write_log(tmp_path))
+
+    assert (log_index['SetNumber'], log_index['OnOffTime'], log_index['RSkyTime']) == (2, 3, 1)
+    assert log_index['fn'] == 'ant30-test'
+
+
+def test_windows_pair_start_and_end(tmp_path):
+    log_index = logindex.parse_ant30log(write_log(tmp_path))
+    windows = log_index['windows']
+
+    assert windows['kind'].tolist() == ['r', 'off', 'on', 'off']
+    np.testing.assert_array_equal(windows['end'], np.array(['2024-09-25T15:57:17.999', '2024-09-25T15:57:24.000',
+                                                            '2024-09-25T15:57:32.000', '2024-09-25T15:57:40.500'],
+                                                           dtype='datetime64[ms]'))
+    assert windows['start'][0] == np.datetime64('2024-09-25T15:57:15.357')
+    assert windows['start'][2] == np.datetime64('2024-09-25T15:57:26.001')
+    assert np.isnat(windows['start'][3])
+
+    # On-Count と (AZ,EL) は書かれている区間だけ
+    assert windows['count'].tolist() == [-1, -1, 1, -1]
+    np.testing.assert_allclose(windows['el'], [80.003189, np.nan, 60.630233, np.nan])
+
+
+def test_integ_time_from_duration(tmp_path):
+    log_index = logindex.parse_ant30log(write_log(tmp_path))
+
+    start, end = logindex.get_integ_time(log_index, 'off', log_index['OnOffTime'])
+    assert len(end) == 2
+    np.testing.assert_array_equal(end - start, np.array([3000, 3000], dtype='timedelta64[ms]'))
+
+    start, end = logindex.get_integ_time(log_index, 'off')
+    assert start[0] == np.datetime64('2024-09-25T15:57:17.999') and np.isnat(start[1])
+
+
+def test_azel_rows(tmp_path):
+    azel = logindex.parse_ant30log(write_log(tmp_path))['azel']
+
+    assert len(azel) == 1
+    assert azel['time'][0] == np.datetime64('2024-09-27T16:20:11.681')
+    assert (azel['az'][0], azel['el'][0]) == (263.173305, 18.032355)
+    assert (azel['az_scanoffset'][0], azel['el_scanoffset'][0]) == (18000.0, -600.5)
+
+
+def test_sample_log_counts():
+    log_index = logindex.parse_ant30log(SAMPLE)
+    with open(SAMPLE, encoding='utf-8') as file:
+        lines = file.readlines()
+
+    for kind, name in logindex.EVENT_KINDS.items():
+        n_end = sum(1 for line in lines if '# ' + kind in line and 'Integ end' in line)
+        assert len(logindex.get_windows(log_index, name)) == n_end
+    assert log_index['SetNumber'] == 1 and log_index['OnOffTime'] == 3 and log_index['RSkyTime'] == 1
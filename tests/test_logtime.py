@@ -0,0 +1,64 @@
+#!python3
+
+import datetime
+import os
+import re
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import logtime
+
+"""
+logtime のタイムスタンプの一括変換を、従来の1行ずつの datetime.strptime と比べる。
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LOGS = [os.path.join(ROOT, 'tau_measurement', 'ant30-tau1-20240925.log'),
+        os.path.join(ROOT, 'tau_measurement', 'power-20240915.log'),
+        os.path.join(ROOT, 'radio_pointing', 'power-2024092716.log')]
+
+stamp_format = re.compile(r'\[(\d{4}/\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})')
+
+
+def old_stamps(filename):
+    """
+    従来の解析プログラムと同じく、各行のタイムスタンプを正規表現で取り出して strptime した datetime と、元の文字列を返す。
+    """
+    times, stamps = [], []
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line in file:
+            match = stamp_format.match(line)
+            if match:
+                times.append(datetime.datetime.strptime(match.group(1), "%Y/%m/%d-%H:%M:%S.%f"))
+                stamps.append(line[:24])
+
+    return times, stamps
+
+
+@pytest.mark.parametrize('filename', LOGS)
+def test_stamps_to_ns_matches_strptime(filename):
+    times, stamps = old_stamps(filename)
+    assert times
+
+    ns = logtime.stamps_to_ns(stamps, offset=1)
+    np.testing.assert_array_equal(ns, np.array(times, dtype='datetime64[ns]').astype(np.int64))
+    np.testing.assert_array_equal(logtime.ns_to_datetime64(ns), np.array(times, dtype='datetime64[ns]'))
+
+
+@pytest.mark.parametrize('filename', LOGS)
+def test_file_time_range(filename):
+    times, _ = old_stamps(filename)
+    start, end = logtime.file_time_range(filename)
+
+    assert start == np.datetime64(times[0], 'ns').astype(np.int64)
+    assert end == np.datetime64(times[-1], 'ns').astype(np.int64)
+
+
+def test_spa_format_matches_strptime():
+    stamps = ['2024-06-20 14:31:06.123456', '2024-12-31 23:59:59.999999', '2025-01-01 00:00:00.000001']
+    times = [datetime.datetime.strptime(s, "%Y-%m-%d %H:%M:%S.%f") for s in stamps]
+
+    ns = logtime.stamps_to_ns(stamps, fmt='spa')
+    np.testing.assert_array_equal(ns, np.array(times, dtype='datetime64[ns]').astype(np.int64))
@@ -0,0 +1,145 @@
+#!python3
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+optimize = pytest.importorskip('scipy.optimize')
+
+import peakfind
+
+"""
+peakfind のピーク中心のテスト。
+サンプルのクロススキャン（ant30-2degrpsn-20240927161948_plot）では、閾値線を手で動かして求めた offset_C.txt と比べる。
+ガウス関数のまとめたフィッティングは、スキャンごとの curve_fit と比べる。
+"""
+
+PLOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'radio_pointing', 'ant30-2degrpsn-20240927161948_plot')
+SCANS = ('az_scanplot_1', 'el_scanplot_2', 'az_scanplot_3', 'el_scanplot_4', 'az_scanplot_5', 'el_scanplot_6')
+
+# 手で求めた中心との差の許容値 [deg]（ビームの半値全幅 約 0.47 deg の 2%）
+MANUAL_TOL = 0.01
+
+
+def sample_scans():
+    """
+    各スキャンのスキャンオフセット [arcsec] と T_B [K] のリストを、AZ_1, EL_1, AZ_2, EL_2, ... の順に返す。
+    """
+    data = [np.loadtxt(os.path.join(PLOT, f"{name}.txt"), delimiter=',', skiprows=1) for name in SCANS]
+    return [d[:, 2] for d in data], [d[:, 4] for d in data]
+
+
+def manual_offsets():
+    """
+    offset_C.txt の dAZ, dEL [deg] を AZ_1, EL_1, AZ_2, EL_2, ... の順に返す。
+    """
+    data = np.loadtxt(os.path.join(PLOT, 'offset_C.txt'), skiprows=1, ndmin=2)
+    return np.column_stack((data[:, 2], data[:, 5])).ravel()
+
+
+@pytest.mark.parametrize('method', peakfind.METHODS)
+def test_find_peak_matches_manual_offsets(method):
+    xs, ys = sample_scans()
+    center = np.array([peakfind.find_peak(x, y, method)['center'] for x, y in zip(xs, ys)]) / 3600
+    np.testing.assert_allclose(center, manual_offsets(), atol=MANUAL_TOL)
+
+
+@pytest.mark.parametrize('method', peakfind.METHODS)
+def test_find_peaks_matches_manual_offsets(method):
+    xs, ys = sample_scans()
+    peaks = peakfind.find_peaks(xs, ys, method)
+
+    center = np.array([peak['center'] for peak in peaks]) / 3600
+    np.testing.assert_allclose(center, manual_offsets(), atol=MANUAL_TOL)
+
+
+def test_fit_gaussians_matches_curve_fit():
+    xs, ys = sample_scans()
+    peaks = [peakfind.half_max(x, y) for x, y in zip(xs, ys)]
+    p0 = [(peak['amplitude'], peak['center'], peak['fwhm'] / peakfind.FWHM_PER_SIGMA) + tuple(peak['baseline']) for peak in peaks]
+
+    # 点数の違うスキャン（el_scanplot_6 は1点少ない）をまとめてフィッティングする
+    assert len({x.size for x in xs}) > 1
+    fit = peakfind.fit_gaussians(xs, ys, p0)
+    assert fit['success'].all()
+    assert fit['converged'].all()
+
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        popt, pcov = optimize.curve_fit(peakfind.gaussian, x, y, p0=p0[i])
+        np.testing.assert_allclose(fit['center'][i], popt[1], rtol=0, atol=1e-4 * abs(popt[2]))
+        np.testing.assert_allclose(fit['sigma'][i], abs(popt[2]), rtol=1e-5)
+        np.testing.assert_allclose(fit['center_err'][i], np.sqrt(pcov[1, 1]), rtol=1e-3)
+
+
+def test_half_max_of_symmetric_peak():
+    # ベースラインが傾いていても、左右対称にサンプルしたガウス関数の半値の中点は中心になる
+    x = np.linspace(-3000.0, 3000.0, 61) + 150.0
+    y = peakfind.gaussian(x, 12.0, 150.0, 600.0, 2.0, 3e-4)
+    peak = peakfind.half_max(x[::-1], y[::-1])
+
+    assert peak['center'] == pytest.approx(150.0, abs=1e-9)
+    assert peak['amplitude'] == pytest.approx(12.0, rel=1e-3)
+    assert peak['fwhm'] == pytest.approx(600.0 * peakfind.FWHM_PER_SIGMA, rel=1e-2)
+    np.testing.assert_array_equal(peak['x'], np.sort(x))
+
+
+def test_fit_gaussian_recovers_center():
+    x = np.linspace(-3000.0, 3000.0, 61)
+    p = (12.0, 237.0, 600.0, 2.0, 3e-4)
+    peak = peakfind.find_peak(x, peakfind.gaussian(x, *p), 'gauss')
+
+    np.testing.assert_allclose(peak['popt'], p, rtol=1e-6)
+    assert peak['center'] == pytest.approx(237.0, abs=1e-6)
+    np.testing.assert_allclose(peak['model'], peakfind.gaussian(x, *p), rtol=1e-6)
+
+
+@pytest.mark.parametrize('method', peakfind.METHODS)
+def test_no_peak(method):
+    x = np.linspace(-3000.0, 3000.0, 61)
+    # 点が足りないスキャン、半値を下回る点が片側に無いスキャン（ピークが端にある）は nan
+    assert np.isnan(peakfind.find_peak(x[:4], x[:4] * 0 + 1.0, method)['center'])
+    assert np.isnan(peakfind.find_peak(x, peakfind.gaussian(x, 10.0, 3000.0, 300.0, 0.0, 0.0), method)['center'])
+    with pytest.raises(ValueError):
+        peakfind.find_peak(x, x, 'peak')
+
+
+def test_convergence_flags(monkeypatch):
+    x = np.linspace(-4000.0, 4000.0, 50)
+    p = (10.0, 100.0, 700.0, 1.0, 1e-4)
+    y = peakfind.gaussian(x, *p)
+
+    # 初期値が厳密な解だと残差の二乗和は丸め誤差より小さくならず lam が大きくなって止まるが、最小値なので収束とする
+    fit = peakfind.fit_gaussians([x], [y], [p])
+    assert fit['converged'][0] and fit['success'][0]
+    np.testing.assert_allclose(fit['center'][0], p[1])
+
+    # max_iter 回で終わったスキャンは収束としない
+    p0 = (8.0, 300.0, 500.0, 0.0, 0.0)
+    assert not peakfind.fit_gaussians([x], [y], [p0], max_iter=2)['converged'][0]
+    assert peakfind.fit_gaussians([x], [y], [p0])['converged'][0]
+
+    # ヤコビアンの符号が逆だと、最小値から離れたまま残差が減らずに止まる（収束としない）
+    residual_jacobian = peakfind._residual_jacobian
+    monkeypatch.setattr(peakfind, '_residual_jacobian', lambda *args: tuple(v * s for v, s in zip(residual_jacobian(*args), (1, -1))))
+    fit = peakfind.fit_gaussians([x], [y], [p0])
+    assert not fit['converged'][0]
+    np.testing.assert_allclose(fit['center'][0], p0[1])
+
+
+def test_find_peaks_drops_unconverged_fits(monkeypatch):
+    xs, ys = sample_scans()
+    fit_gaussians = peakfind.fit_gaussians
+
+    def stall_second_scan(*args, **kwargs):
+        fit = fit_gaussians(*args, **kwargs)
+        fit['converged'][1] = False
+        return fit
+
+    monkeypatch.setattr(peakfind, 'fit_gaussians', stall_second_scan)
+    peaks = peakfind.find_peaks(xs, ys, 'gauss')
+
+    # 収束しなかったスキャンは success でも中心を使わない
+    for key in ('center', 'center_err', 'fwhm', 'amplitude'):
+        assert np.isnan(peaks[1][key])
+    assert all(np.isfinite(peak['center']) for i, peak in enumerate(peaks) if i != 1)
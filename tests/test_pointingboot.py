@@ -0,0 +1,90 @@
+#!python3
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import pointingboot
+import pointingfit
+import pointingmodel
+
+"""
+pointingboot.bootstrap を、同じ乱数で選び直した行ごとに np.linalg.lstsq で解き直した結果と比べる。
+workers の数によらず同じ seed なら同じ結果になることも確かめる。
+"""
+
+OFFSETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'radio_pointing', 'offset_data')
+
+
+@pytest.fixture(scope='module')
+def system():
+    """
+    サンプルの offset_L.txt, offset_C.txt の 60cm_model_2 の計画行列 A、観測値 y、重み w。
+    """
+    L = np.loadtxt(os.path.join(OFFSETS, 'offset_L.txt'), delimiter=',', skiprows=1, ndmin=2)
+    C = np.loadtxt(os.path.join(OFFSETS, 'offset_C.txt'), skiprows=1, ndmin=2)
+    data = pointingfit.stack_offsets(L[:, 0], L[:, 1], L[:, 2], L[:, 3], C[:, 0], C[:, 1], C[:, 2], C[:, 3], C[:, 4], C[:, 5])
+    return pointingfit.linear_system(pointingmodel.design_function('60cm_model_2'), data)
+
+
+def refit_loop(A, y, w, n_boot, seed, chunk_size):
+    """
+    bootstrap と同じ乱数列で行を選び、1個ずつ重み付き最小二乗で解き直す。
+    """
+    n = y.size // 2
+    sizes = [min(chunk_size, n_boot - i) for i in range(0, n_boot, chunk_size)]
+    popt, before, after = [], [], []
+    for size, s in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))):
+        rng = np.random.default_rng(s)
+        for pick in rng.integers(0, n, (size, n)):
+            rows = np.concatenate((pick, pick + n))
+            B = np.linalg.lstsq(A[rows] * w[rows, None], y[rows] * w[rows], rcond=None)[0]
+            r = y[rows] - A[rows] @ B
+            popt.append(B)
+            before.append(np.sqrt(np.mean(y[pick] ** 2 + y[pick + n] ** 2)) * 3600)
+            after.append(np.sqrt(np.mean(r[:n] ** 2 + r[n:] ** 2)) * 3600)
+    return np.array(popt), np.array(before), np.array(after)
+
+
+def test_matches_sequential_refits(system, monkeypatch):
+    A, y, w = system
+    monkeypatch.setattr(pointingboot, 'CHUNK_SIZE', 16)
+    samples = pointingboot.bootstrap(A, y, w, n_boot=40, seed=3)
+
+    popt, before, after = refit_loop(A, y, w, 40, 3, 16)
+    assert samples['popt'].shape == (40, A.shape[1])
+    np.testing.assert_allclose(samples['popt'], popt, rtol=1e-7, atol=1e-10)
+    np.testing.assert_allclose(samples['before_rms'], before, rtol=1e-12)
+    np.testing.assert_allclose(samples['after_rms'], after, rtol=1e-7)
+
+
+def test_same_seed_for_any_workers(system, monkeypatch):
+    A, y, w = system
+    monkeypatch.setattr(pointingboot, 'CHUNK_SIZE', 7)
+
+    serial = pointingboot.bootstrap(A, y, w, n_boot=30, seed=11, workers=1)
+    parallel = pointingboot.bootstrap(A, y, w, n_boot=30, seed=11, workers=3)
+    again = pointingboot.bootstrap(A, y, w, n_boot=30, seed=11, workers=2)
+    for key in ('popt', 'before_rms', 'after_rms'):
+        np.testing.assert_array_equal(parallel[key], serial[key])
+        np.testing.assert_array_equal(again[key], serial[key])
+
+    other = pointingboot.bootstrap(A, y, w, n_boot=30, seed=12)
+    assert not np.array_equal(other['popt'], serial['popt'])
+
+
+def test_summarize(system):
+    A, y, w = system
+    popt = pointingfit.solve_linear(A, y, w)['popt']
+    samples = pointingboot.bootstrap(A, y, w, n_boot=50, seed=0)
+    params = pointingmodel.MODELS['60cm_model_2']['params']
+
+    summary = pointingboot.summarize(popt, samples, params)
+    assert summary['n'] == 50 and list(summary['params']) == params
+    np.testing.assert_allclose(summary['err'], samples['popt'].std(axis=0, ddof=1))
+    assert summary['params']['B3']['estimate'] == popt[3]
+    assert summary['params']['B3']['low'] <= summary['params']['B3']['high']
+    np.testing.assert_allclose(np.diag(summary['corr']), 1.0)
+    assert summary['after_rms']['median'] < summary['before_rms']['median']
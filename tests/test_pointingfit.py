@@ -0,0 +1,170 @@
+#!python3
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+optimize = pytest.importorskip('scipy.optimize')
+
+import pointingfit
+import pointingmodel
+
+"""
+pointingfit.solve_linear（計画行列から直接解く）を、従来の rp_instrument.py の 60cm_model_2 の残差関数を
+scipy.optimize.least_squares で反復して解いた結果と比べる（サンプルの offset_data/offset_L.txt, offset_C.txt）。
+"""
+
+OFFSETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'radio_pointing', 'offset_data')
+
+
+def load_offsets():
+    """
+    offset_L.txt (AZ, EL, dAZ, dEL) と offset_C.txt (AZ_1, EL_1, dAZ, AZ_2, EL_2, dEL) を配列で返す。
+    """
+    L = np.loadtxt(os.path.join(OFFSETS, 'offset_L.txt'), delimiter=',', skiprows=1, ndmin=2)
+    C = np.loadtxt(os.path.join(OFFSETS, 'offset_C.txt'), skiprows=1, ndmin=2)
+    return L, C
+
+
+def model_60cm_2(B, AZ, EL):
+    """
+    従来の rp_instrument.py の model_60cm_L_2（AZ, EL が同じ位置）と同じ式。
+    """
+    AZ = np.radians(AZ)
+    EL = np.radians(EL)
+    B0, B1, B2, B3, B4, B5, B6, B7, B8, B9 = B
+    dAZ = B1 * np.cos(AZ - EL) - B0 * np.sin(AZ - EL) + B2 + B4 * np.cos(EL) - B5 * np.sin(EL) + B6 * np.cos(AZ) - B7 * np.sin(AZ) + B8 * np.cos(AZ + EL) - B9 * np.sin(AZ + EL)
+    dEL = B1 * np.sin(EL - EL) + B0 * np.cos(AZ - EL) + B3 - B4 * np.sin(EL) + B5 * np.cos(EL) + B6 * np.sin(AZ) + B7 * np.cos(AZ) + B8 * np.sin(AZ + EL) + B9 * np.cos(AZ + EL)
+    return dAZ, dEL
+
+
+def old_residuals(B, L, C):
+    """
+    従来の residuals_60cm_L_2 / residuals_60cm_C_2 / residuals_60cm_C_and_L_2 と同じ残差
+    （片方だけの場合は観測値の標準偏差でスケーリング、両方の場合はそのまま）。
+    """
+    dAZ_fit_L, dEL_fit_L = model_60cm_2(B, L[:, 0], L[:, 1])
+    dAZ_fit_C, _ = model_60cm_2(B, C[:, 0], C[:, 1])
+    _, dEL_fit_C = model_60cm_2(B, C[:, 3], C[:, 4])
+    r_az = np.concatenate((L[:, 2] - dAZ_fit_L, C[:, 2] - dAZ_fit_C))
+    r_el = np.concatenate((L[:, 3] - dEL_fit_L, C[:, 5] - dEL_fit_C))
+    if len(L) and len(C):
+        return np.concatenate((r_az, r_el))
+
+    dAZ_obs = np.concatenate((L[:, 2], C[:, 2]))
+    dEL_obs = np.concatenate((L[:, 3], C[:, 5]))
+    return np.concatenate((r_az / np.std(dAZ_obs), r_el / np.std(dEL_obs)))
+
+
+def linear_system(L, C, model_name='60cm_model_2'):
+    """
+    rp_instrument.py の run_fit と同じ計画行列 A、観測値 y、重み w を返す。
+    """
+    data = pointingfit.stack_offsets(L[:, 0], L[:, 1], L[:, 2], L[:, 3], C[:, 0], C[:, 1], C[:, 2], C[:, 3], C[:, 4], C[:, 5])
+    return pointingfit.linear_system(pointingmodel.design_function(model_name), data)
+
+
+CASES = {'L': lambda L, C: (L, C[:0]), 'C': lambda L, C: (L[:0], C), 'L_and_C': lambda L, C: (L, C)}
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_solve_linear_matches_least_squares(case):
+    L, C = CASES[case](*load_offsets())
+    A, y, w = linear_system(L, C)
+    fit = pointingfit.solve_linear(A, y, w)
+
+    # 連続波データだけの場合は条件数が 1e4 程度あり、least_squares は解の近くで止まるので、
+    # 直接解いた残差の二乗和が least_squares 以下であることと、パラメーターが 1e-5 deg 以内で一致することを確かめる
+    old = optimize.least_squares(old_residuals, np.zeros(10), args=(L, C), xtol=1e-15, ftol=1e-15, gtol=1e-15)
+    np.testing.assert_allclose(fit['popt'], old.x, rtol=0, atol=1e-5)
+    np.testing.assert_allclose(fit['chi2'], np.sum(old_residuals(fit['popt'], L, C) ** 2), rtol=1e-10)
+    assert fit['chi2'] <= np.sum(old.fun ** 2) * (1 + 1e-12)
+    assert fit['rank'] == 10
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_solve_least_squares_matches_solve_linear(case):
+    L, C = CASES[case](*load_offsets())
+    A, y, w = linear_system(L, C)
+
+    linear = pointingfit.solve_linear(A, y, w)
+    iterative = pointingfit.solve_least_squares(A, y, w)
+    np.testing.assert_allclose(iterative['popt'], linear['popt'], rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(iterative['cov'], linear['cov'], rtol=1e-6, atol=1e-15)
+
+
+
+def synthetic_system(n=60, seed=5):
+    """
+    60cm_model の既知のパラメーターに 1 arcsec 程度の雑音を加えた輝線データの計画行列 A と観測値 y。
+    """
+    rng = np.random.default_rng(seed)
+    AZ, EL = rng.uniform(0, 360, n), rng.uniform(15, 80, n)
+    B = np.array([0.02, -0.01, 0.15, -0.3, 0.03, -0.02])
+    D_az, D_el = pointingmodel.design('60cm_model', AZ, EL)
+    A = np.vstack((D_az, D_el))
+    y = A @ B + rng.normal(0, 3e-4, 2 * n)
+    return A, y
+
+
+def test_clip_rejects_injected_outlier():
+    A, y = synthetic_system()
+    bad = 7
+    y_bad = y.copy()
+    y_bad[bad] += 0.05  # 180 arcsec ずれた dAZ の行
+
+    fit = pointingfit.solve_robust(A, y_bad, method='clip')
+    assert fit['converged']
+    assert fit['weight'][bad] == 0 and fit['rejected'][bad]
+    assert np.flatnonzero(fit['weight'] == 0).tolist() == [bad]
+    assert np.flatnonzero(fit['rejected']).tolist() == [bad]
+
+    # 外れ値の行を除いてそのまま解いた結果と同じになる
+    keep = np.ones(y.size, dtype=bool)
+    keep[bad] = False
+    clean = pointingfit.solve_linear(A[keep], y_bad[keep])
+    np.testing.assert_allclose(fit['popt'], clean['popt'], rtol=1e-10, atol=1e-13)
+    np.testing.assert_allclose(fit['chi2'], clean['chi2'], rtol=1e-10)
+
+
+def test_clip_rejected_rows_are_the_unused_rows():
+    # 1回で止めると最後に解き直した残差は閾値と一致しないが、除外した行は重み 0 の行（フィッティングに使わなかった行）
+    A, y = synthetic_system(seed=0)
+    fit = pointingfit.solve_robust(A, y, method='clip', threshold=1.5, max_iter=1)
+    assert not fit['converged'] and fit['rejected'].any()
+    np.testing.assert_array_equal(fit['rejected'], fit['weight'] == 0)
+
+    used = pointingfit.solve_linear(A[~fit['rejected']], y[~fit['rejected']])
+    np.testing.assert_allclose(fit['popt'], used['popt'], rtol=1e-10, atol=1e-13)
+
+
+@pytest.mark.parametrize('method', ['huber', 'cauchy'])
+def test_soft_losses_converge(method):
+    A, y = synthetic_system()
+    bad = [3, 70]
+    y_bad = y.copy()
+    y_bad[bad] -= 0.05
+
+    fit = pointingfit.solve_robust(A, y_bad, method=method)
+    plain = pointingfit.solve_linear(A, y_bad)
+    clean = pointingfit.solve_linear(A, y)
+    assert fit['converged'] and fit['n_iter'] < pointingfit.ROBUST_MAX_ITER
+    assert np.all((0 < fit['weight']) & (fit['weight'] <= 1))
+    assert fit['rejected'][bad].all() and fit['weight'][bad].max() < 0.05
+
+    # 外れ値の影響は重みを付けない場合より小さい
+    assert np.abs(fit['popt'] - clean['popt']).max() < 0.1 * np.abs(plain['popt'] - clean['popt']).max()
+
+
+def test_robust_without_outliers_is_plain_fit():
+    A, y = synthetic_system(seed=6)
+    w = np.concatenate((np.full(60, 2.0), np.full(60, 0.5)))
+    fit = pointingfit.solve_robust(A, y, w, method='clip', threshold=10.0)
+    plain = pointingfit.solve_linear(A, y, w)
+    assert fit['n_iter'] == 1 and not fit['rejected'].any()
+    np.testing.assert_array_equal(fit['weight'], 1.0)
+    np.testing.assert_allclose(fit['popt'], plain['popt'], rtol=1e-12)
+
+    with pytest.raises(ValueError):
+        pointingfit.solve_robust(A, y, method='tukey')
@@ -0,0 +1,167 @@
+#!python3
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import pointingmodel
+
+"""
+pointingmodel の宣言 (MODEL_DEFS) から作ったモデルを、従来の rp_instrument.py に手で書かれていた
+model_60cm_L/C, model_60cm_L_2/C_2, opt_model_L/C の式と、write_in_conf / read_old_kisapara_from_conf の並びと比べる。
+features() のキャッシュ（データごとの基底関数の値と計画行列）のテストもここに置く。
+"""
+
+
+def old_60cm(B, AZ, EL):
+    AZ, EL = np.radians(AZ), np.radians(EL)
+    B0, B1, B2, B3, B4, B5 = B
+    dAZ = B0 * np.sin(AZ - EL) + B1 * np.cos(AZ - EL) + B2 + B4 * np.cos(EL) - B5 * np.sin(EL)
+    dEL = B0 * np.cos(AZ - EL) - B1 * np.sin(AZ - EL) + B3 + B4 * np.sin(EL) + B5 * np.cos(EL)
+    return dAZ, dEL
+
+
+def old_60cm_2(B, AZ, EL):
+    AZ, EL = np.radians(AZ), np.radians(EL)
+    B0, B1, B2, B3, B4, B5, B6, B7, B8, B9 = B
+    dAZ = B1 * np.cos(AZ - EL) - B0 * np.sin(AZ - EL) + B2 + B4 * np.cos(EL) - B5 * np.sin(EL) + B6 * np.cos(AZ) - B7 * np.sin(AZ) + B8 * np.cos(AZ + EL) - B9 * np.sin(AZ + EL)
+    dEL = B1 * np.sin(EL - EL) + B0 * np.cos(AZ - EL) + B3 - B4 * np.sin(EL) + B5 * np.cos(EL) + B6 * np.sin(AZ) + B7 * np.cos(AZ) + B8 * np.sin(AZ + EL) + B9 * np.cos(AZ + EL)
+    return dAZ, dEL
+
+
+def old_opt(A, AZ, EL):
+    # 従来の opt_model_L は dAZ の2行目以降が別の文になっていたので、括弧でつないだ本来の式と比べる
+    EL_deg = EL
+    AZ, EL = np.radians(AZ), np.radians(EL)
+    A1, A2, A3, A4, A5, A6, A7, A8, A9, A10, A11, A12, A13, A14, A15 = A
+    dAZ = (A1 + A2 * np.cos(AZ) * np.tan(EL) + A3 * np.sin(AZ) * np.tan(EL) + A4 * np.tan(EL) + A5 / np.cos(EL)
+           + A8 * np.cos(AZ) + A9 * np.sin(AZ) + A12 * np.cos(AZ) * np.cos(EL)
+           + A13 * np.cos(AZ) * np.sin(EL) + A14 * np.sin(AZ) * np.cos(EL) + A15 * EL_deg)
+    dEL = -A2 * np.sin(AZ) + A3 * np.cos(AZ) + A6 + A7 * np.cos(EL) + A10 * np.cos(AZ) + A11 * np.sin(AZ)
+    return dAZ, dEL
+
+
+OLD_MODELS = {'60cm_model': old_60cm, '60cm_model_2': old_60cm_2, 'optical_model': old_opt}
+
+# 従来の write_in_conf の AntRadioInst0-2 の並び
+OLD_CONF = {
+    '60cm_model': lambda p: [p[:4], [p[4], p[5], 0.0, 0.0], [0.0, 0.0, 0.0, 0.0]],
+    '60cm_model_2': lambda p: [p[:4], p[4:8], [p[8], p[9], 0.0, 0.0]],
+    'optical_model': lambda p: [p[:5], p[5:10], p[10:15]],
+}
+
+# 従来の read_old_kisapara_from_conf が AntRadioInst0-2 の行から読む値の数
+OLD_READ = {'60cm_model': (4, 2, 0), '60cm_model_2': (4, 4, 2), 'optical_model': (5, 5, 5)}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    pointingmodel.clear_features()
+    yield
+    pointingmodel.clear_features()
+
+
+def positions(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 360, n), rng.uniform(10, 85, n)
+
+
+def test_models_are_declared():
+    assert set(pointingmodel.MODELS) == set(OLD_MODELS)
+    for name, model in pointingmodel.MODELS.items():
+        assert model['name'] == name
+        assert model['S_az'].shape == model['S_el'].shape == (len(model['terms']), len(model['params']))
+
+
+@pytest.mark.parametrize('name', sorted(OLD_MODELS))
+def test_evaluate_matches_old_model(name):
+    AZ, EL = positions()
+    rng = np.random.default_rng(1)
+    for _ in range(3):
+        B = rng.normal(0, 0.1, len(pointingmodel.MODELS[name]['params']))
+        dAZ, dEL = pointingmodel.evaluate(name, B, AZ, EL)
+        old_dAZ, old_dEL = OLD_MODELS[name](B, AZ, EL)
+        np.testing.assert_allclose(dAZ, old_dAZ, rtol=1e-12, atol=1e-14)
+        np.testing.assert_allclose(dEL, old_dEL, rtol=1e-12, atol=1e-14)
+
+
+@pytest.mark.parametrize('name', sorted(OLD_MODELS))
+def test_design_columns_are_old_model_with_unit_parameters(name):
+    AZ, EL = positions(50)
+    D_az, D_el = pointingmodel.design(name, AZ, EL)
+    n = len(pointingmodel.MODELS[name]['params'])
+    assert D_az.shape == D_el.shape == (AZ.size, n)
+    for k, unit in enumerate(np.eye(n)):
+        old_dAZ, old_dEL = OLD_MODELS[name](unit, AZ, EL)
+        np.testing.assert_allclose(D_az[:, k], old_dAZ, rtol=1e-12, atol=1e-14)
+        np.testing.assert_allclose(D_el[:, k], old_dEL, rtol=1e-12, atol=1e-14)
+
+
+@pytest.mark.parametrize('name', sorted(OLD_MODELS))
+def test_evaluate_C_uses_two_positions(name):
+    AZ1, EL1 = positions(40, seed=2)
+    AZ2, EL2 = positions(40, seed=3)
+    B = np.linspace(-0.2, 0.2, len(pointingmodel.MODELS[name]['params']))
+    dAZ, dEL = pointingmodel.evaluate_C(name, B, AZ1, EL1, AZ2, EL2)
+    np.testing.assert_allclose(dAZ, OLD_MODELS[name](B, AZ1, EL1)[0], rtol=1e-12, atol=1e-14)
+    np.testing.assert_allclose(dEL, OLD_MODELS[name](B, AZ2, EL2)[1], rtol=1e-12, atol=1e-14)
+
+
+@pytest.mark.parametrize('name', sorted(OLD_MODELS))
+def test_conf_rows_and_params_from_conf(name):
+    n = len(pointingmodel.MODELS[name]['params'])
+    popt = list(np.arange(1, n + 1) * 0.01)
+
+    rows = pointingmodel.conf_rows(name, popt)
+    assert [key for key, _ in rows] == list(pointingmodel.CONF_KEYS)
+    for (_, values), old in zip(rows, OLD_CONF[name](popt)):
+        np.testing.assert_array_equal(values, old)
+
+    # conf に書いた値を読み直すと元の器差パラメーターになる（従来の読み方と同じ値の数だけ読む）
+    conf_values = {key: list(values) + [9.0] for key, values in rows}
+    assert pointingmodel.params_from_conf(name, conf_values) == popt
+    old = []
+    for key, count in zip(pointingmodel.CONF_KEYS, OLD_READ[name]):
+        old.extend(conf_values[key][:count])
+    assert pointingmodel.params_from_conf(name, conf_values) == old
+
+
+def test_parse_expression_errors():
+    with pytest.raises(ValueError):
+        pointingmodel.parse_expression('B0 sin(AZ) + C1', ['B0'])
+    with pytest.raises(ValueError):
+        pointingmodel.parse_expression('B0 sin(2AZ)', ['B0'])
+    assert pointingmodel.parse_expression('B0 - B0 cos(EL) + B0', ['B0']) == {('B0', '1'): 2.0, ('B0', 'cos(EL)'): -1.0}
+
+
+def test_features_are_cached_by_value():
+    AZ, EL = positions(30)
+    F = pointingmodel.features(AZ, EL)
+
+    # 同じ値の別の配列（リスト、int を含む形）でもキャッシュを返し、配列は書き換えられない
+    assert pointingmodel.features(list(AZ), EL.copy()) is F
+    assert pointingmodel.design('60cm_model', AZ, EL)[0] is pointingmodel.design('60cm_model', AZ.copy(), EL)[0]
+    assert not F['T'].flags.writeable and F['T'].flags.c_contiguous
+    with pytest.raises(ValueError):
+        F['T'][0, 0] = 1.0
+
+    AZ2 = AZ.copy()
+    AZ2[0] += 1e-9
+    assert pointingmodel.features(AZ2, EL) is not F
+
+
+def test_features_cache_evicts_the_oldest():
+    data = [positions(10, seed=i) for i in range(pointingmodel.FEATURE_CACHE_SIZE + 1)]
+    first = [pointingmodel.features(AZ, EL) for AZ, EL in data[:-1]]
+
+    # 上限を超えると最も古いデータだけ消え、残りは同じものを返す
+    pointingmodel.features(*data[-1])
+    assert len(pointingmodel._feature_cache) == pointingmodel.FEATURE_CACHE_SIZE
+    for F, (AZ, EL) in zip(first[1:], data[1:-1]):
+        assert pointingmodel.features(AZ, EL) is F
+    F0 = pointingmodel.features(*data[0])
+    assert F0 is not first[0]
+    np.testing.assert_array_equal(F0['T'], first[0]['T'])
+
+    pointingmodel.clear_features()
+    assert pointingmodel.features(*data[1]) is not first[1]
@@ -0,0 +1,148 @@
+#!python3
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import pointingfit
+import pointingmodel
+import pointingrls
+
+"""
+pointingrls の逐次更新（offset の行を1行ずつ取り込む）を、全ての行をまとめた重み付き最小二乗（pointingfit.solve_linear、
+rp_instrument.py の run_fit と同じ重み）と比べる（サンプルの offset_data/offset_L.txt, offset_C.txt）。
+"""
+
+OFFSETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'radio_pointing', 'offset_data')
+MODEL = '60cm_model_2'
+
+
+def load_offsets():
+    """
+    offset_L.txt (AZ, EL, dAZ, dEL) と offset_C.txt (AZ_1, EL_1, dAZ, AZ_2, EL_2, dEL) を配列で返す。
+    """
+    L = np.loadtxt(os.path.join(OFFSETS, 'offset_L.txt'), delimiter=',', skiprows=1, ndmin=2)
+    C = np.loadtxt(os.path.join(OFFSETS, 'offset_C.txt'), skiprows=1, ndmin=2)
+    return L, C
+
+
+def stack(L, C):
+    """
+    pointingfit.stack_offsets（1行だけの場合の重み 1/0 の警告は出さない）。
+    """
+    with np.errstate(divide='ignore'):
+        return pointingfit.stack_offsets(L[:, 0], L[:, 1], L[:, 2], L[:, 3], C[:, 0], C[:, 1], C[:, 2], C[:, 3], C[:, 4], C[:, 5])
+
+
+def rls_one_row_at_a_time(L, C, forgetting=1.0):
+    """
+    輝線データ、連続波データの順に、offset の行を1行ずつ state に取り込む。
+    """
+    state = pointingrls.new_state(MODEL, len(pointingmodel.MODELS[MODEL]['params']), forgetting)
+    rows = [stack(L[i:i + 1], C[:0]) for i in range(len(L))] + [stack(L[:0], C[i:i + 1]) for i in range(len(C))]
+    for data in rows:
+        # 1行だけの重み（1/標準偏差）は使わない（重みは solve で全ての行から求める）
+        A, y, _ = pointingfit.linear_system(pointingmodel.design_function(MODEL), data)
+        pointingrls.update(state, A, y)
+    state['n_L'], state['n_C'] = len(L), len(C)
+
+    return state
+
+
+CASES = {'L': lambda L, C: (L, C[:0]), 'C': lambda L, C: (L[:0], C), 'L_and_C': lambda L, C: (L, C)}
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_rls_matches_batch_fit(case):
+    L, C = CASES[case](*load_offsets())
+    data = stack(L, C)
+    A, y, w = pointingfit.linear_system(pointingmodel.design_function(MODEL), data)
+    batch = pointingfit.solve_linear(A, y, w)
+
+    fit = pointingrls.solve(rls_one_row_at_a_time(L, C))
+    assert fit['complete']
+    np.testing.assert_allclose((fit['w_az'], fit['w_el']), (data['w_az'], data['w_el']), rtol=1e-10)
+    np.testing.assert_allclose(fit['popt'], batch['popt'], rtol=1e-7, atol=1e-10)
+    np.testing.assert_allclose(fit['cov'], batch['cov'], rtol=1e-6, atol=1e-14)
+    np.testing.assert_allclose(fit['chi2'], batch['chi2'], rtol=1e-7)
+
+    # RMS は重みなしの残差（dAZ, dEL の二乗和）から
+    n = y.size // 2
+    r = batch['residual']
+    np.testing.assert_allclose(fit['rms'], np.sqrt(np.mean(r[:n] ** 2 + r[n:] ** 2)) * 3600, rtol=1e-7)
+
+
+def test_forgetting_matches_weighted_batch_fit():
+    L, C = load_offsets()
+    lam = 0.9
+    fit = pointingrls.solve(rls_one_row_at_a_time(L, C[:0], lam))
+
+    # 後から取り込んだ行ほど重みの大きい（最後の行が 1）重み付き最小二乗。dAZ, dEL の重みも忘却の重み付きの標準偏差から
+    n = len(L)
+    s = lam ** np.arange(n - 1, -1, -1, dtype=np.float64)
+    A, y, _ = pointingfit.linear_system(pointingmodel.design_function(MODEL), stack(L, C[:0]))
+    w = []
+    for obs in (L[:, 2], L[:, 3]):
+        mean = np.sum(s * obs) / s.sum()
+        w.append(np.full(n, 1 / np.sqrt(np.sum(s * obs ** 2) / s.sum() - mean ** 2)))
+    w = np.concatenate(w) * np.sqrt(np.concatenate((s, s)))
+    popt, *_ = np.linalg.lstsq(A * w[:, None], y * w, rcond=None)
+
+    np.testing.assert_allclose(fit['popt'], popt, rtol=1e-7, atol=1e-10)
+
+
+def test_update_in_chunks_and_state_file(tmp_path):
+    L, C = load_offsets()
+    state = rls_one_row_at_a_time(L, C, 0.95)
+
+    # 全ての行をまとめて取り込んでも、1行ずつ取り込んだのと同じになる
+    chunked = pointingrls.new_state(MODEL, len(pointingmodel.MODELS[MODEL]['params']), 0.95)
+    for part in (stack(L, C[:0]), stack(L[:0], C)):
+        A, y, _ = pointingfit.linear_system(pointingmodel.design_function(MODEL), part)
+        pointingrls.update(chunked, A, y)
+    chunked['n_L'], chunked['n_C'] = len(L), len(C)
+
+    filename = str(tmp_path / 'rls.npz')
+    pointingrls.save_state(filename, chunked)
+    loaded = pointingrls.load_state(filename)
+    for key, value in state.items():
+        if isinstance(value, str):
+            assert loaded[key] == value
+        else:
+            np.testing.assert_allclose(loaded[key], value, rtol=1e-10)
+    np.testing.assert_allclose(pointingrls.solve(loaded)['popt'], pointingrls.solve(state)['popt'], rtol=1e-8, atol=1e-12)
+
+
+def test_run_update_refuses_changed_rows(tmp_path, monkeypatch):
+    pytest.importorskip('pandas')
+    pytest.importorskip('matplotlib')
+    import batchmode
+    import rp_instrument
+
+    # 輝線データの先頭 40 行だけ取り込み、残りの行を足してから更新する
+    folder = tmp_path / 'offset_data'
+    folder.mkdir()
+    lines = open(os.path.join(OFFSETS, 'offset_L.txt'), newline='').read().splitlines(keepends=True)
+    (folder / 'offset_L.txt').write_text(''.join(lines[:41]), newline='')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(batchmode, 'BATCH', True)
+    state_file = str(tmp_path / 'rls.npz')
+    assert rp_instrument.run_update(MODEL, state_file)['n_L'] == 40
+
+    (folder / 'offset_L.txt').write_text(''.join(lines), newline='')
+    ret = rp_instrument.run_update(MODEL, state_file)
+    assert ret['n_new'] == len(lines) - 41 and ret['n_L'] == len(lines) - 1
+    state = pointingrls.load_state(state_file)
+
+    # 取り込んだ行を書き換えると、行を足しても --reset するまで更新しない
+    edited = lines[:]
+    edited[5] = edited[5].replace(',', ',1', 1)
+    (folder / 'offset_L.txt').write_text(''.join(edited + lines[-3:]), newline='')
+    with pytest.raises(ValueError, match='--reset'):
+        rp_instrument.run_update(MODEL, state_file)
+    assert pointingrls.load_state(state_file)['hash_L'] == state['hash_L']
+
+    ret = rp_instrument.run_update(MODEL, state_file, reset=True)
+    assert ret['n_L'] == len(edited) + 2 and ret['n_new'] == ret['n_L']
@@ -0,0 +1,80 @@
+#!python3
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+pytest.importorskip('matplotlib')
+
+import interval
+import logindex
+import rp_plot
+
+"""
+rp_plot.create_scanplot_dicts のクロススキャンの切り出し（ON区間ごとのスライス）と T_B、保存するスキャンファイルのテスト。
+"""
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'radio_pointing')
+ANT30LOG = os.path.join(DATA, 'ant30-2degrpsn-20240927161948.log')
+T_AMB = 290.0
+
+
+def scan_inputs():
+    """
+    サンプルの ant30ログの (Az, El) 行と、同じ時刻に出力が記録されたとしたパワーメーターのデータを返す。
+    """
+    log_index = logindex.parse_ant30log(ANT30LOG)
+    dict_azel = rp_plot.get_azel_scanoffset_ant30log(log_index)
+    time = dict_azel['date'].astype(np.int64)
+    rng = np.random.default_rng(7)
+    dict_power = {'time': time, 'power': 1e-6 * (1 + 0.1 * rng.random(time.size))}
+
+    return log_index, dict_azel, dict_power
+
+
+def test_scans_match_on_windows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log_index, dict_azel, dict_power = scan_inputs()
+    SetNumber = log_index['SetNumber']
+    on_dict = rp_plot.extract_ON_time_from_ant30(log_index)
+
+    ret = rp_plot.create_scanplot_dicts(log_index, T_AMB, dict_azel, dict_power, on_dict, SetNumber)
+
+    # OFF, R の平均出力（R は1回だけの場合も、セットごとの T_B の係数に使う）
+    off_start, off_end = logindex.get_integ_time(log_index, 'off', log_index['OnOffTime'])
+    R_start, R_end = logindex.get_integ_time(log_index, 'r', log_index['RSkyTime'])
+    off = interval.interval_stats(dict_power['time'], dict_power['power'], off_start, off_end)['mean']
+    R = interval.interval_stats(dict_power['time'], dict_power['power'], R_start, R_end)['mean']
+
+    assert SetNumber >= 1
+    for count in range(1, SetNumber + 1):
+        for axis, idx in (('az', 2 * count - 1), ('el', 2 * count)):
+            start, end = on_dict[f"on_start_time_{idx}"], on_dict[f"on_end_time_{idx}"]
+            inside = (start <= dict_azel['date']) & (dict_azel['date'] <= end)
+            scan = ret[f"{axis}_scan_{count}"]
+            key = f"{axis.upper()}_scanoffset"
+
+            assert inside.sum() > 0
+            # 同じ時刻の (Az, El) 行が2つある所は、補間で後の行の値になる（サンプルでは 1e-6 deg 違う行がある）
+            for name in ('AZ', 'EL', key):
+                np.testing.assert_allclose(scan[name], dict_azel[name][inside], rtol=0, atol=1e-5)
+            np.testing.assert_array_equal(scan[f"power_{axis}"], dict_power['power'][inside])
+            T_B = T_AMB * (dict_power['power'][inside] - off[count - 1]) / (R[count - 1] - off[count - 1])
+            np.testing.assert_allclose(scan[f"T_B_{axis}_{count}"], T_B, rtol=1e-12)
+
+            # スキャンファイルは AZ, EL, スキャンオフセット, power, T_B の小数点以下6桁
+            saved = np.loadtxt(os.path.join(dict_azel['fn'] + '_plot', f"{axis}_scanplot_{idx}.txt"), delimiter=',', skiprows=1, ndmin=2)
+            expected = np.column_stack([scan['AZ'], scan['EL'], scan[key], scan[f"power_{axis}"], scan[f"T_B_{axis}_{count}"]])
+            np.testing.assert_allclose(saved, expected, rtol=0, atol=6e-7)
+
+
+def test_window_index_edges():
+    time = np.array([10, 20, 20, 30, 40], dtype=np.int64)
+    i_start, i_end = interval.window_index(time, np.array([20, 0, 35, 50, 30], dtype=np.int64),
+                                           np.array([30, 5, 39, 60, 10], dtype=np.int64))
+
+    # 両端の時刻を含み、点の無い区間・逆向きの区間は長さ 0 のスライス
+    np.testing.assert_array_equal(i_start, [1, 0, 4, 5, 3])
+    np.testing.assert_array_equal(i_end - i_start, [3, 0, 0, 0, 0])
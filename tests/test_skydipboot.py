@@ -0,0 +1,110 @@
+#!python3
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+
+import interval
+import logindex
+import skydipboot
+
+"""
+skydipboot のブートストラップ・ジャックナイフを、1つのデータセットずつ np.polyfit でフィッティングするループと比べる。
+ブートストラップは同じ seed の乱数列で選び直したデータセットをループで作り直して比べる（CHUNK_SIZE 以下の1回分）。
+"""
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tau_measurement')
+ANT30LOG = os.path.join(DATA, 'ant30-tau1-20240925.log')
+POWERLOG = os.path.join(DATA, 'power-20240915.log')
+
+T_ATM = 270.0
+N_BOOT = 100
+SEED = 12345
+
+
+def sample_skydip():
+    """
+    サンプルのスカイディップの secZ, 各ON点の平均出力, V_R と、ON点・R の積分区間の辞書を返す。
+    """
+    log_index = logindex.parse_ant30log(ANT30LOG)
+    power_data = interval.read_powerlog(POWERLOG)
+    on_start, on_end = logindex.get_integ_time(log_index, 'on', log_index['OnOffTime'])
+    R_start, R_end = logindex.get_integ_time(log_index, 'r', log_index['RSkyTime'])
+
+    ret = {}
+    ret['power_data'] = power_data
+    ret['on_start'], ret['on_end'] = on_start, on_end
+    ret['R_start'], ret['R_end'] = R_start[-1:], R_end[-1:]
+    ret['secZ'] = 1 / np.cos(np.radians(90 - logindex.get_windows(log_index, 'on')['el']))
+    ret['power'] = interval.interval_stats(power_data['time'], power_data['power'], on_start, on_end)['mean']
+    ret['V_R'] = float(interval.interval_stats(power_data['time'], power_data['power'], ret['R_start'], ret['R_end'])['mean'][0])
+
+    return ret
+
+
+def old_fit(secZ, power, V_R, T_atm=T_ATM):
+    """
+    従来の TauCalculator.main と同じ np.polyfit による tau_0, T_rx, T_sys。
+    """
+    a, b = np.polyfit(secZ, np.log((V_R - power) / V_R), 1)
+    return {'tau_0': -a, 'T_rx': (np.exp(-b) - 1) * T_atm, 'T_sys': (np.exp(-(a + b)) - 1) * T_atm}
+
+
+def assert_matches(samples, expected):
+    for key in skydipboot.QUANTITIES:
+        np.testing.assert_allclose(samples[key], [e[key] for e in expected], rtol=1e-9)
+
+
+def test_jackknife_matches_leave_one_out_loop():
+    s = sample_skydip()
+    n = s['secZ'].size
+
+    samples = skydipboot.jackknife(s['secZ'], s['power'], s['V_R'], T_ATM)
+    expected = [old_fit(np.delete(s['secZ'], i), np.delete(s['power'], i), s['V_R']) for i in range(n)]
+    assert_matches(samples, expected)
+
+
+def test_bootstrap_matches_loop():
+    s = sample_skydip()
+    n = s['secZ'].size
+
+    samples = skydipboot.bootstrap(s['secZ'], s['power'], s['V_R'], T_ATM, N_BOOT, seed=SEED)
+
+    rng = np.random.default_rng(np.random.SeedSequence(SEED).spawn(1)[0])
+    pick = rng.integers(0, n, (N_BOOT, n))
+    expected = [old_fit(s['secZ'][p], s['power'][p], s['V_R']) for p in pick]
+    assert_matches(samples, expected)
+
+
+def test_raw_bootstrap_resamples_only_the_raw_samples():
+    s = sample_skydip()
+    on_samples, on_count = skydipboot.window_samples(s['power_data'], s['on_start'], s['on_end'])
+    R_samples, R_count = skydipboot.window_samples(s['power_data'], s['R_start'], s['R_end'])
+    np.testing.assert_allclose(np.nanmean(on_samples, axis=1), s['power'], rtol=1e-12)
+
+    samples = skydipboot.bootstrap(s['secZ'], s['power'], s['V_R'], T_ATM, N_BOOT, seed=SEED,
+                                   raw=(on_samples, on_count, R_samples, R_count))
+
+    # 各区間の生データを選び直して平均し、ON点（secZ）はそのままフィッティングする
+    rng = np.random.default_rng(np.random.SeedSequence(SEED).spawn(1)[0])
+    u_on = rng.random((N_BOOT,) + on_samples.shape)
+    u_R = rng.random((N_BOOT,) + R_samples.shape)
+    expected = []
+    for b in range(N_BOOT):
+        power = [on_samples[k, (u_on[b, k, :c] * c).astype(int)].mean() for k, c in enumerate(on_count)]
+        V_R = R_samples[0, (u_R[b, 0, :R_count[0]] * R_count[0]).astype(int)].mean()
+        expected.append(old_fit(s['secZ'], np.array(power), V_R))
+    assert_matches(samples, expected)
+
+
+def test_bootstrap_does_not_depend_on_workers(monkeypatch):
+    s = sample_skydip()
+    monkeypatch.setattr(skydipboot, 'CHUNK_SIZE', 30)
+
+    serial = skydipboot.bootstrap(s['secZ'], s['power'], s['V_R'], T_ATM, N_BOOT, seed=SEED, workers=1)
+    parallel = skydipboot.bootstrap(s['secZ'], s['power'], s['V_R'], T_ATM, N_BOOT, seed=SEED, workers=2)
+    for key in skydipboot.QUANTITIES:
+        np.testing.assert_array_equal(serial[key], parallel[key])
@@ -0,0 +1,88 @@
+#!python3
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import interval
+import logindex
+import skydipfit
+
+"""
+skydipfit.fit_skydips のまとめたフィッティングを、従来の TauCalculator.py の np.polyfit（1つのスカイディップずつ）と比べる。
+"""
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tau_measurement')
+ANT30LOG = os.path.join(DATA, 'ant30-tau1-20240925.log')
+POWERLOG = os.path.join(DATA, 'power-20240915.log')
+SKYDIP = os.path.join(DATA, 'ant30-tau1-20240925.txt')
+
+T_ATM = 270.0
+
+
+def sample_skydip():
+    """
+    サンプルのスカイディップの secZ, 各ON点の平均出力 (ant30-tau1-20240925.txt) と V_R を返す。
+    """
+    data = np.loadtxt(SKYDIP, delimiter=',', skiprows=1, ndmin=2)
+    log_index = logindex.parse_ant30log(ANT30LOG)
+    power_data = interval.read_powerlog(POWERLOG)
+    R_start, R_end = logindex.get_integ_time(log_index, 'r', log_index['RSkyTime'])
+    V_R = interval.interval_stats(power_data['time'], power_data['power'], R_start[-1:], R_end[-1:])['mean'][0]
+
+    return data[:, 1], data[:, 2], float(V_R)
+
+
+def old_fit(secZ, power, V_R, T_atm):
+    """
+    従来の TauCalculator.main と同じ計算。
+    """
+    y = np.log((V_R - power) / V_R)
+    a, b = np.polyfit(secZ, y, 1)
+    T_rx = (np.exp(-b) - 1) * T_atm
+    T_sys = (np.exp(-(a + b)) - 1) * T_atm
+
+    return {'a': a, 'b': b, 'tau_0': -a, 'T_rx': T_rx, 'T_sys': T_sys}
+
+
+def test_fit_skydips_matches_polyfit():
+    secZ, power, V_R = sample_skydip()
+    expected = old_fit(secZ, power, V_R, T_ATM)
+
+    fit = skydipfit.fit_skydips(secZ, power, V_R, T_ATM)
+    for key in ('a', 'b', 'tau_0', 'T_rx', 'T_sys'):
+        np.testing.assert_allclose(fit[key][0], expected[key], rtol=1e-10)
+    assert fit['n'][0] == secZ.size
+
+
+def test_fit_skydips_batch_of_different_lengths():
+    secZ, power, V_R = sample_skydip()
+
+    # 点数の違うスカイディップ（サンプルの一部と、V_R, T_atm を変えたもの）をまとめてフィッティングする
+    cases = [(secZ, power, V_R, T_ATM), (secZ[:12], power[:12], V_R, 260.0), (secZ[5:], power[5:], V_R * 1.01, 250.0)]
+    fit = skydipfit.fit_skydips([c[0] for c in cases], [c[1] for c in cases], [c[2] for c in cases], [c[3] for c in cases])
+
+    for i, case in enumerate(cases):
+        expected = old_fit(*case)
+        for key in ('a', 'b', 'tau_0', 'T_rx', 'T_sys'):
+            np.testing.assert_allclose(fit[key][i], expected[key], rtol=1e-10)
+
+        # 共分散は np.polyfit(cov='unscaled') に残差の分散を掛けたもの
+        y = np.log((case[2] - case[1]) / case[2])
+        p, cov = np.polyfit(case[0], y, 1, cov='unscaled')
+        chi2_red = np.sum((y - np.polyval(p, case[0])) ** 2) / (y.size - 2)
+        np.testing.assert_allclose(fit['cov'][i], cov * chi2_red, rtol=1e-8)
+
+
+def test_points_above_V_R_are_dropped():
+    secZ, power, V_R = sample_skydip()
+    power = power.copy()
+    power[3] = V_R * 1.5
+
+    keep = np.arange(secZ.size) != 3
+    expected = old_fit(secZ[keep], power[keep], V_R, T_ATM)
+    fit = skydipfit.fit_skydips(secZ, power, V_R, T_ATM)
+    np.testing.assert_allclose(fit['tau_0'][0], expected['tau_0'], rtol=1e-10)
+    assert fit['n'][0] == secZ.size - 1
@@ -0,0 +1,106 @@
+#!python3
+
+import os
+import re
+import subprocess
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import tatm
+import TauCalculator
+
+"""
+tatm の季節の中央の通日、季節と周波数の補間、am の呼び出し方と、am が無い場合の表示のテスト。
+"""
+
+
+@pytest.mark.parametrize('months, center', [((11, 12, 1, 2), 364.0),  # 11/1 (304) 〜 3/1 (424) の中央
+                                            ((7, 8, 9), 227.0),  # 7/1 (181) 〜 10/1 (273) の中央
+                                            ((1,), 15.5),
+                                            ((12, 1), 365.0)])  # 12/1 (334) 〜 2/1 (396) の中央
+def test_season_center(months, center):
+    assert tatm.season_center(months) == pytest.approx(center)
+
+
+def test_day_of_year():
+    np.testing.assert_allclose(tatm.day_of_year(np.array(['2024-01-01T00:00', '2024-01-02T12:00', '2024-12-31T18:00'],
+                                                         dtype='datetime64[ns]')), [0.0, 1.5, 365.75])
+
+
+@pytest.fixture
+def seasonal_tables(monkeypatch):
+    """
+    夏は周波数とともに 250 K から 260 K まで上がり、冬は 200 K で一定の表を使う。
+    """
+    tables = {'Dome_Fuji_MERRA2.amc': {'f': np.array([100.0, 1000.0]), 'T_atm': np.array([250.0, 260.0])},
+              'Dome_Fuji_MERRA2_winter.amc': {'f': np.array([100.0, 1000.0]), 'T_atm': np.array([200.0, 200.0])}}
+    monkeypatch.setattr(tatm, 'load_table', lambda filename, use_cache=True: tables[os.path.basename(filename)])
+
+
+def test_lookup_at_season_centers(seasonal_tables):
+    summer = np.datetime64('2024-01-01') + np.timedelta64(int(364 * 86400), 's')
+    winter = np.datetime64('2024-01-01') + np.timedelta64(int(227 * 86400), 's')
+
+    assert tatm.lookup(summer, 550.0) == pytest.approx(255.0)
+    assert tatm.lookup(summer, 100.0) == pytest.approx(250.0)
+    assert tatm.lookup(winter, 476.0) == pytest.approx(200.0)
+
+
+def test_lookup_between_seasons(seasonal_tables):
+    # 冬の中央 (227) から夏の中央 (364) までと、夏の中央から年をまたいで冬の中央 (227 + 365.25) までの線形補間
+    days = np.array([250.0, 300.0, 10.0, 100.0])
+    time = np.datetime64('2023-01-01') + (days * 86400).astype('timedelta64[s]')
+    summer = 255.0
+    frac_up = (days[:2] - 227) / (364 - 227)
+    frac_down = (days[2:] + 365.25 - 364) / (227 + 365.25 - 364)
+    expected = np.concatenate((200 + (summer - 200) * frac_up, summer + (200 - summer) * frac_down))
+
+    T_atm = tatm.lookup(time, 550.0)
+    assert isinstance(T_atm, np.ndarray)
+    np.testing.assert_allclose(T_atm, expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize('amc', sorted(amc for amc, _ in tatm.SEASONS.values()))
+def test_run_am_arguments_fill_the_placeholders(monkeypatch, amc):
+    filename = os.path.join(tatm.AMC_DIR, amc)
+    with open(filename, 'r', encoding='utf-8') as f:
+        content = f.read()
+    calls = []
+
+    def fake_run(args, cwd=None, **kwargs):
+        calls.append((args, cwd))
+        # am と同じく、amc ファイルの %1 〜 %9 をコマンドライン引数で置き換える
+        spec = re.sub(r'%(\d)', lambda m: args[1 + int(m.group(1))], content)
+        lines = [line.split('#')[0].split() for line in spec.splitlines()]
+        assert ['f', '100.0', 'GHz', '1000.0', 'GHz', '1.0', 'GHz'] in lines
+        assert ['za', '0', 'deg'] in lines
+        assert ['Nscale', 'troposphere', 'h2o', '1.0'] in lines
+        assert ['output', 'f', 'GHz', 'tx', 'Tb', 'K'] in lines
+        return subprocess.CompletedProcess(args, 0, stdout='100.0 0.5 130.0\n1000.0 0.2 201.0\n', stderr='')
+
+    monkeypatch.setattr(tatm.subprocess, 'run', fake_run)
+    f, T_atm = tatm.run_am(filename, 100.0, 1000.0, 1.0)
+
+    (args, cwd), = calls
+    assert args[:2] == ['am', amc] and os.path.samefile(cwd, tatm.AMC_DIR)
+    assert max(int(n) for n in re.findall(r'%(\d)', content)) == len(args) - 2
+    np.testing.assert_allclose(f, [100.0, 1000.0])
+    np.testing.assert_allclose(T_atm, [(130.0 - 2.7 * 0.5) / 0.5, (201.0 - 2.7 * 0.2) / 0.8])
+
+
+@pytest.mark.parametrize('am, expected', [('/usr/local/bin/am', 'from the am/MERRA2 table (476.000 GHz'),
+                                          (None, 'Warning: am is not installed.')])
+def test_lookup_T_atm_reports_the_method(seasonal_tables, monkeypatch, capsys, am, expected):
+    monkeypatch.setattr(tatm.shutil, 'which', lambda name: am)
+    time = np.datetime64('2024-01-01') + np.timedelta64(227 * 86400, 's')
+
+    T_atm = TauCalculator.lookup_T_atm({'Lo1': 476.0}, time)
+    out = capsys.readouterr().out
+    assert T_atm == pytest.approx(200.0)
+    assert tatm.method() == ('am' if am else 'profile')
+    assert expected in out
+    # am が無い場合は周波数によらない値であることを表示し、am/MERRA2 の表の値とは書かない
+    assert ('does not depend on frequency' in out) == (am is None)
+    assert ('from the am/MERRA2 table' in out) == (am is not None)
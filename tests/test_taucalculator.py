@@ -0,0 +1,129 @@
+#!python3
+
+import datetime
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import interval
+import logindex
+import TauCalculator
+
+"""
+TauCalculator の連続スカイディップ（--continuous）のテスト。
+
+EL を一定の速さで 80 deg から 20 deg まで動かす追尾行 (trk.cpp-817) と、途中に R の積分区間を挟んだパワーメーターログを作り、
+ln[(V_R - V(Z)) / V_R] = -TAU * secZ + B となる出力から TAU, B が求まることを確かめる。
+"""
+
+T0 = datetime.datetime(2024, 6, 20, 14, 30, 0)
+TAU = 0.5
+B = -0.1
+V_R = 1.0e6
+EL_START, EL_END, T_SWEEP = 80.0, 20.0, 60.0  # [deg], [deg], [sec]
+R_START, R_END = 30.0, 32.0  # R の積分区間 [sec]
+
+
+def stamp(sec):
+    t = T0 + datetime.timedelta(seconds=sec)
+    return t.strftime('%Y/%m/%d-%H:%M:%S.') + f'{t.microsecond // 1000:03d}'
+
+
+def sweep_el(sec):
+    return EL_START + (EL_END - EL_START) * np.asarray(sec) / T_SWEEP
+
+
+def write_logs(tmp_path):
+    """
+    連続スカイディップの ant30ログとパワーメーターログを書き、ファイル名を返す。
+    追尾行は 0.1 sec ごと、パワーメーターは 0.05 sec ごと（追尾の前後 2 sec も記録する）。
+    """
+    lines = ['OnOffTime       3', 'RSkyTime        2', 'SetNumber       1',
+             f'[{stamp(R_START)}-tkb32Func.cpp-760] # R-Sky     Integ start']
+    for i in range(int(T_SWEEP * 10) + 1):
+        sec = i / 10
+        el = sweep_el(sec)
+        lines.append(f'[{stamp(sec)}-trk.cpp-817] cmd = 180.000000, {el:.6f} <--> data = 180.000000, {el:.6f}')
+        if sec == R_END:
+            lines.append(f'[{stamp(sec)}-tkb32Func.cpp-793] # R-Sky     Integ end  (AZ,EL) = (180.000000, {el:.6f})')
+    ant30log = tmp_path / 'ant30-tau1-sweep.log'
+    ant30log.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    lines = []
+    for i in range(-40, int(T_SWEEP * 20) + 41):
+        sec = i / 20
+        if R_START <= sec <= R_END:
+            power = V_R
+        else:
+            secZ = 1 / np.cos(np.radians(90 - sweep_el(sec)))
+            power = V_R * (1 - np.exp(-TAU * secZ + B))
+        lines.append(f'[{stamp(sec)}]\t{power:.4f}')
+    powerlog = tmp_path / 'power-sweep.log'
+    powerlog.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    return str(ant30log), str(powerlog)
+
+
+def load(tmp_path):
+    ant30log, powerlog = write_logs(tmp_path)
+    return logindex.parse_ant30log(ant30log), interval.read_powerlog(powerlog)
+
+
+def test_samples_follow_the_sweep(tmp_path):
+    log_index, power_data = load(tmp_path)
+    skydip = TauCalculator.measure_continuous_skydip(log_index, power_data, bins=0)
+
+    # 追尾行の範囲内で R の積分区間を除いたサンプル（0 〜 60 sec のうち 30 〜 32 sec 以外）
+    assert skydip['secZ'].size == 1201 - 41
+    assert skydip['V_R'] == pytest.approx(V_R)
+    np.testing.assert_allclose(skydip['secZ'], 1 / np.cos(np.radians(90 - skydip['on_el'])))
+    assert skydip['on_el'].max() == pytest.approx(EL_START) and skydip['on_el'].min() == pytest.approx(EL_END)
+
+    y = np.log((V_R - skydip['power']) / V_R)
+    np.testing.assert_allclose(y, -TAU * skydip['secZ'] + B, atol=1e-6)
+
+
+def test_bins(tmp_path):
+    log_index, power_data = load(tmp_path)
+    samples = TauCalculator.measure_continuous_skydip(log_index, power_data, bins=0)
+    skydip = TauCalculator.measure_continuous_skydip(log_index, power_data, bins=20)
+
+    # secZ の等間隔のビンごとの平均（ビンの中の点数の合計は全サンプル数）
+    edges = np.linspace(samples['secZ'].min(), samples['secZ'].max(), 21)
+    index = np.clip(np.searchsorted(edges, samples['secZ'], side='right') - 1, 0, 19)
+    assert skydip['n_samples'].sum() == samples['secZ'].size
+    np.testing.assert_array_equal(skydip['n_samples'], np.bincount(index, minlength=20))
+    for k in range(20):
+        in_bin = index == k
+        assert skydip['secZ'][k] == pytest.approx(samples['secZ'][in_bin].mean(), rel=1e-12)
+        assert skydip['on_el'][k] == pytest.approx(samples['on_el'][in_bin].mean(), rel=1e-12)
+        assert skydip['power'][k] == pytest.approx(samples['power'][in_bin].mean(), rel=1e-12)
+        assert skydip['power_err'][k] == pytest.approx(samples['power'][in_bin].std(ddof=1) / np.sqrt(in_bin.sum()), rel=1e-9)
+
+
+@pytest.mark.parametrize('bins', [0, 20])
+def test_fitted_tau(tmp_path, bins):
+    log_index, power_data = load(tmp_path)
+    skydip = TauCalculator.calculate_skydip(log_index, power_data, continuous=True, bins=bins)
+
+    # ビンの中で出力を平均するので、bins > 0 の場合は secZ に対して曲がっている分だけずれる
+    tol = 1e-6 if bins == 0 else 2e-3
+    assert -skydip['a'] == pytest.approx(TAU, abs=tol)
+    assert skydip['b'] == pytest.approx(B, abs=tol)
+
+
+def test_el_range(tmp_path):
+    log_index, power_data = load(tmp_path)
+    skydip = TauCalculator.measure_continuous_skydip(log_index, power_data, bins=0, el_range=(60.01, 29.99))
+
+    # EL が 60 〜 30 deg になる 20 〜 50 sec のサンプルから、R の積分区間の分を除いたもの
+    assert skydip['on_el'].min() >= 29.99 and skydip['on_el'].max() <= 60.01
+    assert skydip['secZ'].size == 601 - 41
+
+
+def test_needs_tracking_lines(tmp_path):
+    log_index, power_data = load(tmp_path)
+    log_index['track'] = log_index['track'][:1]
+    with pytest.raises(ValueError):
+        TauCalculator.measure_continuous_skydip(log_index, power_data)
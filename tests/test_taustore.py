@@ -0,0 +1,87 @@
+#!python3
+
+import contextlib
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import taustore
+
+"""
+taustore の追記（同じ ant30ログの同じ時刻の結果は1回だけ）と時刻での検索のテスト。
+"""
+
+
+def write_logs(tmp_path, name, text):
+    ant30log = tmp_path / f'ant30-{name}.log'
+    powerlog = tmp_path / f'power-{name}.log'
+    ant30log.write_text(text)
+    powerlog.write_text(f'power {text}')
+    return str(ant30log), str(powerlog)
+
+
+def result(time, tau_0, ant30log, powerlog):
+    return {'time': np.datetime64(time), 'tau_0': tau_0, 'T_rx': np.float64(400.0), 'T_sys': np.nan,
+            'n_points': np.int64(22), 'ant30log': ant30log, 'powerlog': powerlog}
+
+
+@pytest.fixture
+def store(tmp_path):
+    with contextlib.closing(taustore.open_store(str(tmp_path / 'tau.sqlite'))) as conn:
+        yield conn
+
+
+def test_append_ignores_the_same_session(tmp_path, store):
+    log_a = write_logs(tmp_path, 'a', 'session a')
+    log_b = write_logs(tmp_path, 'b', 'session b')
+    rows = [result('2024-09-25T15:58:46', 0.8, *log_a), result('2024-09-26T03:00:00', 1.1, *log_b)]
+
+    assert taustore.append(store, rows) == 2
+    assert taustore.append(store, rows) == 0
+
+    # 同じ内容のログを別の名前で解析し直しても、ハッシュが同じなので追加しない
+    renamed = write_logs(tmp_path, 'a-copy', 'session a')
+    assert taustore.append(store, [result('2024-09-25T15:58:46', 0.9, *renamed)]) == 0
+
+    # 内容が変わったログ、同じログの別の時刻の結果は追加する
+    edited = write_logs(tmp_path, 'a', 'session a, edited')
+    assert taustore.append(store, [result('2024-09-25T15:58:46', 0.85, *edited),
+                                   result('2024-09-25T16:30:00', 0.7, *log_b)]) == 2
+
+    table = taustore.query_range(store, '2024-09-25', '2024-09-27')
+    np.testing.assert_allclose(table['tau_0'], [0.8, 0.85, 0.7, 1.1])
+    assert table['ant30log'].tolist() == [log_a[0], edited[0], log_b[0], log_b[0]]
+
+
+def test_unique_constraint_in_the_file(tmp_path):
+    filename = str(tmp_path / 'tau.sqlite')
+    ant30log, powerlog = write_logs(tmp_path, 'a', 'session a')
+    row = result('2024-09-25T15:58:46', 0.8, ant30log, powerlog)
+
+    # 開き直しても同じ行は追加しない
+    for expected in (1, 0):
+        with contextlib.closing(taustore.open_store(filename)) as conn:
+            assert taustore.append(conn, [row]) == expected
+    with contextlib.closing(taustore.open_store(filename)) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM tau').fetchone()[0] == 1
+
+
+def test_queries(tmp_path, store):
+    ant30log, powerlog = write_logs(tmp_path, 'a', 'session a')
+    times = ['2024-09-25T00:00:00', '2024-09-25T06:00:00', '2024-09-25T12:00:00']
+    taustore.append(store, [result(t, 0.1 * (i + 1), ant30log, powerlog) for i, t in enumerate(times)])
+
+    assert taustore.nearest_before(store, '2024-09-24T23:59:59') is None
+    assert taustore.nearest_before(store, '2024-09-25T11:59:59')['tau_0'] == pytest.approx(0.2)
+    assert taustore.nearest(store, '2024-09-25T09:00:01')['tau_0'] == pytest.approx(0.3)
+    assert taustore.nearest(store, '2024-09-25T08:59:59')['tau_0'] == pytest.approx(0.2)
+
+    row = taustore.nearest(store, np.datetime64('2024-09-25T06:00:00'))
+    assert row['time'] == np.datetime64('2024-09-25T06:00:00', 'ns')
+    assert row['T_rx'] == 400.0 and row['T_sys'] is None and row['n_points'] == 22
+
+    table = taustore.last(store, 7, now='2024-09-25T12:00:00')
+    np.testing.assert_allclose(table['tau_0'], [0.2, 0.3])
+    assert np.isnan(table['T_sys']).all()
+    assert table['time'].dtype == np.dtype('datetime64[ns]')
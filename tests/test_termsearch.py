@@ -0,0 +1,93 @@
+#!python3
+
+import itertools
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import pointingfit
+import termsearch
+
+"""
+termsearch.search（正規方程式の行列から組み合わせをまとめて解く）を、組み合わせごとに計画行列の列を取り出して
+np.linalg.lstsq で解き直すループと比べる（サンプルの offset_data/offset_L.txt, offset_C.txt、3項まで）。
+"""
+
+OFFSETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'radio_pointing', 'offset_data')
+
+MAX_TERMS = 3
+FOLDS = 4
+SEED = 2024
+
+
+def linear_system():
+    """
+    候補の項全体の計画行列 A、観測値 y、重み w（rp_instrument.py の run_search と同じ）を返す。
+    """
+    L = np.loadtxt(os.path.join(OFFSETS, 'offset_L.txt'), delimiter=',', skiprows=1, ndmin=2)
+    C = np.loadtxt(os.path.join(OFFSETS, 'offset_C.txt'), skiprows=1, ndmin=2)
+    data = pointingfit.stack_offsets(L[:, 0], L[:, 1], L[:, 2], L[:, 3], C[:, 0], C[:, 1], C[:, 2], C[:, 3], C[:, 4], C[:, 5])
+    terms = termsearch.candidate_terms()
+
+    return pointingfit.linear_system(lambda AZ, EL: termsearch.term_design(terms, AZ, EL), data)
+
+
+def scalar_search(A, y, w, max_terms, n_folds, seed):
+    """
+    組み合わせごとに重み付き最小二乗を lstsq で解き、RMS, 交差検証の RMS, AIC, BIC を求める（fold の分け方は prepare と同じ）。
+    """
+    n = y.size // 2
+    fold = np.random.default_rng(seed).permutation(n) % n_folds
+    fold = np.concatenate((fold, fold))
+
+    ret = {'subsets': [], 'rms': [], 'cv_rms': [], 'aic': [], 'bic': [], 'rank': []}
+    for k in range(1, max_terms + 1):
+        for subset in itertools.combinations(range(A.shape[1]), k):
+            A_s = A[:, subset]
+            popt, _, rank, _ = np.linalg.lstsq(A_s * w[:, None], y * w, rcond=None)
+            sse_w = np.sum((w * (y - A_s @ popt)) ** 2)
+            sse_u = np.sum((y - A_s @ popt) ** 2)
+
+            sse_cv = 0.0
+            for f in range(n_folds):
+                train = fold != f
+                popt_f, *_ = np.linalg.lstsq(A_s[train] * w[train, None], y[train] * w[train], rcond=None)
+                sse_cv += np.sum((y[~train] - A_s[~train] @ popt_f) ** 2)
+
+            log_likelihood = y.size * np.log(sse_w / y.size)
+            ret['subsets'].append(subset)
+            ret['rms'].append(np.sqrt(sse_u / n) * 3600)
+            ret['cv_rms'].append(np.sqrt(sse_cv / n) * 3600)
+            ret['aic'].append(log_likelihood + 2 * k)
+            ret['bic'].append(log_likelihood + k * np.log(y.size))
+            ret['rank'].append(rank)
+
+    return {key: np.array(value) if key != 'subsets' else value for key, value in ret.items()}
+
+
+def test_search_matches_lstsq_loop():
+    A, y, w = linear_system()
+    result = termsearch.search(A, y, w, MAX_TERMS, FOLDS, seed=SEED)
+    expected = scalar_search(A, y, w, MAX_TERMS, FOLDS, SEED)
+
+    assert result['subsets'] == expected['subsets']
+    np.testing.assert_array_equal(result['rank'], expected['rank'])
+
+    # ランク落ちの組み合わせは解が一意でないので、項が独立な組み合わせだけ比べる
+    full = result['rank'] == result['n_terms']
+    assert full.sum() > 0.9 * full.size
+    for key in ('rms', 'cv_rms', 'aic', 'bic'):
+        np.testing.assert_allclose(result[key][full], expected[key][full], rtol=1e-7, err_msg=key)
+
+
+def test_search_does_not_depend_on_workers(monkeypatch):
+    A, y, w = linear_system()
+    monkeypatch.setattr(termsearch, 'CHUNK_SIZE', 50)
+
+    serial = termsearch.search(A, y, w, MAX_TERMS, FOLDS, seed=SEED, workers=1)
+    parallel = termsearch.search(A, y, w, MAX_TERMS, FOLDS, seed=SEED, workers=2)
+    assert serial['subsets'] == parallel['subsets']
+    for key in ('rank', 'rms', 'cv_rms', 'aic', 'bic'):
+        np.testing.assert_array_equal(serial[key], parallel[key])